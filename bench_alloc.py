@@ -0,0 +1,101 @@
+# Purpose:
+# - check that spectrum.Plan.analyze() runs in preallocated buffers: no heap
+#   growth across frames and no L-sized garbage per frame
+# - compare with spectrum.analyze(), which allocates new arrays every frame
+#
+# Runs on the device or on a host with the stand-in modules on the path.
+# After two warm up frames FRAMES frames are analyzed twice. On the device
+# the collector is stopped, so "bytes/frame" is all garbage a frame leaves
+# for the GC; on a host it is the tracemalloc peak above the buffers.
+# "growth/frame" is how much more is allocated after the second FRAMES
+# frames than after the first (each after a collection), divided by FRAMES,
+# and has to be 0; the division hides the few bytes the measurement itself
+# keeps alive, not a leak of one byte per frame. What the
+# Plan path still allocates per frame is mostly what the FFT allocates
+# itself (the "fft.fft" column, fft_any for lengths that are not a power of
+# 2: 2050 Bluestein, 3000 Stockham, 3072 mixed radix), plus small array
+# headers and floats.
+# Stops with AssertionError if a plan grows.
+
+import gc
+import math
+import ulab as np
+from ulab import vector
+import fft_any
+import fft_real
+import spectrum
+
+Fs = 4096
+BIN_SIZE_IN_HZ = 100
+START_AT_HZ = 0
+NUMBER_OF_BINS = 10
+FRAMES = 50
+CASES = [
+    (1024, spectrum.RECT),
+    (1024, spectrum.HANN),
+    (4096, spectrum.HANN),
+    (2050, spectrum.HANN),
+    (3000, spectrum.HANN),
+    (3072, spectrum.HANN),
+    (4100, spectrum.HAMMING),
+]
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def heap_per_frame(fn):
+    # (bytes per frame, growth per frame from FRAMES to 2 * FRAMES frames)
+    fn()
+    fn()
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        for _ in range(FRAMES):
+            fn()
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        for _ in range(FRAMES):
+            fn()
+        gc.collect()
+        growth = tracemalloc.get_traced_memory()[0] - current
+        tracemalloc.stop()
+        return peak - base, growth // FRAMES
+    before = gc.mem_alloc()
+    gc.disable()
+    try:
+        for _ in range(FRAMES):
+            fn()
+        used = (gc.mem_alloc() - before) // FRAMES
+    finally:
+        gc.enable()
+    gc.collect()
+    current = gc.mem_alloc()
+    for _ in range(FRAMES):
+        fn()
+    gc.collect()
+    return used, (gc.mem_alloc() - current) // FRAMES
+
+
+print('in-place operators:', fft_real.INPLACE)
+print('L \t window \t plan bytes/frame \t growth/frame \t fft.fft bytes \t allocating bytes/frame')
+grown = []
+for L, window in CASES:
+    plan = spectrum.Plan(Fs, L, window, BIN_SIZE_IN_HZ, START_AT_HZ, NUMBER_OF_BINS)
+    t = np.linspace(0, (L - 1) / Fs, num=L)
+    plan.samples[:] = vector.sin(2 * math.pi * 441.3 * t) + 0.5 * vector.sin(2 * math.pi * 998 * t)
+    used, growth = heap_per_frame(lambda: plan.analyze())
+    if L % 2:
+        fft_bytes, _ = heap_per_frame(lambda: fft_any.fft(plan.samples))
+    else:
+        fft_bytes, _ = heap_per_frame(lambda: fft_any.fft(plan.samples[0::2], plan.samples[1::2]))
+    allocating, _ = heap_per_frame(lambda: spectrum.analyze(plan.samples, L, plan.bands))
+    print(L, '\t', window, '\t', used, '\t', growth, '\t', fft_bytes, '\t', allocating)
+    if growth:
+        grown.append((L, window, growth))
+if grown:
+    raise AssertionError('heap grows across frames: ' + str(grown))
+print('no heap growth')
@@ -0,0 +1,76 @@
+# Purpose:
+# - compare combine_samples() (the list based decoder that used to live in
+#   fft_analyzer_with_mic.py) with i2s_decode.decode_32()
+# - frames of 1k - 32k samples, printed as microseconds per frame
+#
+# Runs on the device (copy i2s_decode.py next to it) or on a host with the
+# stand-in modules on the path.
+
+import gc
+import math
+import utime
+import ulab as np
+import i2s_decode
+
+SIZES = [1024, 2048, 4096, 8192, 16384, 32768]
+REPEAT = 3
+
+
+def combine_samples(samples):
+    num_samples = len(samples) // 4
+    result = []
+    for i in range(num_samples):
+        result += [samples[4 * i] * math.pow(2, 24) + samples[4 * i + 1] * math.pow(2, 16) + samples[4 * i + 2] * math.pow(2, 8) + samples[4 * i + 3]]
+    return np.array(result)
+
+
+def fill(words):
+    # deterministic pseudo random 24-bit samples, MSB aligned like the mic data
+    x = 12345
+    for i in range(len(words)):
+        x = (x * 1103515245 + 12345) & 0x7fffffff
+        words[i] = ((x >> 7) - (1 << 23)) << 8
+
+
+def best_of(fn):
+    best = None
+    for _ in range(REPEAT):
+        gc.collect()
+        start = utime.ticks_us()
+        fn()
+        took = utime.ticks_diff(utime.ticks_us(), start)
+        if best is None or took < best:
+            best = took
+    return best
+
+
+print('samples \t combine_samples us \t decode_32 us \t speedup')
+for n in SIZES:
+    try:
+        words = i2s_decode.int32_buffer(n)
+        out = i2s_decode.float_buffer(n)
+    except MemoryError:
+        print(n, '\t skipped, not enough heap')
+        continue
+    fill(words)
+    raw = memoryview(words)
+
+    i2s_decode.decode_32(words, out)
+    for i in range(min(n, 64)):
+        if out[i] != words[i]:
+            print('decode_32 mismatch at', i, out[i], words[i])
+            break
+
+    try:
+        old = best_of(lambda: combine_samples(bytearray(raw)))
+    except MemoryError:
+        old = None
+    new = best_of(lambda: i2s_decode.decode_32(words, out))
+    if old is None:
+        print(n, '\t -- \t\t\t', new)
+    else:
+        print(n, '\t', old, '\t\t', new, '\t', old / max(new, 1))
+
+    words = None
+    out = None
+    raw = None
@@ -0,0 +1,92 @@
+# Purpose:
+# - cost of non power of 2 FFT lengths (fft_any) relative to the nearest
+#   power of 2, for the real input transform used by the analyzers
+# - the sizes are what RECORD_TIME_IN_MS * SAMPLE_RATE_IN_HZ gives for
+#   common settings: smooth (mixed radix or Stockham) and with large prime
+#   factors (Bluestein)
+#
+# CHECK_SIZES, odd ones included, are compared with a direct DFT first:
+# P1 of spectrum.magnitude() and the frequency axis k*Fs/L.
+#
+# Runs on the device (copy fft_any.py and fft_real.py next to it) or on a
+# host with the stand-in modules on the path.
+
+import gc
+import math
+import utime
+import ulab as np
+from ulab import vector
+import fft_any
+import fft_real
+import spectrum
+
+SIZES = [1000, 2050, 3000, 3072, 4050, 4100, 5120, 6000, 6150, 12000, 12300]
+CHECK_SIZES = [16, 17, 97, 100, 255]
+REPEAT = 3
+Fs = 4096
+
+
+def best_of(fn):
+    best = None
+    for _ in range(REPEAT):
+        gc.collect()
+        start = utime.ticks_us()
+        fn()
+        took = utime.ticks_diff(utime.ticks_us(), start)
+        if best is None or took < best:
+            best = took
+    return best
+
+
+def nearest_power_of_2(n):
+    p = fft_any.next_power_of_2(n)
+    if p - n > n - p // 2:
+        p //= 2
+    return p
+
+
+def signal(L):
+    t = np.linspace(0, (L - 1) / Fs, num=L)
+    return vector.sin(2 * math.pi * 440 * t) + 0.5 * vector.sin(2 * math.pi * 1000 * t)
+
+
+def direct_P1(x, L):
+    # single-sided amplitude spectrum straight from the DFT sum
+    P1 = []
+    for k in range(L // 2 + 1):
+        re = sum(x[m] * math.cos(2 * math.pi * k * m / L) for m in range(L))
+        im = sum(x[m] * math.sin(2 * math.pi * k * m / L) for m in range(L))
+        value = 2 * math.sqrt(re * re + im * im) / L
+        # DC, and the Nyquist bin of an even L, have no mirrored twin
+        if k == 0 or 2 * k == L:
+            value /= 2
+        P1.append(value)
+    return P1
+
+
+print('L \t max P1 error \t max axis error')
+for L in CHECK_SIZES:
+    S = signal(L) + 0.25
+    x = list(S)
+    expected = direct_P1(x, L)
+    P1 = spectrum.magnitude(S, L)
+    f = spectrum.frequency_axis(Fs, L)
+    error = max(abs(P1[k] - expected[k]) for k in range(L // 2 + 1))
+    axis = max(abs(f[k] - k * Fs / L) for k in range(L // 2 + 1))
+    print(L, '\t', error, '\t', axis)
+
+print('L \t algorithm \t us \t nearest 2^n \t us \t factor')
+for L in SIZES:
+    try:
+        P = nearest_power_of_2(L)
+        S = signal(L)
+        S2 = signal(P)
+        tables = fft_real.twiddle(L)
+        tables2 = fft_real.twiddle(P)
+        plan = fft_any.get_plan(L // 2) if L % 2 == 0 else fft_any.get_plan(L)
+        cost = best_of(lambda: fft_real.rfft(S, tables))
+        cost2 = best_of(lambda: fft_real.rfft(S2, tables2))
+        print(L, '\t', type(plan).__name__, '\t', cost, '\t', P, '\t', cost2, '\t', cost / max(cost2, 1))
+    except MemoryError:
+        print(L, '\t skipped, not enough heap')
+    S = S2 = tables = tables2 = None
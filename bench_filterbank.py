@@ -0,0 +1,78 @@
+# Purpose:
+# - band values of filterbank.Filterbank against a loop over the bands
+# - time of the one-dot reduction next to the equal-width spectrum.BandTable
+#   and the time to build a filterbank against reading it from the cache
+#
+# Runs on the device (copy filterbank.py next to it, CACHE_DIR must be
+# writable) or on a host with the stand-in modules on the path.
+
+import gc
+import math
+import os
+import utime
+import ulab as np
+from ulab import vector
+from ulab import numerical
+import spectrum
+import filterbank
+
+Fs = 4096
+REPEAT = 5
+CACHE_DIR = '/flash/filterbank'
+# (L, layout, count for MEL)
+CASES = [
+    (1024, filterbank.OCTAVE, 0),
+    (4096, filterbank.OCTAVE, 0),
+    (4096, filterbank.THIRD_OCTAVE, 0),
+    (4096, filterbank.MEL, 24),
+    (4096, filterbank.MEL, 40),
+]
+
+
+def best_of(fn):
+    best = None
+    for _ in range(REPEAT):
+        gc.collect()
+        start = utime.ticks_us()
+        fn()
+        took = utime.ticks_diff(utime.ticks_us(), start)
+        if best is None or took < best:
+            best = took
+    return best
+
+
+def timed(fn):
+    start = utime.ticks_us()
+    result = fn()
+    return result, utime.ticks_diff(utime.ticks_us(), start)
+
+
+def reference(bank, P1):
+    # weighted mean band by band
+    out = np.zeros(bank.count)
+    for x in range(bank.count):
+        row = bank.weights[x]
+        out[x] = numerical.sum(row * P1[bank.lo:bank.hi])
+    return out
+
+
+try:
+    os.mkdir(CACHE_DIR)
+except OSError:
+    pass
+
+print('L \t layout \t bands \t matrix floats \t max rel error \t dot us \t 10 equal bands us \t build us \t cached us')
+for L, layout, count in CASES:
+    plan = spectrum.Plan(Fs, L, spectrum.HANN, 100, 0, 10)
+    t = np.linspace(0, (L - 1) / Fs, num=L)
+    plan.samples[:] = vector.sin(2 * math.pi * 441.3 * t) + 0.5 * vector.sin(2 * math.pi * 1998 * t) + 0.01
+    P1 = plan.analyze()[0]
+    bank, build_us = timed(lambda: filterbank.Filterbank(Fs, L, layout, None, count, CACHE_DIR))
+    cached, cached_us = timed(lambda: filterbank.Filterbank(Fs, L, layout, None, count, CACHE_DIR))
+    got = cached.reduce(P1, spectrum.MEAN, cached.result)
+    expected = reference(bank, P1)
+    error = numerical.max(abs(got - expected)) / max(numerical.max(expected), 1e-9)
+    dot_us = best_of(lambda: cached.reduce(P1, spectrum.MEAN, cached.result))
+    table_us = best_of(lambda: plan.bands.reduce(P1, spectrum.MEAN, plan.result))
+    print(L, '\t', layout, '\t', bank.count, '\t', bank.count * (bank.hi - bank.lo), '\t', error, '\t', dot_us, '\t',
+          table_us, '\t', build_us, '\t', cached_us)
@@ -0,0 +1,92 @@
+# Purpose:
+# - accuracy of fixed_fft.FixedPlan against the float path (spectrum.Plan)
+# - time and heap use of both for growing L
+#
+# Runs on the device (copy fixed_fft.py next to it) or on a host with the
+# stand-in modules on the path. The heap column is what one analysis
+# allocates including its plan and input buffer: gc.mem_alloc() with the
+# collector stopped on the device, the tracemalloc peak on a host. Lengths
+# that do not fit print MemoryError for the float path and keep going.
+
+import gc
+import math
+import utime
+import ulab as np
+from ulab import vector
+from ulab import numerical
+import spectrum
+import i2s_decode
+import fixed_fft
+
+Fs = 4096
+WINDOW = spectrum.HANN
+BIN_SIZE_IN_HZ = 100
+START_AT_HZ = 0
+NUMBER_OF_BINS = 10
+SIZES = [4096, 8192, 16384, 32768, 65536]
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def heap_used(fn):
+    # (result of fn(), bytes allocated while it ran)
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        result = fn()
+        used = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return result, used
+    before = gc.mem_alloc()
+    gc.disable()
+    try:
+        result = fn()
+        used = gc.mem_alloc() - before
+    finally:
+        gc.enable()
+    return result, used
+
+
+def test_pcm(L):
+    # 16-bit tones plus a little DC as PCM bytes
+    t = np.linspace(0, (L - 1) / Fs, num=L)
+    S = 8000 * vector.sin(2 * math.pi * 441.3 * t) + 2000 * vector.sin(2 * math.pi * 998 * t) + 50
+    return bytearray(np.array(S, dtype=np.int16))
+
+
+def run_float(pcm, L):
+    plan = spectrum.Plan(Fs, L, WINDOW, BIN_SIZE_IN_HZ, START_AT_HZ, NUMBER_OF_BINS)
+    i2s_decode.decode_pcm16(memoryview(pcm), plan.samples, L)
+    return plan.analyze()[1] * 1
+
+
+def run_fixed(pcm, L, approximate=False):
+    plan = fixed_fft.FixedPlan(Fs, L, WINDOW, BIN_SIZE_IN_HZ, START_AT_HZ, NUMBER_OF_BINS, approximate)
+    return plan.analyze(pcm)[1] * 1
+
+
+def timed(fn):
+    start = utime.ticks_us()
+    result = fn()
+    return result, utime.ticks_diff(utime.ticks_us(), start)
+
+
+print('L \t float heap \t fixed heap \t float us \t fixed us \t max rel error \t approximate error')
+for L in SIZES:
+    pcm = test_pcm(L)
+    try:
+        (expected, float_us), float_heap = heap_used(lambda: timed(lambda: run_float(bytearray(pcm), L)))
+    except MemoryError:
+        expected, float_us, float_heap = None, '-', 'MemoryError'
+    (got, fixed_us), fixed_heap = heap_used(lambda: timed(lambda: run_fixed(bytearray(pcm), L)))
+    approx = run_fixed(bytearray(pcm), L, True)
+    if expected is None:
+        error = approx_error = '-'
+    else:
+        largest = max(numerical.max(expected), 1e-9)
+        error = numerical.max(abs(got - expected)) / largest
+        approx_error = numerical.max(abs(approx - expected)) / largest
+    print(L, '\t', float_heap, '\t', fixed_heap, '\t', float_us, '\t', fixed_us, '\t', error, '\t', approx_error)
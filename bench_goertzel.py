@@ -0,0 +1,56 @@
+# Purpose:
+# - compare the band values of goertzel.BandFilters with the FFT path
+# - time both and show which one goertzel.cheaper_than_fft() picks
+#
+# Runs on the device (copy goertzel.py next to it) or on a host with the
+# stand-in modules on the path.
+
+import gc
+import math
+import utime
+import ulab as np
+from ulab import vector
+from ulab import numerical
+import spectrum
+import goertzel
+
+Fs = 4096
+BLOCK = 256
+REPEAT = 3
+# (L, window, bin size in Hz, start at Hz, number of bins)
+CASES = [
+    (4096, spectrum.RECT, 4, 440, 2),
+    (4096, spectrum.HANN, 2, 996, 3),
+    (2050, spectrum.RECT, 10, 400, 1),
+    (4096, spectrum.RECT, 100, 0, 10),
+]
+
+
+def best_of(fn):
+    best = None
+    for _ in range(REPEAT):
+        gc.collect()
+        start = utime.ticks_us()
+        fn()
+        took = utime.ticks_diff(utime.ticks_us(), start)
+        if best is None or took < best:
+            best = took
+    return best
+
+
+print('L \t bins \t max rel error \t fft us \t goertzel us \t auto')
+for L, window, bin_size, start_at, number in CASES:
+    plan = spectrum.Plan(Fs, L, window, bin_size, start_at, number)
+    t = np.linspace(0, (L - 1) / Fs, num=L)
+    S = vector.sin(2 * math.pi * 441.3 * t) + 0.5 * vector.sin(2 * math.pi * 998 * t) + 0.1
+    filters = goertzel.BandFilters(plan, BLOCK)
+
+    P1, expected = plan.analyze(S)
+    expected = expected * 1
+    got = filters.analyze(S)
+    error = numerical.max(abs(got - expected)) / max(numerical.max(expected), 1e-9)
+
+    fft_us = best_of(lambda: plan.analyze(S))
+    goertzel_us = best_of(lambda: filters.analyze(S))
+    auto = 'goertzel' if goertzel.cheaper_than_fft(plan) else 'fft'
+    print(L, '\t', filters.K, '\t', error, '\t', fft_us, '\t', goertzel_us, '\t', auto)
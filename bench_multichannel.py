@@ -0,0 +1,69 @@
+# Purpose:
+# - compare the band values of multichannel.MultiPlan with one
+#   spectrum.Plan analysis per channel
+# - time both per channel
+#
+# Runs on the device (copy multichannel.py next to it) or on a host with
+# the stand-in modules on the path.
+
+import gc
+import math
+import utime
+import ulab as np
+from ulab import vector
+from ulab import numerical
+import spectrum
+import multichannel
+
+Fs = 4096
+REPEAT = 5
+BIN_SIZE_IN_HZ = 100
+START_AT_HZ = 0
+NUMBER_OF_BINS = 10
+# (L, window, channels)
+CASES = [
+    (1024, spectrum.RECT, 2),
+    (4096, spectrum.HANN, 2),
+    (4100, spectrum.HAMMING, 2),
+    (4096, spectrum.HANN, 3),
+    (4096, spectrum.HANN, 4),
+]
+
+
+def best_of(fn):
+    best = None
+    for _ in range(REPEAT):
+        gc.collect()
+        start = utime.ticks_us()
+        fn()
+        took = utime.ticks_diff(utime.ticks_us(), start)
+        if best is None or took < best:
+            best = took
+    return best
+
+
+def separate(plan, multi):
+    # one plan analysis per channel, the results copied like separate
+    # plans would keep them
+    results = []
+    for samples in multi.samples:
+        results.append(plan.analyze(samples)[1] * 1)
+    return results
+
+
+print('L \t window \t channels \t max rel error \t separate us/channel \t batched us/channel \t speedup')
+for L, window, channels in CASES:
+    multi = multichannel.MultiPlan(Fs, L, channels, window, BIN_SIZE_IN_HZ, START_AT_HZ, NUMBER_OF_BINS)
+    plan = spectrum.Plan(Fs, L, window, BIN_SIZE_IN_HZ, START_AT_HZ, NUMBER_OF_BINS)
+    t = np.linspace(0, (L - 1) / Fs, num=L)
+    for c in range(channels):
+        multi.samples[c][:] = vector.sin(2 * math.pi * (441.3 + 150 * c) * t) + 0.3 * c * vector.sin(2 * math.pi * 998 * t) + 0.1
+    expected = separate(plan, multi)
+    got = multi.analyze()[1]
+    error = 0
+    for c in range(channels):
+        largest = max(numerical.max(expected[c]), 1e-9)
+        error = max(error, numerical.max(abs(got[c] - expected[c])) / largest)
+    separate_us = best_of(lambda: separate(plan, multi)) / channels
+    batched_us = best_of(lambda: multi.analyze()) / channels
+    print(L, '\t', window, '\t', channels, '\t', error, '\t', separate_us, '\t', batched_us, '\t', separate_us / batched_us)
@@ -0,0 +1,55 @@
+# Purpose:
+# - frequency and amplitude error of peaks.PeakFinder against the plain
+#   bin frequency (argmax of P1), for a frame of L and one of L / 4
+#
+# Two tones with random frequencies and amplitudes plus noise, TRIALS
+# times per setting; the errors are the worst case over all trials. Runs
+# on the device (copy peaks.py next to it) or on a host with the stand-in
+# modules on the path.
+
+import math
+import random
+import ulab as np
+from ulab import vector
+from ulab import numerical
+import spectrum
+import peaks
+
+Fs = 4096
+TRIALS = 20
+NOISE = 0.01
+# (L, window, method)
+CASES = [
+    (4096, spectrum.RECT, peaks.RATIO),
+    (1024, spectrum.RECT, peaks.RATIO),
+    (4096, spectrum.HANN, peaks.RATIO),
+    (1024, spectrum.HANN, peaks.RATIO),
+    (1024, spectrum.HANN, peaks.PARABOLIC),
+    (1024, spectrum.HAMMING, peaks.PARABOLIC),
+]
+
+random.seed(1)
+print('L \t window \t method \t bin error Hz \t peak error Hz \t amplitude error')
+for L, window, method in CASES:
+    plan = spectrum.Plan(Fs, L, window)
+    finder = peaks.PeakFinder(plan, 2, method)
+    t = np.linspace(0, (L - 1) / Fs, num=L)
+    bin_error = 0
+    peak_error = 0
+    amplitude_error = 0
+    for _ in range(TRIALS):
+        f1 = random.uniform(200, 900)
+        f2 = random.uniform(1200, 1900)
+        a1 = random.uniform(0.5, 1)
+        a2 = random.uniform(0.1, 0.4)
+        plan.samples[:] = a1 * vector.sin(2 * math.pi * f1 * t) + a2 * vector.sin(2 * math.pi * f2 * t)
+        plan.samples[:] = plan.samples + np.array([random.uniform(-NOISE, NOISE) for _ in range(L)])
+        P1 = plan.analyze()[0]
+        frequencies, amplitudes = finder.find(P1)
+        k = numerical.argmax(P1)
+        bin_error = max(bin_error, abs(k * Fs / L - f1))
+        # strongest first
+        for f, a, got_f, got_a in ((f1, a1, frequencies[0], amplitudes[0]), (f2, a2, frequencies[1], amplitudes[1])):
+            peak_error = max(peak_error, abs(got_f - f))
+            amplitude_error = max(amplitude_error, abs(got_a - a) / a)
+    print(L, '\t', window, '\t', method, '\t', bin_error, '\t', peak_error, '\t', amplitude_error)
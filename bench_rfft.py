@@ -0,0 +1,53 @@
+# Purpose:
+# - check fft_real.rfft() against the first L//2+1 bins of fft.fft()
+# - time both for L = 1024 ... 16384
+#
+# Runs on the device (copy fft_real.py next to it) or on a host with the
+# stand-in modules on the path.
+
+import gc
+import math
+import utime
+import ulab as np
+from ulab import fft
+from ulab import vector
+from ulab import numerical
+import fft_real
+
+SIZES = [1024, 2048, 4096, 8192, 16384]
+REPEAT = 3
+Fs = 4096
+
+
+def best_of(fn):
+    best = None
+    for _ in range(REPEAT):
+        gc.collect()
+        start = utime.ticks_us()
+        fn()
+        took = utime.ticks_diff(utime.ticks_us(), start)
+        if best is None or took < best:
+            best = took
+    return best
+
+
+print('L \t max abs error \t fft.fft us \t rfft us \t speedup')
+for L in SIZES:
+    try:
+        t = np.linspace(0, (L - 1) / Fs, num=L)
+        S = 0.7 * vector.sin(2 * math.pi * 50 * t) + vector.sin(2 * math.pi * 120 * t) + 0.1 * vector.cos(2 * math.pi * 1001 * t)
+        n = L // 2 + 1
+
+        real, imaginary = fft.fft(S)
+        r_real, r_imaginary = fft_real.rfft(S)
+        error = max(numerical.max(abs(real[:n] - r_real)), numerical.max(abs(imaginary[:n] - r_imaginary)))
+        # relative to the largest bin, float32 rounding dominates
+        error = error / numerical.max(vector.sqrt(real * real + imaginary * imaginary))
+        real = imaginary = r_real = r_imaginary = None
+
+        old = best_of(lambda: fft.fft(S))
+        new = best_of(lambda: fft_real.rfft(S))
+        print(L, '\t', error, '\t', old, '\t', new, '\t', old / max(new, 1))
+    except MemoryError:
+        print(L, '\t skipped, not enough heap')
+    S = t = None
@@ -0,0 +1,67 @@
+# Purpose:
+# - compare the band values of zoom.Zoom with the full FFT path
+# - time both and show the sample memory each one needs
+#
+# Runs on the device (copy zoom.py next to it) or on a host with the
+# stand-in modules on the path. The zoom path gets preroll extra samples
+# in front of the frame to fill its filter history, like capture() does.
+
+import gc
+import math
+import utime
+import ulab as np
+from ulab import vector
+from ulab import numerical
+import spectrum
+import zoom
+
+Fs = 16000
+BLOCK = 256
+REPEAT = 3
+# (L, window, bin size in Hz, start at Hz, number of bins)
+CASES = [
+    (4096, spectrum.HANN, 50, 3000, 10),
+    (4096, spectrum.HANN, 20, 1000, 10),
+    (8192, spectrum.HAMMING, 10, 5000, 8),
+    (4096, spectrum.RECT, 50, 3000, 10),
+]
+
+
+def best_of(fn):
+    best = None
+    for _ in range(REPEAT):
+        gc.collect()
+        start = utime.ticks_us()
+        fn()
+        took = utime.ticks_diff(utime.ticks_us(), start)
+        if best is None or took < best:
+            best = took
+    return best
+
+
+print('L \t D \t max rel error \t fft us \t zoom us \t fft floats \t zoom floats')
+for L, window, bin_size, start_at, number in CASES:
+    plan = spectrum.Plan(Fs, L, window, bin_size, start_at, number)
+    if zoom.factor(plan, BLOCK) < 2:
+        print(L, '\t no zoom possible')
+        continue
+    z = zoom.Zoom(plan, BLOCK)
+    N = z.preroll + L
+    # one tone in a band, one between two bins, one far outside the bands
+    f1 = start_at + 2.5 * bin_size
+    f2 = start_at + (number - 2) * bin_size + 0.37 * Fs / L
+    t = np.linspace(0, (N - 1) / Fs, num=N)
+    S = vector.sin(2 * math.pi * f1 * t) + 0.3 * vector.sin(2 * math.pi * f2 * t) + 0.5 * vector.sin(2 * math.pi * 0.4 * Fs * t) + 0.1
+    frame = S[z.preroll:]
+
+    P1, expected = plan.analyze(frame)
+    expected = expected * 1
+    got = z.analyze(S)
+    error = numerical.max(abs(got - expected)) / max(numerical.max(expected), 1e-9)
+
+    fft_us = best_of(lambda: plan.analyze(frame))
+    zoom_us = best_of(lambda: z.analyze(S))
+    # the plan keeps samples, windowed copy and P1, zoom its history, outputs and P1
+    fft_floats = L + (L if plan.window is not None else 0) + L // 2 + 1
+    zoom_floats = 2 * (z.history + BLOCK) + 2 * z.M + z.M
+    print(L, '\t', z.D, '\t', error, '\t', fft_us, '\t', zoom_us, '\t', fft_floats, '\t', zoom_floats)
@@ -0,0 +1,123 @@
+# Purpose:
+# - double buffered (ping-pong) capture from an I2S microphone
+# - one buffer fills from the I2S DMA while the other one is analyzed/written
+#
+# A capture thread moves DMA blocks of block_samples 32-bit words into
+# whichever of the two buffers is free. It only uses non-blocking reads and
+# sleeps between them, so the analysis in the main thread keeps running.
+# If both buffers still wait for the analyzer, the thread keeps draining
+# I2S into a scratch block and counts the lost samples, so the DMA ring
+# never overflows silently. Every capture carries the position of its
+# first sample, a gap between two captures means samples were dropped.
+#
+# Usage:
+#   pipe = capture.PingPong(audio_in, L)
+#   pipe.start()
+#   index = pipe.get()
+#   ... analyze pipe.buffers[index] ...
+#   pipe.release(index)
+#   pipe.stop()
+
+import _thread
+import utime
+import i2s_decode
+
+FREE = 0
+FILLING = 1
+READY = 2
+BUSY = 3
+
+
+class PingPong:
+    def __init__(self, audio_in, num_samples, block_samples=256):
+        self.audio_in = audio_in
+        self.num_samples = num_samples
+        self.block_samples = block_samples
+        self.buffers = [i2s_decode.int32_buffer(num_samples), i2s_decode.int32_buffer(num_samples)]
+        self.positions = [0, 0]
+        self._views = [memoryview(self.buffers[0]), memoryview(self.buffers[1])]
+        self._scratch = memoryview(i2s_decode.int32_buffer(block_samples))
+        self._state = [FREE, FREE]
+        self._lock = _thread.allocate_lock()
+        self._running = False
+        self._stopped = True
+
+        self.position = 0        # samples read from I2S, including dropped ones
+        self.frames = 0          # complete captures handed to the analyzer
+        self.dropped = 0         # samples thrown away while both buffers were busy
+
+    def frames_dropped(self):
+        return self.dropped // self.num_samples
+
+    def start(self):
+        self._running = True
+        self._stopped = False
+        _thread.start_new_thread(self._capture, ())
+
+    def stop(self):
+        self._running = False
+        while not self._stopped:
+            utime.sleep_ms(1)
+
+    def _read(self, view, start, stop):
+        # non-blocking, returns the number of 32-bit samples read
+        num_bytes = self.audio_in.readinto(view[start:stop], timeout=0)
+        if not num_bytes:
+            utime.sleep_ms(1)
+            return 0
+        return num_bytes // i2s_decode.SAMPLE_SIZE_IN_BYTES
+
+    def _claim(self):
+        with self._lock:
+            for index in (0, 1):
+                if self._state[index] == FREE:
+                    self._state[index] = FILLING
+                    return index
+        return None
+
+    def _capture(self):
+        index = None
+        filled = 0
+        try:
+            while self._running:
+                if index is None:
+                    index = self._claim()
+                    filled = 0
+                    if index is not None:
+                        self.positions[index] = self.position
+                if index is None:
+                    n = self._read(self._scratch, 0, self.block_samples)
+                    self.position += n
+                    self.dropped += n
+                    continue
+                stop = min(filled + self.block_samples, self.num_samples)
+                n = self._read(self._views[index], filled, stop)
+                self.position += n
+                filled += n
+                if filled == self.num_samples:
+                    with self._lock:
+                        self._state[index] = READY
+                    index = None
+        finally:
+            self._stopped = True
+
+    def get(self, timeout_ms=-1):
+        # index of the oldest complete capture, None after timeout_ms
+        start = utime.ticks_ms()
+        while True:
+            with self._lock:
+                ready = [i for i in (0, 1) if self._state[i] == READY]
+                if ready:
+                    index = ready[0]
+                    if len(ready) == 2 and self.positions[1] < self.positions[0]:
+                        index = 1
+                    self._state[index] = BUSY
+                    self.frames += 1
+                    return index
+            if timeout_ms >= 0 and utime.ticks_diff(utime.ticks_ms(), start) >= timeout_ms:
+                return None
+            utime.sleep_ms(1)
+
+    def release(self, index):
+        with self._lock:
+            self._state[index] = FREE
@@ -0,0 +1,138 @@
+# The MIT License (MIT)
+# Copyright (c) 2019 Michael Shi
+# Copyright (c) 2020 Mike Teachman
+# https://opensource.org/licenses/MIT
+
+# Purpose:
+# - read 32-bit audio samples from the left channel of an I2S microphone
+# - continuous monitoring: print the bands of the last FRAME_LENGTH samples
+#   every HOP_LENGTH samples (a few DMA blocks) for RECORD_TIME_IN_MS
+# - the bands are updated block by block with a sliding DFT when that is
+#   cheaper than an FFT per hop, otherwise with a hop sized STFT
+#
+# Hardware tested:
+# - INMP441 microphone module
+# - MSM261S4030H0 microphone module
+
+import os
+import utime
+import spectrum
+import sliding
+import scheduler
+import spectrum_log
+from machine import Pin
+from machine import SD
+from machine import I2S
+
+#======= USER CONFIGURATION =======
+RECORD_TIME_IN_MS = 30000
+SAMPLE_RATE_IN_HZ = 2048
+#======= USER CONFIGURATION =======
+
+SAMPLE_SIZE_IN_BITS = 32
+SAMPLE_SIZE_IN_BYTES = SAMPLE_SIZE_IN_BITS // 8
+NUM_SAMPLES_IN_DMA_BUFFER = 256
+NUM_CHANNELS = 1
+
+#======= Analyzer Settings =======
+FRAME_LENGTH = 2048 # Samples the bands describe, a multiple of NUM_SAMPLES_IN_DMA_BUFFER for the sliding DFT
+HOP_LENGTH = 256    # Samples between two updates, a multiple of NUM_SAMPLES_IN_DMA_BUFFER
+BINS = 20
+START_AT_HZ = 400
+NUMBER_OF_BINS = 5
+WINDOW = spectrum.HANN # spectrum.RECT, spectrum.HANN or spectrum.HAMMING
+METHOD = 'auto'        # 'sliding', 'stft' or 'auto' (cheaper one)
+LOG_FILE = '/sd/audio/continuous.log' # binary log of all updates (see spectrum_log.py), None: only print
+LATENCY_BUDGET_MS = None # pick and adapt frame length, hop and method while running (see scheduler.py), None: the settings above
+CPU_SHARE = 0.5          # with LATENCY_BUDGET_MS: part of the time the analysis and the printing/logging may take
+FRAME_LENGTHS = (4096, 2048, 1024, 512) # with LATENCY_BUDGET_MS: the frame lengths to choose from, longest first
+
+Fs = SAMPLE_RATE_IN_HZ # Sampling frequency
+L = FRAME_LENGTH       # Length of signal
+
+# frequency axis, window, band table and buffers, computed once
+plan = spectrum.get_plan(Fs, L, WINDOW, BINS, START_AT_HZ, NUMBER_OF_BINS)
+f = plan.f
+
+# I2S pins
+bck_pin = Pin('P11')
+ws_pin = Pin('P22')
+sdin_pin = Pin('P21')
+
+audio_in = I2S(
+    I2S.NUM0,
+    bck=bck_pin, ws=ws_pin, sdin=sdin_pin,
+    standard=I2S.PHILIPS,
+    mode=I2S.MASTER_RX,
+    dataformat=I2S.B32,
+    channelformat=I2S.ONLY_LEFT,
+    samplerate=SAMPLE_RATE_IN_HZ,
+    dmacount=50,
+    dmalen=NUM_SAMPLES_IN_DMA_BUFFER
+)
+
+log = None
+if LOG_FILE:
+    sd = SD()
+    try:
+        os.mount(sd, "/sd")
+    except:
+        print('sd already mounted')
+    try:
+        os.stat('/sd/audio')
+    except:
+        os.mkdir('/sd/audio')
+
+schedule = None
+if LATENCY_BUDGET_MS:
+    # measures every stage while running and changes L, hop and method to stay within the budget
+    schedule = scheduler.Scheduler(Fs, (WINDOW, BINS, START_AT_HZ, NUMBER_OF_BINS), FRAME_LENGTHS,
+                                   LATENCY_BUDGET_MS, CPU_SHARE, NUM_SAMPLES_IN_DMA_BUFFER)
+    L, method, hop = schedule.config
+    print('scheduled: L', L, 'hop', hop, method, '- budget', LATENCY_BUDGET_MS, 'ms,', int(CPU_SHARE * 100), '% cpu')
+    results = schedule.monitor(audio_in)
+else:
+    if METHOD == 'auto':
+        use_sliding = sliding.use_sliding(plan, HOP_LENGTH, NUM_SAMPLES_IN_DMA_BUFFER)
+    else:
+        use_sliding = METHOD == 'sliding'
+    print('method:', 'sliding dft' if use_sliding else 'stft', '- update every', HOP_LENGTH * 1000 // Fs, 'ms')
+    results = sliding.monitor(audio_in, plan, HOP_LENGTH, block_samples=NUM_SAMPLES_IN_DMA_BUFFER, sliding=use_sliding)
+
+# the log header holds L, so the log starts with the plan actually used, and
+# every change of L by the scheduler starts a new log segment, <name>_<n>.log
+segment = 0
+if LOG_FILE:
+    log_plan = schedule.plan(schedule.config[0]) if schedule else plan
+    log = spectrum_log.open_log(LOG_FILE, log_plan)
+
+updates = 0
+start_time = utime.ticks_ms()
+try:
+    for result in results:
+        elapsed = utime.ticks_diff(utime.ticks_ms(), start_time)
+        print("result", updates, "(", elapsed, "ms): \t", result)
+        if log:
+            if schedule and schedule.config[0] != log_plan.L:
+                log.close()
+                segment += 1
+                log_plan = schedule.plan(schedule.config[0])
+                log = spectrum_log.open_log(LOG_FILE.replace('.log', '_%d.log' % segment), log_plan)
+            log.add(result)
+        updates += 1
+        if elapsed >= RECORD_TIME_IN_MS:
+            break
+except ValueError:
+    print("Value Error! check FRAME_LENGTH and HOP_LENGTH")
+except (KeyboardInterrupt, Exception) as e:
+    print('caught exception {} {}'.format(type(e).__name__, e))
+
+time_needed = utime.ticks_diff(utime.ticks_ms(), start_time)
+print(updates, 'updates in', time_needed, 'milliseconds')
+if schedule:
+    schedule.report()
+
+if log:
+    log.close()
+audio_in.deinit()
+print('All done!')
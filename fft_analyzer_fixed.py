@@ -0,0 +1,142 @@
+# The MIT License (MIT)
+# Copyright (c) 2019 Michael Shi
+# Copyright (c) 2020 Mike Teachman
+# https://opensource.org/licenses/MIT
+
+# Purpose:
+# - read 32-bit audio samples from the left channel of an I2S microphone
+# - snip upper 16-bits from each 32-bit microphone sample, block by block
+# - analyze long recordings with the fixed point path (fixed_fft.py): the
+#   spectrum is computed inside the 16-bit sample buffer, so about 2 bytes
+#   per sample are needed instead of the float arrays of the other scripts
+# - optionally write the 16-bit samples to a WAV file before the analysis
+#
+# Hardware tested:
+# - INMP441 microphone module
+# - MSM261S4030H0 microphone module
+
+import os
+import utime
+import gc
+import spectrum
+import i2s_decode
+import fixed_fft
+import spectrum_log
+from machine import Pin
+from machine import SD
+from machine import I2S
+
+#======= USER CONFIGURATION =======
+RECORD_TIME_IN_MS = 16000
+SAMPLE_RATE_IN_HZ = 2048
+#======= USER CONFIGURATION =======
+
+SAMPLE_SIZE_IN_BITS = 16
+SAMPLE_SIZE_IN_BYTES = SAMPLE_SIZE_IN_BITS // 8
+NUM_SAMPLES_IN_DMA_BUFFER = 256
+NUM_CHANNELS = 1
+
+#======= Analyzer Settings =======
+BIN_SIZE_IN_HZ = 100
+START_AT_HZ = 0
+NUMBER_OF_BINS = 10
+WINDOW = spectrum.HANN # spectrum.RECT, spectrum.HANN or spectrum.HAMMING
+APPROXIMATE = False    # magnitude without sqrt, <4% error
+WRITE_WAV = False      # write every recording to /sd/audio/mic-recording_<i>.wav first
+LOG_FILE = '/sd/audio/spectrum.log' # binary log of all results (see spectrum_log.py), None: only print
+
+Fs = SAMPLE_RATE_IN_HZ # Sampling frequency
+L = int((RECORD_TIME_IN_MS / 1000) * SAMPLE_RATE_IN_HZ) # Length of signal, must be even
+L -= L % 2
+
+# band table and the small per row/column arrays, the only buffer of length
+# L is the 16-bit PCM buffer
+plan = fixed_fft.FixedPlan(Fs, L, WINDOW, BIN_SIZE_IN_HZ, START_AT_HZ, NUMBER_OF_BINS, APPROXIMATE)
+pcm = i2s_decode.pcm16_buffer(L)
+words = i2s_decode.int32_buffer(NUM_SAMPLES_IN_DMA_BUFFER)
+gc.collect()
+print('L:', L, 'samples, rows x columns:', plan.N1, 'x', plan.N2)
+
+# I2S pins
+bck_pin = Pin('P11')
+ws_pin = Pin('P22')
+sdin_pin = Pin('P21')
+
+audio_in = I2S(
+    I2S.NUM0,
+    bck=bck_pin, ws=ws_pin, sdin=sdin_pin,
+    standard=I2S.PHILIPS,
+    mode=I2S.MASTER_RX,
+    dataformat=I2S.B32,
+    channelformat=I2S.ONLY_LEFT,
+    samplerate=SAMPLE_RATE_IN_HZ,
+    dmacount=50,
+    dmalen=NUM_SAMPLES_IN_DMA_BUFFER
+)
+
+def create_wav_header(sampleRate, bitsPerSample, num_channels, num_samples):
+    datasize = num_samples * num_channels * bitsPerSample // 8
+    o = bytes("RIFF",'ascii')                                                   # (4byte) Marks file as RIFF
+    o += (datasize + 36).to_bytes(4,'little')                                   # (4byte) File size in bytes excluding this and RIFF marker
+    o += bytes("WAVE",'ascii')                                                  # (4byte) File type
+    o += bytes("fmt ",'ascii')                                                  # (4byte) Format Chunk Marker
+    o += (16).to_bytes(4,'little')                                              # (4byte) Length of above format data
+    o += (1).to_bytes(2,'little')                                               # (2byte) Format type (1 - PCM)
+    o += (num_channels).to_bytes(2,'little')                                    # (2byte)
+    o += (sampleRate).to_bytes(4,'little')                                      # (4byte)
+    o += (sampleRate * num_channels * bitsPerSample // 8).to_bytes(4,'little')  # (4byte)
+    o += (num_channels * bitsPerSample // 8).to_bytes(2,'little')               # (2byte)
+    o += (bitsPerSample).to_bytes(2,'little')                                   # (2byte)
+    o += bytes("data",'ascii')                                                  # (4byte) Data Chunk Marker
+    o += (datasize).to_bytes(4,'little')                                        # (4byte) Data size in bytes
+    return o
+
+# configure SD card
+sd = SD()
+try:
+    os.mount(sd, "/sd")
+except:
+    print('sd already mounted')
+# create audio dir in case it does not exist
+try:
+    os.stat('/sd/audio')
+except:
+    os.mkdir('/sd/audio')
+
+log = spectrum_log.open_log(LOG_FILE, plan) if LOG_FILE else None
+
+total_time = 0
+
+for i in range(1, 6):
+    print('#'+str(i)+' starting...')
+    try:
+        # the time spent waiting for audio is not counted
+        fixed_fft.read_pcm16(audio_in, pcm, L, NUM_SAMPLES_IN_DMA_BUFFER, words)
+        start_time = utime.ticks_ms()
+
+        if WRITE_WAV:
+            # the analysis overwrites the samples, so they are written first
+            wav = open('/sd/audio/mic-recording_'+str(i)+'.wav','wb')
+            wav.write(create_wav_header(SAMPLE_RATE_IN_HZ, SAMPLE_SIZE_IN_BITS, NUM_CHANNELS, L))
+            wav.write(pcm)
+            wav.close()
+
+        P1, result = plan.analyze(pcm)
+        print("result: \t", result)
+        if log:
+            log.add(result)
+
+        time_needed = utime.ticks_diff(utime.ticks_ms(), start_time)
+        print("--- %s milliseconds ---" % time_needed)
+        total_time += time_needed
+    except (KeyboardInterrupt, Exception) as e:
+        print('caught exception {} {}'.format(type(e).__name__, e))
+        break
+    print('#'+str(i)+' ... done!')
+    print()
+
+if log:
+    log.close()
+audio_in.deinit()
+print('All done!')
+print('Time needed for all calculations: \t', total_time, 'milliseconds\nAverage Time needed: \t', (total_time/5), 'milliseconds')
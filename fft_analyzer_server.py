@@ -0,0 +1,136 @@
+# The MIT License (MIT)
+# Copyright (c) 2019 Michael Shi
+# Copyright (c) 2020 Mike Teachman
+# https://opensource.org/licenses/MIT
+
+# Purpose:
+# - read 32-bit audio samples from the left channel of an I2S microphone
+# - service mode: analyze every capture and publish the band result to all
+#   subscribed TCP clients (see spectrum_server.py) for RECORD_TIME_IN_MS
+# - slow clients lose their oldest frames, the capture never waits for them
+#
+# The network has to be up before (boot.py, or the access point the board
+# opens by default). Subscribe with host/spectrum_client.py.
+#
+# Hardware tested:
+# - INMP441 microphone module
+# - MSM261S4030H0 microphone module
+
+import utime
+import spectrum
+import i2s_decode
+import capture
+import spectrum_server
+import profiling
+from machine import Pin
+from machine import I2S
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+#======= USER CONFIGURATION =======
+RECORD_TIME_IN_MS = 30000 # None: serve until interrupted
+SAMPLE_RATE_IN_HZ = 2048
+#======= USER CONFIGURATION =======
+
+NUM_SAMPLES_IN_DMA_BUFFER = 256
+NUM_CHANNELS = 1
+
+#======= Analyzer Settings =======
+L = 2048
+BINS = 100
+START_AT_HZ = 0
+NUMBER_OF_BINS = 10
+WINDOW = spectrum.RECT # spectrum.RECT, spectrum.HANN or spectrum.HAMMING
+PROFILE = False        # time every stage and print percentiles at the end
+
+#======= Server Settings =======
+PORT = spectrum_server.PORT
+UNIX_SOCKET = None     # also listen on this Unix socket path (Linux host only)
+FORMAT = spectrum_server.BINARY # spectrum_server.BINARY or spectrum_server.JSON
+QUEUE_SIZE = spectrum_server.QUEUE_SIZE # frames kept per client before the oldest is dropped
+
+Fs = SAMPLE_RATE_IN_HZ # Sampling frequency
+
+# frequency axis, window, band table and buffers, computed once
+plan = spectrum.get_plan(Fs, L, WINDOW, BINS, START_AT_HZ, NUMBER_OF_BINS)
+
+# I2S pins
+bck_pin = Pin('P11')
+ws_pin = Pin('P22')
+sdin_pin = Pin('P21')
+
+audio_in = I2S(
+    I2S.NUM0,
+    bck=bck_pin, ws=ws_pin, sdin=sdin_pin,
+    standard=I2S.PHILIPS,
+    mode=I2S.MASTER_RX,
+    dataformat=I2S.B32,
+    channelformat=I2S.ONLY_LEFT,
+    samplerate=SAMPLE_RATE_IN_HZ,
+    dmacount=50,
+    dmalen=NUM_SAMPLES_IN_DMA_BUFFER
+)
+
+profiling.enable(PROFILE)
+
+server = spectrum_server.Server(plan, FORMAT, QUEUE_SIZE)
+
+
+async def analyze_loop(pipe):
+    # Analyze and publish every capture. The capture thread fills the
+    # buffers, this task only yields to the client tasks while it waits.
+    start_time = utime.ticks_ms()
+    busy_ms = 0
+    while RECORD_TIME_IN_MS is None or utime.ticks_diff(utime.ticks_ms(), start_time) < RECORD_TIME_IN_MS:
+        index = pipe.get(timeout_ms=0)
+        if index is None:
+            await asyncio.sleep(0.005)
+            continue
+        t = utime.ticks_ms()
+        t0 = profiling.start()
+        i2s_decode.decode_32(pipe.buffers[index], plan.samples)
+        profiling.lap('decode', t0)
+        P1, result = plan.analyze()
+        # stream time of the first sample of the capture
+        time_ms = pipe.positions[index] * 1000 // Fs
+        pipe.release(index)
+        t0 = profiling.start()
+        server.publish(result, time_ms)
+        profiling.lap('publish', t0)
+        busy_ms += utime.ticks_diff(utime.ticks_ms(), t)
+        # let the clients write
+        await asyncio.sleep(0)
+    return busy_ms
+
+
+async def main():
+    await server.start(PORT, path=UNIX_SOCKET)
+    print('serving', FORMAT, 'frames on port', PORT)
+    if UNIX_SOCKET:
+        print('and on', UNIX_SOCKET)
+    # double buffered capture: the next capture fills from I2S while the
+    # last one is analyzed and sent
+    pipe = capture.PingPong(audio_in, L, NUM_SAMPLES_IN_DMA_BUFFER)
+    pipe.start()
+    try:
+        busy_ms = await analyze_loop(pipe)
+    finally:
+        pipe.stop()
+        server.close()
+        # give the client tasks a moment to finish
+        await asyncio.sleep(0.1)
+    print(server.frames, 'frames published, analysis', busy_ms, 'milliseconds')
+    print('Dropped while analyzing: \t', pipe.frames_dropped(), 'captures (%d samples)' % pipe.dropped)
+    print('Dropped for slow clients: \t', server.dropped, 'frames')
+
+
+try:
+    asyncio.run(main())
+except KeyboardInterrupt:
+    print('interrupted')
+audio_in.deinit()
+print('All done!')
+profiling.report()
@@ -0,0 +1,81 @@
+# The MIT License (MIT)
+# Copyright (c) 2019 Michael Shi
+# Copyright (c) 2020 Mike Teachman
+# https://opensource.org/licenses/MIT
+
+# Purpose:
+# - read 32-bit audio samples from the left channel of an I2S microphone
+# - analyze a long recording with Welch's method: overlapping windowed
+#   segments of SEGMENT_LENGTH samples, averaged power spectrum
+# - the recording time and sample rate are used as configured, only one
+#   segment is held in memory
+#
+# Hardware tested:
+# - INMP441 microphone module
+# - MSM261S4030H0 microphone module
+
+import utime
+import spectrum
+import welch
+from machine import Pin
+from machine import I2S
+
+#======= USER CONFIGURATION =======
+RECORD_TIME_IN_MS = 60000
+SAMPLE_RATE_IN_HZ = 2050
+#======= USER CONFIGURATION =======
+
+SAMPLE_SIZE_IN_BITS = 32
+SAMPLE_SIZE_IN_BYTES = SAMPLE_SIZE_IN_BITS // 8
+NUM_SAMPLE_BYTES_TO_READ = int((RECORD_TIME_IN_MS / 1000) * SAMPLE_RATE_IN_HZ * SAMPLE_SIZE_IN_BYTES)
+NUM_SAMPLES_IN_DMA_BUFFER = 256
+NUM_CHANNELS = 1
+
+#======= Analyzer Settings =======
+SEGMENT_LENGTH = 1024 # Samples per fft, powers of 2 are fastest
+HOP_LENGTH = 512      # Samples between two segments, SEGMENT_LENGTH // 2 = 50% overlap
+BINS = 100
+START_AT_HZ = 0
+NUMBER_OF_BINS = 10
+WINDOW = spectrum.HANN # spectrum.RECT, spectrum.HANN or spectrum.HAMMING
+
+Fs = SAMPLE_RATE_IN_HZ # Sampling frequency
+L = SEGMENT_LENGTH     # Length of signal
+
+# frequency axis, window, band table and buffers, computed once for all segments
+plan = spectrum.get_plan(Fs, L, WINDOW, BINS, START_AT_HZ, NUMBER_OF_BINS)
+f = plan.f
+
+# I2S pins
+bck_pin = Pin('P11')
+ws_pin = Pin('P22')
+sdin_pin = Pin('P21')
+
+audio_in = I2S(
+    I2S.NUM0,
+    bck=bck_pin, ws=ws_pin, sdin=sdin_pin,
+    standard=I2S.PHILIPS,
+    mode=I2S.MASTER_RX,
+    dataformat=I2S.B32,
+    channelformat=I2S.ONLY_LEFT,
+    samplerate=SAMPLE_RATE_IN_HZ,
+    dmacount=50,
+    dmalen=NUM_SAMPLES_IN_DMA_BUFFER
+)
+
+print('Recording', RECORD_TIME_IN_MS, 'ms at', Fs, 'Hz in segments of', L, 'samples')
+start_time = utime.ticks_ms()
+try:
+    averager = welch.average(audio_in, plan, HOP_LENGTH, max_bytes=NUM_SAMPLE_BYTES_TO_READ, sample_bytes=SAMPLE_SIZE_IN_BYTES)
+    print('segments averaged: \t', averager.count)
+    print("result: \t", averager.bands())
+except ValueError:
+    print("Value Error! check SEGMENT_LENGTH and HOP_LENGTH")
+except (KeyboardInterrupt, Exception) as e:
+    print('caught exception {} {}'.format(type(e).__name__, e))
+
+time_needed = utime.ticks_diff(utime.ticks_ms(), start_time)
+print("--- %s milliseconds ---" % time_needed)
+
+audio_in.deinit()
+print('All done!')
@@ -18,12 +18,18 @@
 import os
 import utime
 import ulab as np
+import spectrum
+import i2s_decode
+import capture
+import goertzel
+import zoom
+import peaks
+import filterbank
+import spectrum_log
+import profiling
 from machine import Pin
 from machine import SD
 from machine import I2S
-from ulab import fft
-from ulab import vector
-from ulab import numerical
 import math
 import sys
 
@@ -35,33 +41,26 @@ SAMPLE_RATE_IN_HZ = 2050
 SAMPLE_SIZE_IN_BITS = 32
 SAMPLE_SIZE_IN_BYTES = SAMPLE_SIZE_IN_BITS // 8
 MIC_SAMPLE_BUFFER_SIZE_IN_BYTES = 4096
-NUM_SAMPLE_BYTES_TO_WRITE = int((RECORD_TIME_IN_MS / 1000) * SAMPLE_RATE_IN_HZ * SAMPLE_SIZE_IN_BYTES) # 32768 MAX!
 NUM_SAMPLES_IN_DMA_BUFFER = 256
 NUM_CHANNELS = 1
 
-L = NUM_SAMPLE_BYTES_TO_WRITE // 4  # Length of signal
+# any length works for the fft, sample rate and record time are used as configured
+L = int((RECORD_TIME_IN_MS / 1000) * SAMPLE_RATE_IN_HZ)  # Length of signal
+NUM_SAMPLE_BYTES_TO_WRITE = L * SAMPLE_SIZE_IN_BYTES # 32768 MAX!
 
 #======= Analyzer Settings =======
 BINS = 100
 START_AT_HZ = 0
 NUMBER_OF_BINS = 10
-
-
-# Calculate next higher power of 2 to NUM_SAMPLE_BYTES_TO_WRITE.
-print("Calculating next higher power of 2 to NUM_SAMPLE_BYTES_TO_WRITE:")
-print("NUM_SAMPLE_BYTES_TO_WRITE Before: \t", NUM_SAMPLE_BYTES_TO_WRITE)
-def bitLenCount(int_type):
-    length = 0
-    count = 0
-    while (int_type):
-        count += (int_type & 1)
-        length += 1
-        int_type >>= 1
-    return math.pow(2, length)
-L = int(bitLenCount(L))
-NUM_SAMPLE_BYTES_TO_WRITE = int(bitLenCount(L)) * 4
-SAMPLE_RATE_IN_HZ = int(NUM_SAMPLE_BYTES_TO_WRITE // (SAMPLE_SIZE_IN_BYTES * (RECORD_TIME_IN_MS / 1000)))
-print("NUM_SAMPLE_BYTES_TO_WRITE After: \t", NUM_SAMPLE_BYTES_TO_WRITE)
+WINDOW = spectrum.RECT # spectrum.RECT, spectrum.HANN or spectrum.HAMMING
+ANALYSIS = 'auto'      # 'fft', 'goertzel' (only the band bins), 'zoom' (decimated band slice, see zoom.py) or 'auto' (fft or goertzel, the cheaper one)
+LOG_FILE = '/sd/audio/spectrum.log' # binary log of all results (see spectrum_log.py), None: only print
+PROFILE = False        # time every stage and print percentiles at the end
+PEAKS = 0              # also print the strongest peaks with sub-bin frequency (see peaks.py), 0: off
+LAYOUT = None          # also print filterbank.OCTAVE, THIRD_OCTAVE or MEL bands up to Nyquist, None: off
+FILTERBANK_CACHE = '/flash' # directory for the filterbank weights, None: build them on every start
+
+print("NUM_SAMPLE_BYTES_TO_WRITE: \t", NUM_SAMPLE_BYTES_TO_WRITE)
 print()
 
 Fs = SAMPLE_RATE_IN_HZ#1230 # Sampling frequency
@@ -69,10 +68,9 @@ T = 1/Fs                    # Sampling period
 
 #t = np.array(range(0,L))*T  # Time vector in ms
 
-f = Fs*np.array(range(0,(L//2)+1))/L
-
-bins = int(BINS / f[1])
-start_at_hz = int(START_AT_HZ / f[1])
+# frequency axis, window, band table and buffers, computed once for all rounds
+plan = spectrum.get_plan(Fs, L, WINDOW, BINS, START_AT_HZ, NUMBER_OF_BINS)
+f = plan.f
 
 
 # I2S pins
@@ -92,14 +90,6 @@ audio_in = I2S(
     dmalen=NUM_SAMPLES_IN_DMA_BUFFER
 )
 
-def combine_samples(samples):
-    num_samples = len(samples) // SAMPLE_SIZE_IN_BYTES
-    result = []
-    for i in range(num_samples):
-        #print(i)
-        result += [samples[4 * i] * math.pow(2, 24) + samples[4 * i + 1] * math.pow(2, 16) + samples[4 * i + 2] * math.pow(2, 8) + samples[4 * i + 3]]
-    return np.array(result)
-
 # configure SD card
 #   slot=2 configures SD card to use the SPI3 controller (VSPI), DMA channel = 2
 #   slot=3 configures SD card to use the SPI2 controller (HSPI), DMA channel = 1
@@ -114,20 +104,38 @@ try:
 except:
     os.mkdir('/sd/audio')
 
+profiling.enable(PROFILE)
+
+# a few bytes per result, written to the SD card in whole blocks
+log = spectrum_log.open_log(LOG_FILE, plan) if LOG_FILE else None
+
+use_goertzel = ANALYSIS == 'goertzel' or (ANALYSIS == 'auto' and goertzel.cheaper_than_fft(plan))
+if use_goertzel:
+    # the band bins are filtered block by block while the DMA buffers arrive
+    filters = goertzel.BandFilters(plan, NUM_SAMPLES_IN_DMA_BUFFER)
+    print('analysis: goertzel,', filters.K, 'bins')
+elif ANALYSIS == 'zoom' and zoom.factor(plan, NUM_SAMPLES_IN_DMA_BUFFER) > 1:
+    # mixed down and decimated block by block, one short complex fft per capture
+    filters = zoom.Zoom(plan, NUM_SAMPLES_IN_DMA_BUFFER)
+    print('analysis: zoom, decimated by', filters.D)
+else:
+    filters = None
+    # double buffered capture: while one capture is analyzed the next one
+    # already fills from I2S, so no audio is lost during the fft
+    pipe = capture.PingPong(audio_in, L, NUM_SAMPLES_IN_DMA_BUFFER)
+    pipe.start()
+    print('analysis: fft')
+
+# only on the fft path, the goertzel and zoom filters do not compute all of P1
+finder = peaks.PeakFinder(plan, PEAKS) if PEAKS and not filters else None
+bank = filterbank.get(Fs, L, LAYOUT, cache_dir=FILTERBANK_CACHE) if LAYOUT and not filters else None
+
 total_time = 0
 
 for i in range(1, 6):
     #txt = open('/sd/audio/fft-to-recording_'+str(i)+'.txt','wb')
     #txt = open('/sd/audio/fft-to-recording_'+str(i)+'.txt','w')
 
-    # allocate sample arrays
-    #   memoryview used to reduce heap allocation in while loop
-
-    mic_samples = bytearray(NUM_SAMPLE_BYTES_TO_WRITE)
-    mic_samples_mv = memoryview(mic_samples)
-    #store_samples = bytearray(41823)
-    #store_samples_mv = memoryview(store_samples)
-
     num_sample_bytes_written = 0
 
     # make the LED light up in red color
@@ -135,76 +143,63 @@ for i in range(1, 6):
     #time.sleep(0.5)
     #pycom.rgbled(0x110000)
     print('#'+str(i)+' starting...')
+    if filters:
+        filters.busy_us = 0
+        result = filters.capture(audio_in)
+        print("result: \t", result)
+        if log:
+            t = profiling.start()
+            log.add(result)
+            profiling.lap('log', t)
+        num_sample_bytes_written += NUM_SAMPLE_BYTES_TO_WRITE
+        # only the filtering counts, not the time spent waiting for audio
+        time_needed = filters.busy_us // 1000
+        print("--- %s milliseconds ---" % time_needed)
+        total_time += time_needed
+        print('#'+str(i)+' ... done! -- %d sample bytes' % num_sample_bytes_written)
+        print()
+        continue
+
+    # wait for the next complete capture, the time spent waiting for audio is not counted
+    t = profiling.start()
+    index = pipe.get()
+    profiling.lap('wait', t)
     start_time = utime.ticks_ms()
-    # read 32-bit samples from I2S microphone, snip upper 16-bits, write snipped samples to WAV file
-    start = True
-    while num_sample_bytes_written < NUM_SAMPLE_BYTES_TO_WRITE:
-
-        #try:
-        # try to read a block of samples from the I2S microphone
-        # readinto() method returns 0 if no DMA buffer is full
-        #start_time_2 = utime.ticks_ms()
-        num_bytes_read_from_mic = audio_in.readinto(mic_samples_mv, timeout=-1)
-        #print("Audio in: \t", utime.ticks_ms() - start_time_2, "ms")
-
-        #print(len(list(mic_samples_mv)))
-        #print(num_bytes_read_from_mic)
-
-        #if(num_bytes_read_from_mic > 0)
-
-            #store_samples_mv[num_sample_bytes_written:num_bytes_read_from_mic] = #mic_samples_mv[:num_bytes_read_from_mic-1]
-
-            #num_sample_bytes_written += num_bytes_read_from_mic
-
-        if num_bytes_read_from_mic == NUM_SAMPLE_BYTES_TO_WRITE:
-            #calculate fft
-            #print("if")
-            try:
-                real, imaginary = fft.fft(combine_samples(mic_samples_mv))
-                #real, imaginary = fft.fft(np.array(list(mic_samples_mv[:num_bytes_read_from_mic])))
-                print('fft finished')
-                real = real/L
-                imaginary = imaginary/L
-                P2 = vector.sqrt(real*real + imaginary*imaginary)
-                print('average power: ', P2[0])
-                P1 = P2[1:L//2+1]
-
-                P1[:(P1.size() - 1)] = 2*P1[:(P1.size() - 1)]
-
-                #print(P1)
-                #print(P1.size())
-                #print(P1[P1.size() - 10:P1.size() - 1])
-                #print(f.size())
-                result = []
-                #print('Bins: \t', bins)
-                for x in range(0,NUMBER_OF_BINS):
-                    min = (start_at_hz + bins * x)
-                    max = (start_at_hz + (bins*(x+1)) - 1)
-                    #print(max)
-                    if max < P1.size():
-                        rang = P1[min:max]
-                        #max = numerical.max(rang)
-                        max = sum(rang) / len(rang)
-                        result += [max]
-                    elif min < P1.size():
-                        rang = P1[min:P1.size()-1]
-                        max = numerical.max(rang)
-                        #max = sum(rang) / len(rang)
-                        result += [max]
-                    else:
-                        result += [0]
-                print("result: \t", result)
-                num_sample_bytes_written += num_bytes_read_from_mic
-            except ValueError:
-                print("Value Error! is NUM_SAMPLE_BYTES_TO_WRITE power of 2?")
-
-        '''
-        except (KeyboardInterrupt, Exception) as e:
-            print('caught exception {} {}'.format(type(e).__name__, e))
-            print(e)
-            audio_in.deinit()
-            break
-    '''
+
+    #calculate fft
+    try:
+        # 32-bit words straight into the float input of the plan
+        t = profiling.start()
+        i2s_decode.decode_32(pipe.buffers[index], plan.samples)
+        profiling.lap('decode', t)
+        P1, result = plan.analyze()
+        print('fft finished')
+        print('average power: ', P1[0])
+
+        #print(P1)
+        #print(P1.size())
+        #print(f.size())
+        print("result: \t", result)
+        if bank:
+            t = profiling.start()
+            bank.reduce(P1, spectrum.MEAN, bank.result)
+            profiling.lap('filterbank', t)
+            print(LAYOUT, "bands: \t", bank.result)
+        if finder:
+            t = profiling.start()
+            frequencies, amplitudes = finder.find(P1)
+            profiling.lap('peaks', t)
+            print("peaks (Hz): \t", frequencies)
+            print("amplitudes: \t", amplitudes)
+        if log:
+            t = profiling.start()
+            log.add(result)
+            profiling.lap('log', t)
+        num_sample_bytes_written += NUM_SAMPLE_BYTES_TO_WRITE
+    except ValueError:
+        print("Value Error! is NUM_SAMPLE_BYTES_TO_WRITE too small?")
+    # hand the buffer back to the capture thread
+    pipe.release(index)
 
     time_needed = utime.ticks_diff(utime.ticks_ms(), start_time)
     print("--- %s milliseconds ---" % time_needed)
@@ -223,8 +218,15 @@ for i in range(1, 6):
     #pycom.rgbled(0x001100)
 
     #time.sleep(2)
+if not filters:
+    pipe.stop()
+if log:
+    log.close()
 # do not deinit audio in case you will record an other round
 audio_in.deinit()
 print('All done!')
+if not filters:
+    print('Dropped while analyzing: \t', pipe.frames_dropped(), 'captures (%d samples)' % pipe.dropped)
 
 print('Time needed for all calculations: \t', total_time, 'milliseconds\nAverage Time needed: \t', (total_time/5), 'milliseconds')
+profiling.report()
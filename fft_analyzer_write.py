@@ -5,6 +5,7 @@
 
 # Purpose:
 # - read 32-bit audio samples from the left channel of an I2S microphone
+#   (or from both channels of two microphones, NUM_CHANNELS = 2)
 # - snip upper 16-bits from each 32-bit microphone sample
 # - write 16-bit samples to a SD card file using WAV format
 #
@@ -18,12 +19,15 @@
 import os
 import utime
 import ulab as np
+import spectrum
+import multichannel
+import i2s_decode
+import capture
+import spectrum_log
+import profiling
 from machine import Pin
 from machine import SD
 from machine import I2S
-from ulab import fft
-from ulab import vector
-from ulab import numerical
 import math
 import sys
 
@@ -37,49 +41,33 @@ SAMPLE_SIZE_IN_BYTES = SAMPLE_SIZE_IN_BITS // 8
 MIC_SAMPLE_BUFFER_SIZE_IN_BYTES = 4096
 NUM_SAMPLE_BYTES_TO_WRITE = int((RECORD_TIME_IN_MS / 1000) * SAMPLE_RATE_IN_HZ * SAMPLE_SIZE_IN_BYTES) # 32768 MAX!
 NUM_SAMPLES_IN_DMA_BUFFER = 256
-NUM_CHANNELS = 1
+NUM_CHANNELS = 1 # 2: two microphones on one I2S bus (L/R select pins on GND and VDD), stereo WAV files
 
 #======= Analyzer Settings =======
 BIN_SIZE_IN_HZ = 100
 START_AT_HZ = 0
 NUMBER_OF_BINS = 10
+WINDOW = spectrum.RECT # spectrum.RECT, spectrum.HANN or spectrum.HAMMING
+LOG_FILE = '/sd/audio/spectrum.log' # binary log of all results (see spectrum_log.py), None: only print; spectrum_<channel>.log with more channels
+PROFILE = False        # time every stage and print percentiles at the end
 
-
-# Calculate next higher power of 2 to NUM_SAMPLE_BYTES_TO_WRITE.
-print("Calculating next higher power of 2 to NUM_SAMPLE_BYTES_TO_WRITE:")
-print("NUM_SAMPLE_BYTES_TO_WRITE Before: \t", NUM_SAMPLE_BYTES_TO_WRITE)
-def bitLenCount(int_type):
-    length = 0
-    count = 0
-    while (int_type):
-        count += (int_type & 1)
-        length += 1
-        int_type >>= 1
-    return math.pow(2, length)
-NUM_SAMPLE_BYTES_TO_WRITE = int(bitLenCount(NUM_SAMPLE_BYTES_TO_WRITE))
-SAMPLE_RATE_IN_HZ = int(NUM_SAMPLE_BYTES_TO_WRITE // (SAMPLE_SIZE_IN_BYTES * (RECORD_TIME_IN_MS / 1000)))
-print("NUM_SAMPLE_BYTES_TO_WRITE New: \t\t", NUM_SAMPLE_BYTES_TO_WRITE)
-print("SAMPLE_RATE_IN_HZ New: \t\t\t", SAMPLE_RATE_IN_HZ)
+# any length works for the fft, sample rate and record time are used as configured
+print("NUM_SAMPLE_BYTES_TO_WRITE: \t", NUM_SAMPLE_BYTES_TO_WRITE)
+print("SAMPLE_RATE_IN_HZ: \t\t", SAMPLE_RATE_IN_HZ)
 print()
 
 Fs = SAMPLE_RATE_IN_HZ#1230 # Sampling frequency
 T = 1/Fs                    # Sampling period
 
-L = NUM_SAMPLE_BYTES_TO_WRITE # Length of signal
-
-f = Fs*np.array(range(0,(L//2)+1))/L
-
-bins = int(BIN_SIZE_IN_HZ / f[1])
-start_at_hz = int(START_AT_HZ / f[1])
+L = NUM_SAMPLE_BYTES_TO_WRITE // SAMPLE_SIZE_IN_BYTES # Length of signal
+NUM_MIC_SAMPLE_BYTES = L * i2s_decode.SAMPLE_SIZE_IN_BYTES # 32-bit words from I2S
 
+# frequency axis, window, band table and buffers, computed once for all rounds
+# and shared by all channels
+multi = multichannel.MultiPlan(Fs, L, NUM_CHANNELS, WINDOW, BIN_SIZE_IN_HZ, START_AT_HZ, NUMBER_OF_BINS)
+plan = multi.plan
+f = plan.f
 
-def snip_16_mono(samples_in, samples_out):
-    num_samples = len(samples_in) // 4
-    for i in range(num_samples):
-        samples_out[2*i] = samples_in[4*i + 2]
-        samples_out[2*i + 1] = samples_in[4*i + 3]
-
-    return num_samples * 2
 
 def create_wav_header(sampleRate, bitsPerSample, num_channels, num_samples):
     datasize = num_samples * num_channels * bitsPerSample // 8
@@ -103,7 +91,7 @@ wav_header = create_wav_header(
     SAMPLE_RATE_IN_HZ,
     SAMPLE_SIZE_IN_BITS,
     NUM_CHANNELS,
-    SAMPLE_RATE_IN_HZ * (RECORD_TIME_IN_MS // 1000)
+    L
 )
 
 # I2S pins
@@ -117,7 +105,7 @@ audio_in = I2S(
     standard=I2S.PHILIPS,
     mode=I2S.MASTER_RX,
     dataformat=I2S.B32,
-    channelformat=I2S.ONLY_LEFT,
+    channelformat=I2S.ONLY_LEFT if NUM_CHANNELS == 1 else I2S.RIGHT_LEFT,
     samplerate=SAMPLE_RATE_IN_HZ,
     dmacount=50,
     dmalen=NUM_SAMPLES_IN_DMA_BUFFER
@@ -137,22 +125,33 @@ try:
 except:
     os.mkdir('/sd/audio')
 
+profiling.enable(PROFILE)
+
+# a few bytes per result, written to the SD card in whole blocks, one log
+# per channel
+logs = []
+if LOG_FILE:
+    for c in range(NUM_CHANNELS):
+        name = LOG_FILE if NUM_CHANNELS == 1 else LOG_FILE.replace('.log', '_%d.log' % c)
+        logs.append(spectrum_log.open_log(name, plan))
+
+# double buffered capture: while one capture is analyzed and written to SD
+# the next one already fills from I2S, so no audio is lost in between
+pipe = capture.PingPong(audio_in, L * NUM_CHANNELS, NUM_SAMPLES_IN_DMA_BUFFER)
+
+# allocate sample arrays once, every round decodes into the same buffers
+#   pipe.buffers: 32-bit words from I2S, channels interleaved
+#   wav_samples: snipped 16-bit PCM for the WAV file, channels interleaved
+#   multi.samples: the same 16-bit samples as floats for the FFT, per channel
+wav_samples = i2s_decode.pcm16_buffer(L * NUM_CHANNELS)
+
 total_time = 0
+pipe.start()
 
 for i in range(1, 6):
     #txt = open('/sd/audio/fft-to-recording_'+str(i)+'.txt','wb')
     #txt = open('/sd/audio/fft-to-recording_'+str(i)+'.txt','w')
 
-    # allocate sample arrays
-    #   memoryview used to reduce heap allocation in while loop
-
-    mic_samples = bytearray(NUM_SAMPLE_BYTES_TO_WRITE)
-    mic_samples_mv = memoryview(mic_samples)
-    wav_samples = bytearray(NUM_SAMPLE_BYTES_TO_WRITE)
-    wav_samples_mv = memoryview(wav_samples)
-    #store_samples = bytearray(41823)
-    #store_samples_mv = memoryview(store_samples)
-
     num_sample_bytes_written = 0
 
     # make the LED light up in red color
@@ -160,87 +159,57 @@ for i in range(1, 6):
     #time.sleep(0.5)
     #pycom.rgbled(0x110000)
     print('#'+str(i)+' starting...')
+    # wait for the next complete capture, the time spent waiting for audio is not counted
+    t = profiling.start()
+    index = pipe.get()
+    profiling.lap('wait', t)
     start_time = utime.ticks_ms()
-    # read 32-bit samples from I2S microphone, snip upper 16-bits, write snipped samples to WAV file
-    start = True
-    while num_sample_bytes_written < NUM_SAMPLE_BYTES_TO_WRITE:
-
+    try:
+        # snip upper 16-bits from each 32-bit microphone sample, once for WAV and fft
+        t = profiling.start()
+        wav_pcm = i2s_decode.decode_16_channels(pipe.buffers[index], wav_samples, multi.samples)
+        profiling.lap('decode', t)
+        # the 32-bit words are not needed anymore, capturing can go on
+        pipe.release(index)
+
+        #calculate fft
         try:
-            # try to read a block of samples from the I2S microphone
-            # readinto() method returns 0 if no DMA buffer is full
-            #start_time_2 = utime.ticks_ms()
-            num_bytes_read_from_mic = audio_in.readinto(mic_samples_mv, timeout=-1)
-            #print("Audio in: \t", utime.ticks_ms() - start_time_2, "ms")
-
-            #print(len(list(mic_samples_mv)))
-            #print(num_bytes_read_from_mic)
-
-            #if(num_bytes_read_from_mic > 0)
-
-                #store_samples_mv[num_sample_bytes_written:num_bytes_read_from_mic] = #mic_samples_mv[:num_bytes_read_from_mic-1]
-
-                #num_sample_bytes_written += num_bytes_read_from_mic
-
-            if num_bytes_read_from_mic == NUM_SAMPLE_BYTES_TO_WRITE:
-                #calculate fft
-                #print("if")
-                try:
-                    real, imaginary = fft.fft(np.array(list(mic_samples_mv[:num_bytes_read_from_mic])))
-                    print('fft finished')
-                    real = real/L
-                    imaginary = imaginary/L
-                    P2 = vector.sqrt(real*real + imaginary*imaginary)
-                    print('average power: ', P2[0])
-                    P1 = P2[1:L//2+1]
-
-                    P1[:(P1.size() - 1)] = 2*P1[:(P1.size() - 1)]
-
-                    #print(P1)
-                    #print(P1.size())
-                    #print(P1[P1.size() - 10:P1.size() - 1])
-                    #print(f.size())
-                    result = []
-                    #print('Bins: \t', bins)
-                    for x in range(0,NUMBER_OF_BINS):
-                        min = (start_at_hz + bins * x)
-                        max = (start_at_hz + (bins*(x+1)) - 1)
-                        #print(max)
-                        if max < P1.size():
-                            rang = P1[min:max]
-                            #max = numerical.max(rang)
-                            max = sum(rang) / len(rang)
-                            result += [max]
-                        elif min < P1.size():
-                            rang = P1[min:P1.size()-1]
-                            max = numerical.max(rang) # max
-                            #max = sum(rang) / len(rang) # average
-                            result += [max]
-                        else:
-                            result += [0]
-                    print("result: \t", result)
-                    num_sample_bytes_written += num_bytes_read_from_mic
-                except ValueError:
-                    print("Value Error! is NUM_SAMPLE_BYTES_TO_WRITE power of 2?")
-
-                time_needed = utime.ticks_diff(utime.ticks_ms(), start_time)
-                print("--- %s milliseconds ---" % time_needed)
-                total_time += time_needed
-
-                wav = open('/sd/audio/mic-recording_'+str(i)+'.wav','wb')
-
-                num_bytes_written = wav.write(wav_header)
-                # snip upper 16-bits from each 32-bit microphone sample
-                num_bytes_snipped = snip_16_mono(mic_samples_mv[:num_bytes_read_from_mic], wav_samples_mv)
-                # write samples to WAV file
-                num_bytes_written = wav.write(wav_samples_mv[:num_bytes_snipped])
-
-                wav.close()
-                print("Done Writing wav to sd.")
-        except (KeyboardInterrupt, Exception) as e:
-            print('caught exception {} {}'.format(type(e).__name__, e))
-            print(e)
-            audio_in.deinit()
-            break
+            P1s, results = multi.analyze()
+            print('fft finished')
+            print('average power: ', P1s[0][0])
+
+            #print(P1)
+            #print(P1.size())
+            #print(f.size())
+            for c in range(NUM_CHANNELS):
+                print("result: \t", results[c])
+            if logs:
+                t = profiling.start()
+                for c in range(NUM_CHANNELS):
+                    logs[c].add(results[c])
+                profiling.lap('log', t)
+            num_sample_bytes_written += NUM_SAMPLE_BYTES_TO_WRITE * NUM_CHANNELS
+        except ValueError:
+            print("Value Error! is NUM_SAMPLE_BYTES_TO_WRITE too small?")
+
+        t = profiling.start()
+        wav = open('/sd/audio/mic-recording_'+str(i)+'.wav','wb')
+
+        num_bytes_written = wav.write(wav_header)
+        # write samples to WAV file
+        num_bytes_written = wav.write(wav_pcm)
+
+        wav.close()
+        profiling.lap('wav.write', t)
+        print("Done Writing wav to sd.")
+
+        time_needed = utime.ticks_diff(utime.ticks_ms(), start_time)
+        print("--- %s milliseconds ---" % time_needed)
+        total_time += time_needed
+    except (KeyboardInterrupt, Exception) as e:
+        print('caught exception {} {}'.format(type(e).__name__, e))
+        print(e)
+        break
     #txt.close()
     # do not unmount and deinit SD in case you want to read files via WiFi and a FTP connection
     #os.umount("/sd")
@@ -255,8 +224,13 @@ for i in range(1, 6):
     #pycom.rgbled(0x001100)
 
     #time.sleep(2)
+pipe.stop()
+for log in logs:
+    log.close()
 # do not deinit audio in case you will record an other round
 audio_in.deinit()
 print('All done!')
+print('Dropped while analyzing: \t', pipe.frames_dropped(), 'captures (%d samples)' % pipe.dropped)
 
 print('Time needed for all calculations: \t', total_time, 'milliseconds\nAverage Time needed: \t', (total_time/5), 'milliseconds')
+profiling.report()
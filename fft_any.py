@@ -0,0 +1,517 @@
+# Purpose:
+# - FFT of any length, so sample rate and record time can be used as
+#   configured instead of being rounded to a power of 2
+#
+# fft() has the same interface as ulab's fft.fft (real, imaginary in and out)
+# and hands powers of 2 straight to it. Other lengths are planned once:
+# - lengths N = R * 2^d with a small odd part R = 3^a * 5^b * 7^c
+#   (R <= MAX_MIXED_RADIX) use mixed radix decimation in time: N = p * M,
+#   p FFTs of length M over x[r::p] (recursively), combined with twiddles
+#   and p-point butterflies into the N bins. That ends in R power of 2
+#   fft.fft calls.
+# - other lengths 2^a * 3^b * 5^c use a Stockham FFT: one stage per radix
+#   (2, 3, 4 or 5, smallest first), each a butterfly over N/p long vectors,
+#   twiddles from a table, and strided copies that leave the bins in
+#   natural order. No fft.fft calls, the number of array operations grows
+#   with the number of stages, not with R.
+# - anything else (a factor 7 in a large odd part, or larger prime factors)
+#   uses Bluestein's algorithm: the DFT is written as a convolution with a
+#   chirp, done with power of 2 FFTs of length >= 2N - 1
+# The last CACHE_SIZE plans are kept. Each plan keeps its outputs and
+# butterfly scratch, so a transform allocates little more than its fft.fft
+# calls; the returned arrays are overwritten by the next fft() of the same
+# length. relative_cost() estimates what the chosen plan costs compared to
+# a power of 2 FFT of the same length.
+
+import math
+import ulab as np
+from ulab import fft as _fft
+
+RADICES = (3, 5, 7)
+# largest odd part done with fft.fft calls, larger 5-smooth ones use the
+# Stockham stages
+MAX_MIXED_RADIX = 15
+CACHE_SIZE = 4
+# a butterfly stage runs as separate array operations, about this many
+# times a radix 2 pass of fft.fft per log2(p)
+STAGE_COST = 2
+# the chirp products and the pointwise product of Bluestein, per padded sample
+BLUESTEIN_EXTRA = 6
+
+
+def is_power_of_2(n):
+    return n > 0 and not n & (n - 1)
+
+
+def next_power_of_2(n):
+    p = 1
+    while p < n:
+        p <<= 1
+    return p
+
+
+def _transform(re, im):
+    # ulab fft.fft of a power of 2 length, length 1 is the identity
+    if len(re) == 1:
+        return re * 1, (re * 0 if im is None else im * 1)
+    if im is None:
+        return _fft.fft(re)
+    return _fft.fft(re, im)
+
+
+def _cos_sin(angles):
+    # cos and sin arrays of a list of angles computed in double precision
+    return np.array([math.cos(a) for a in angles]), np.array([math.sin(a) for a in angles])
+
+
+def _inplace():
+    # True if a *= b and a **= b update a instead of binding a new array
+    a = np.zeros(2)
+    b = a
+    try:
+        a += 1
+        a *= a
+        a **= 0.5
+    except (TypeError, NotImplementedError):
+        return False
+    return a is b
+
+
+INPLACE = _inplace()
+
+
+# Array arithmetic into existing arrays, with in-place operators where the
+# firmware has them, so a transform leaves no garbage of its own.
+def _add(out, a, b):
+    out[:] = a
+    if INPLACE:
+        out += b
+    else:
+        out[:] = out + b
+    return out
+
+
+def _sub(out, a, b):
+    out[:] = a
+    if INPLACE:
+        out -= b
+    else:
+        out[:] = out - b
+    return out
+
+
+def _iadd(x, y):
+    if INPLACE:
+        x += y
+    else:
+        x[:] = x + y
+
+
+def _isub(x, y):
+    if INPLACE:
+        x -= y
+    else:
+        x[:] = x - y
+
+
+def _scale(x, k):
+    if INPLACE:
+        x *= k
+    else:
+        x[:] = x * k
+
+
+def _rotate(re, im, c, s, t0, t1):
+    # re + j*im times exp(-j*theta) in place, c and s the cos and sin of
+    # theta; t0 and t1 are scratch
+    t0[:] = im
+    _scale(t0, s)
+    t1[:] = re
+    _scale(t1, s)
+    _scale(re, c)
+    _iadd(re, t0)
+    _scale(im, c)
+    _isub(im, t1)
+
+
+S3 = math.sin(2 * math.pi / 3)
+# (cos(2*pi/5) - cos(4*pi/5)) / 2, the mean of both cosines is -1/4
+C5 = (math.cos(2 * math.pi / 5) - math.cos(4 * math.pi / 5)) / 2
+S5_1 = math.sin(2 * math.pi / 5)
+S5_2 = math.sin(4 * math.pi / 5)
+# scratch arrays _butterfly() needs
+SCRATCH = 10
+
+
+def _arrays(count, n):
+    return [np.zeros(n) for i in range(count)]
+
+
+def _butterfly(p, ar, ai, yr, yi, t):
+    # p-point DFTs of the vectors ar[r] + j*ai[r], r = 0 .. p-1, element by
+    # element, into the p vectors yr[q] + j*yi[q]; t holds SCRATCH vectors
+    # of the same length
+    if p == 2:
+        _add(yr[0], ar[0], ar[1])
+        _sub(yr[1], ar[0], ar[1])
+        _add(yi[0], ai[0], ai[1])
+        _sub(yi[1], ai[0], ai[1])
+    elif p == 3:
+        _add(t[0], ar[1], ar[2])
+        _add(t[1], ai[1], ai[2])
+        # -j*sin(2*pi/3) * (x1 - x2)
+        _sub(t[2], ai[1], ai[2])
+        _scale(t[2], S3)
+        _sub(t[3], ar[2], ar[1])
+        _scale(t[3], S3)
+        _add(yr[0], ar[0], t[0])
+        _add(yi[0], ai[0], t[1])
+        # x0 - (x1 + x2) / 2
+        _scale(t[0], -0.5)
+        _iadd(t[0], ar[0])
+        _scale(t[1], -0.5)
+        _iadd(t[1], ai[0])
+        _add(yr[1], t[0], t[2])
+        _sub(yr[2], t[0], t[2])
+        _add(yi[1], t[1], t[3])
+        _sub(yi[2], t[1], t[3])
+    elif p == 4:
+        _add(t[0], ar[0], ar[2])
+        _add(t[1], ai[0], ai[2])
+        _sub(t[2], ar[0], ar[2])
+        _sub(t[3], ai[0], ai[2])
+        _add(t[4], ar[1], ar[3])
+        _add(t[5], ai[1], ai[3])
+        # -j * (x1 - x3)
+        _sub(t[6], ai[1], ai[3])
+        _sub(t[7], ar[3], ar[1])
+        _add(yr[0], t[0], t[4])
+        _add(yr[1], t[2], t[6])
+        _sub(yr[2], t[0], t[4])
+        _sub(yr[3], t[2], t[6])
+        _add(yi[0], t[1], t[5])
+        _add(yi[1], t[3], t[7])
+        _sub(yi[2], t[1], t[5])
+        _sub(yi[3], t[3], t[7])
+    elif p == 5:
+        # t1 = x1 + x4, t2 = x2 + x3, d1 = x1 - x4, d2 = x2 - x3
+        _add(t[0], ar[1], ar[4])
+        _add(t[1], ai[1], ai[4])
+        _add(t[2], ar[2], ar[3])
+        _add(t[3], ai[2], ai[3])
+        _sub(t[4], ar[1], ar[4])
+        _sub(t[5], ai[1], ai[4])
+        _sub(t[6], ar[2], ar[3])
+        _sub(t[7], ai[2], ai[3])
+        # u = (t1 - t2) * C5
+        _sub(t[8], t[0], t[2])
+        _scale(t[8], C5)
+        _sub(t[9], t[1], t[3])
+        _scale(t[9], C5)
+        # t1 + t2
+        _iadd(t[0], t[2])
+        _iadd(t[1], t[3])
+        _add(yr[0], ar[0], t[0])
+        _add(yi[0], ai[0], t[1])
+        # b = x0 - (t1 + t2) / 4, m1 = b + u, m2 = b - u
+        _scale(t[0], -0.25)
+        _iadd(t[0], ar[0])
+        _scale(t[1], -0.25)
+        _iadd(t[1], ai[0])
+        _add(t[2], t[0], t[8])
+        _isub(t[0], t[8])
+        _add(t[3], t[1], t[9])
+        _isub(t[1], t[9])
+        # -j * (sin terms): n1 = -j*(d1*S5_1 + d2*S5_2) in t[8], t[9],
+        # n2 = -j*(d1*S5_2 - d2*S5_1) in t[5], t[6]; yr[4] is free scratch
+        t[8][:] = t[5]
+        _scale(t[8], S5_1)
+        t[9][:] = t[7]
+        _scale(t[9], S5_2)
+        _iadd(t[8], t[9])
+        t[9][:] = t[4]
+        _scale(t[9], S5_1)
+        yr[4][:] = t[6]
+        _scale(yr[4], S5_2)
+        _iadd(t[9], yr[4])
+        _scale(t[9], -1)
+        _scale(t[5], S5_2)
+        _scale(t[7], S5_1)
+        _isub(t[5], t[7])
+        _scale(t[6], S5_1)
+        _scale(t[4], S5_2)
+        _isub(t[6], t[4])
+        _add(yr[1], t[2], t[8])
+        _sub(yr[4], t[2], t[8])
+        _add(yi[1], t[3], t[9])
+        _sub(yi[4], t[3], t[9])
+        _add(yr[2], t[0], t[5])
+        _sub(yr[3], t[0], t[5])
+        _add(yi[2], t[1], t[6])
+        _sub(yi[3], t[1], t[6])
+    else:
+        # any other p: the DFT sums, one complex factor per input and output
+        for q in range(p):
+            yr[q][:] = ar[0]
+            yi[q][:] = ai[0]
+            for r in range(1, p):
+                angle = 2 * math.pi * ((r * q) % p) / p
+                cw = math.cos(angle)
+                sw = math.sin(angle)
+                # times exp(-2j*pi*r*q/p)
+                t[0][:] = ar[r]
+                _scale(t[0], cw)
+                t[1][:] = ai[r]
+                _scale(t[1], sw)
+                _iadd(t[0], t[1])
+                _iadd(yr[q], t[0])
+                t[0][:] = ai[r]
+                _scale(t[0], cw)
+                t[1][:] = ar[r]
+                _scale(t[1], sw)
+                _isub(t[0], t[1])
+                _iadd(yi[q], t[0])
+
+
+# The plans below return their own output arrays, which the next call of
+# the same plan overwrites.
+class MixedRadixPlan:
+    def __init__(self, N, radices):
+        self.N = N
+        self.radices = radices
+        # per level: (p, M, [(cos, sin) of 2*pi*r*k/n for r = 1 .. p-1],
+        # the p sub-transforms, the p butterfly outputs, scratch)
+        self.levels = []
+        n = N
+        for p in radices:
+            M = n // p
+            twiddles = [None]
+            for r in range(1, p):
+                twiddles.append(_cos_sin([2 * math.pi * r * k / n for k in range(M)]))
+            self.levels.append((p, M, twiddles, _arrays(p, M), _arrays(p, M), _arrays(p, M), _arrays(p, M),
+                                _arrays(SCRATCH, M)))
+            n = M
+        self.out_re = np.zeros(N)
+        self.out_im = np.zeros(N)
+
+    def fft(self, re, im=None):
+        self._fft(re, im, 0, self.out_re, self.out_im)
+        return self.out_re, self.out_im
+
+    def _fft(self, re, im, level, out_re, out_im):
+        # transform of re + j*im into out_re, out_im
+        if level == len(self.radices):
+            yr, yi = _transform(re, im)
+            out_re[:] = yr
+            out_im[:] = yi
+            return
+        p, M, twiddles, sub_re, sub_im, y_re, y_im, t = self.levels[level]
+        for r in range(p):
+            self._fft(re[r::p], None if im is None else im[r::p], level + 1, sub_re[r], sub_im[r])
+            if r:
+                # times exp(-2j*pi*r*k/N)
+                c, s = twiddles[r]
+                _rotate(sub_re[r], sub_im[r], c, s, t[0], t[1])
+        # bin k + q*M from the k-th elements of the p sub-transforms
+        _butterfly(p, sub_re, sub_im, y_re, y_im, t)
+        for q in range(p):
+            out_re[q * M:(q + 1) * M] = y_re[q]
+            out_im[q * M:(q + 1) * M] = y_im[q]
+
+
+class StockhamPlan:
+    def __init__(self, N, radices):
+        self.N = N
+        self.radices = radices
+        # per stage: (p, m, s, [(cos, sin) of 2*pi*j*(i//s)/n for j = 1 .. p-1]),
+        # n = p*m the length of the sub-transforms, s their number
+        self.stages = []
+        # butterfly outputs and scratch of N/p values, shared by the stages
+        # of the same radix
+        self._buffers = {}
+        n = N
+        s = 1
+        for p in radices:
+            m = n // p
+            twiddles = None
+            if m > 1:
+                twiddles = [None]
+                for j in range(1, p):
+                    twiddles.append(_cos_sin([2 * math.pi * j * (i // s) / n for i in range(m * s)]))
+            self.stages.append((p, m, s, twiddles))
+            if p not in self._buffers:
+                self._buffers[p] = (_arrays(p, N // p), _arrays(p, N // p), _arrays(SCRATCH, N // p))
+            n = m
+            s *= p
+        self._zeros = np.zeros(N)
+
+    def fft(self, re, im=None):
+        x_re = re
+        x_im = self._zeros if im is None else im
+        for p, m, s, twiddles in self.stages:
+            # element k*s + q of row r is x[q + s*(k + r*m)]
+            size = m * s
+            ar = [x_re[r * size:(r + 1) * size] for r in range(p)]
+            ai = [x_im[r * size:(r + 1) * size] for r in range(p)]
+            y_re, y_im, t = self._buffers[p]
+            _butterfly(p, ar, ai, y_re, y_im, t)
+            # element k*s + q of output j goes to q + s*(k*p + j): column
+            # block j of an (m, p*s) matrix
+            out_re = np.zeros((m, p * s))
+            out_im = np.zeros((m, p * s))
+            for j in range(p):
+                if twiddles and j:
+                    # times exp(-2j*pi*j*k/n)
+                    c, sn = twiddles[j]
+                    _rotate(y_re[j], y_im[j], c, sn, t[0], t[1])
+                out_re[:, j * s:(j + 1) * s] = y_re[j].reshape((m, s))
+                out_im[:, j * s:(j + 1) * s] = y_im[j].reshape((m, s))
+            x_re = out_re.flatten()
+            x_im = out_im.flatten()
+        return x_re, x_im
+
+
+class BluesteinPlan:
+    def __init__(self, N):
+        self.N = N
+        self.M = next_power_of_2(2 * N - 1)
+        # chirp exp(-1j*pi*k^2/N), k^2 taken mod 2N to keep the angle small
+        self.c, self.s = _cos_sin([math.pi * ((k * k) % (2 * N)) / N for k in range(N)])
+        # FFT of the conjugate chirp, wrapped around for negative indices
+        b_re = np.zeros(self.M)
+        b_im = np.zeros(self.M)
+        b_re[:N] = self.c
+        b_im[:N] = self.s
+        for k in range(1, N):
+            b_re[self.M - k] = self.c[k]
+            b_im[self.M - k] = self.s[k]
+        self.B_re, self.B_im = _fft.fft(b_re, b_im)
+        self._a_re = np.zeros(self.M)
+        self._a_im = np.zeros(self.M)
+        self._u = np.zeros(self.M)
+        self._v = np.zeros(self.M)
+        self._t0 = np.zeros(N)
+        self._t1 = np.zeros(N)
+        self.out_re = np.zeros(N)
+        self.out_im = np.zeros(N)
+
+    def fft(self, re, im=None):
+        N = self.N
+        c = self.c
+        s = self.s
+        t0 = self._t0
+        t1 = self._t1
+        out_re = self.out_re
+        out_im = self.out_im
+        # a = x * chirp, zero padded to M
+        t0[:] = re
+        if im is None:
+            t1[:] = 0
+        else:
+            t1[:] = im
+        _rotate(t0, t1, c, s, out_re, out_im)
+        self._a_re[:N] = t0
+        self._a_im[:N] = t1
+        A_re, A_im = _fft.fft(self._a_re, self._a_im)
+        # times the FFT of the conjugate chirp, in A_re and A_im
+        u = self._u
+        v = self._v
+        u[:] = A_re
+        _scale(u, self.B_im)
+        v[:] = A_im
+        _scale(v, self.B_im)
+        _scale(A_re, self.B_re)
+        _isub(A_re, v)
+        _scale(A_im, self.B_re)
+        _iadd(A_im, u)
+        y_re, y_im = _fft.ifft(A_re, A_im)
+        # X = chirp * (a convolved with the conjugate chirp)
+        out_re[:] = y_re[:N]
+        out_im[:] = y_im[:N]
+        _rotate(out_re, out_im, c, s, t0, t1)
+        return out_re, out_im
+
+
+_plans = []
+
+
+def radices(N):
+    # odd radices of N ([] for a power of 2), None if N is done with
+    # Bluestein's algorithm
+    n = N
+    found = []
+    for p in RADICES:
+        while n % p == 0:
+            found.append(p)
+            n //= p
+    if not is_power_of_2(n):
+        return None
+    if N // n <= MAX_MIXED_RADIX or 7 not in found:
+        return found
+    return None
+
+
+def stockham_radices(N):
+    # radices of the Stockham stages of N, smallest first: the odd ones,
+    # then the power of 2 in 4s and a 2
+    found = radices(N)
+    n = N
+    for p in found:
+        n //= p
+    while n % 4 == 0:
+        found.append(4)
+        n //= 4
+    if n == 2:
+        found.append(2)
+    found.sort()
+    return found
+
+
+def _log2(n):
+    return math.log(n) / math.log(2)
+
+
+def relative_cost(N):
+    # rough work of fft() for N complex values over N*log2(N), the work of a
+    # power of 2 length; 1 for powers of 2
+    if is_power_of_2(N):
+        return 1.0
+    found = radices(N)
+    if found is None:
+        # three padded power of 2 FFTs
+        M = next_power_of_2(2 * N - 1)
+        work = 3 * M * _log2(M) + BLUESTEIN_EXTRA * M
+    elif N // (N & -N) <= MAX_MIXED_RADIX:
+        # R fft.fft calls of the power of 2 part, a butterfly stage per odd radix
+        work = N * _log2(N & -N) + sum(STAGE_COST * N * _log2(p) for p in found)
+    else:
+        work = sum(STAGE_COST * N * _log2(p) for p in stockham_radices(N))
+    return work / (N * _log2(N))
+
+
+def get_plan(N):
+    for i in range(len(_plans)):
+        if _plans[i].N == N:
+            plan = _plans.pop(i)
+            _plans.append(plan)
+            return plan
+    found = radices(N)
+    if found is None:
+        plan = BluesteinPlan(N)
+    elif N // (N & -N) <= MAX_MIXED_RADIX:
+        # few power of 2 fft.fft calls
+        plan = MixedRadixPlan(N, found)
+    else:
+        plan = StockhamPlan(N, stockham_radices(N))
+    _plans.append(plan)
+    if len(_plans) > CACHE_SIZE:
+        _plans.pop(0)
+    return plan
+
+
+def fft(re, im=None):
+    # same as ulab fft.fft, for any length
+    N = len(re)
+    if is_power_of_2(N):
+        return _transform(re, im)
+    return get_plan(N).fft(re, im)
@@ -0,0 +1,97 @@
+# Purpose:
+# - FFT of purely real audio at about half the cost of fft.fft
+# - only the L//2+1 non-redundant bins are returned
+#
+# The N real samples are packed into N/2 complex values z[n] = x[2n] + j*x[2n+1],
+# transformed with one N/2 point fft.fft, and split again with
+#   X[k] = E[k] + exp(-2j*pi*k/N) * O[k]     k = 0 .. N/2
+#   E[k] = (Z[k] + conj(Z[N/2-k])) / 2       (spectrum of the even samples)
+#   O[k] = (Z[k] - conj(Z[N/2-k])) / 2j      (spectrum of the odd samples)
+#
+# With outputs=True twiddle() also holds the result arrays, and rfft() writes
+# the split into them with in-place operators, so the only arrays allocated
+# per call are the ones fft.fft returns. Older ulab builds without in-place
+# operators (INPLACE False) take the expression path.
+
+import math
+import ulab as np
+from ulab import vector
+import fft_any
+
+# tables of the last N used without an explicit twiddle
+_last = None
+
+
+# in-place operators, detected by fft_any
+INPLACE = fft_any.INPLACE
+
+
+def twiddle(N, outputs=False):
+    # post-twiddle cos/sin tables and scratch arrays for N samples; with
+    # outputs also the real and imaginary result and one more scratch array
+    M = N // 2
+    theta = np.linspace(0, math.pi, num=M + 1)  # 2*pi*k/N
+    tables = (N, vector.cos(theta), vector.sin(theta), np.zeros(M + 1), np.zeros(M + 1))
+    if outputs and INPLACE and N % 2 == 0:
+        tables += (np.zeros(M + 1), np.zeros(M + 1), np.zeros(M + 1))
+    return tables
+
+
+def rfft(samples, tables=None):
+    # Same values as fft.fft(samples)[:, :N//2+1], for any N (see fft_any).
+    # tables is a twiddle(N) result, e.g. the one kept by spectrum.Plan; if
+    # it has outputs the returned arrays are those and reused by every call.
+    global _last
+    N = len(samples)
+    if N % 2:
+        # nothing to pack, transform as complex and drop the upper half
+        real, imaginary = fft_any.fft(samples)
+        return real[:N // 2 + 1], imaginary[:N // 2 + 1]
+    M = N // 2
+    if tables is None:
+        if _last is None or _last[0] != N:
+            _last = twiddle(N)
+        tables = _last
+    c, s, zr, zi = tables[1:5]
+
+    Zr, Zi = fft_any.fft(samples[0::2], samples[1::2])
+    # Z extended by Z[M] = Z[0], read forwards (Z[k]) and backwards (Z[M-k])
+    zr[:M] = Zr
+    zr[M] = Zr[0]
+    zi[:M] = Zi
+    zi[M] = Zi[0]
+    rr = zr[::-1]
+    ri = zi[::-1]
+
+    if len(tables) > 5:
+        # the same sums as below, two terms at a time, t is scratch
+        real, imaginary, t = tables[5:]
+        real[:] = zi
+        real += ri
+        real *= c
+        t[:] = rr
+        t -= zr
+        t *= s
+        real += t
+        real += zr
+        real += rr
+        real *= 0.5
+        imaginary[:] = rr
+        imaginary -= zr
+        imaginary *= c
+        t[:] = zi
+        t += ri
+        t *= s
+        imaginary -= t
+        imaginary += zi
+        imaginary -= ri
+        imaginary *= 0.5
+        return real, imaginary
+
+    Er = (zr + rr) / 2
+    Ei = (zi - ri) / 2
+    Or = (zi + ri) / 2
+    Oi = (rr - zr) / 2
+    real = Er + c * Or + s * Oi
+    imaginary = Ei + c * Oi - s * Or
+    return real, imaginary
@@ -1,59 +1,39 @@
 import os
 import utime
 import ulab as np
+import spectrum
+import stft
+import welch
+import wav_reader
+import spectrum_cache
+import profiling
 from machine import Pin
 from machine import SD
 from machine import I2S
-from ulab import fft
-from ulab import vector
-from ulab import numerical
 import math
 import sys
 
 
 #======= USER CONFIGURATION =======
 WAV_FILE = 'mic-recording_5.wav' # File Name, relative to sd/audio.
-SAMPLE_RATE_IN_HZ = 4050 # Same as in the recording
-RECORD_TIME_IN_MS = 1000 # Same as in the recording(But in ms not seconds)
 #======= USER CONFIGURATION =======
-SAMPLE_SIZE_IN_BITS = 16
-SAMPLE_SIZE_IN_BYTES = SAMPLE_SIZE_IN_BITS // 8
-MIC_SAMPLE_BUFFER_SIZE_IN_BYTES = 4096
-NUM_SAMPLE_BYTES_TO_WRITE = int((RECORD_TIME_IN_MS / 1000) * SAMPLE_RATE_IN_HZ * SAMPLE_SIZE_IN_BYTES) # 32768 MAX!
-NUM_SAMPLES_IN_DMA_BUFFER = 256
-NUM_CHANNELS = 1
-
-L = NUM_SAMPLE_BYTES_TO_WRITE // 2  # Length of signal
+# sample rate and sample size are read from the WAV file
 
 #======= Analyzer Settings =======
+ANALYSIS = 'stft'   # 'stft': one result per frame, 'welch': one averaged result
+FRAME_LENGTH = 4096 # Samples per fft, powers of 2 are fastest
+HOP_LENGTH = 2048   # Samples between two frames, FRAME_LENGTH = no overlap
 BINS = 100
 START_AT_HZ = 0
 NUMBER_OF_BINS = 10
+WINDOW = spectrum.RECT # spectrum.RECT, spectrum.HANN or spectrum.HAMMING
+PROFILE = False        # time every stage and print percentiles at the end
+SPECTRUM_CACHE = None  # None: off; a directory, e.g. '/sd/cache': keep the spectra of every frame, other band settings then skip the fft (see spectrum_cache.py)
+SPECTRUM_CACHE_BYTES = spectrum_cache.MAX_BYTES # the least recently used spectra are deleted above this size
 
-def bitLenCount(int_type):
-    length = 0
-    count = 0
-    while (int_type):
-        count += (int_type & 1)
-        length += 1
-        int_type >>= 1
-    return math.pow(2, length-1)
-L = int(bitLenCount(L))
-NUM_SAMPLE_BYTES_TO_WRITE = int(bitLenCount(L)) * 2
-RECORD_TIME_IN_MS = int((NUM_SAMPLE_BYTES_TO_WRITE * 1000) // (SAMPLE_SIZE_IN_BYTES * SAMPLE_RATE_IN_HZ))
-print("NUM_SAMPLE_BYTES_TO_WRITE After: \t", NUM_SAMPLE_BYTES_TO_WRITE)
-print()
-
-
-Fs = SAMPLE_RATE_IN_HZ#1230 # Sampling frequency
-T = 1/Fs                    # Sampling period
-
-#t = np.array(range(0,L))*T  # Time vector in ms
-
-f = Fs*np.array(range(0,(L//2)+1))/L
+L = FRAME_LENGTH # Length of signal
 
-bins = int(BINS / f[1])
-start_at_hz = int(START_AT_HZ / f[1])
+profiling.enable(PROFILE)
 
 '''
 bck_pin = Pin(21)
@@ -84,72 +64,64 @@ except:
     print('sd already mounted')
 
 wav_file = '/sd/audio/{}'.format(WAV_FILE)
-wav = open(wav_file,'rb')
+# format, position and size of the samples from the RIFF chunks of the file
+wav = wav_reader.WavReader(open(wav_file,'rb'))
+print(wav.sample_rate, 'Hz,', wav.bits, 'bit,', wav.duration_ms, 'ms')
+
+Fs = wav.sample_rate # Sampling frequency
+T = 1/Fs             # Sampling period
 
-# advance to first byte of Data section in WAV file
-pos = wav.seek(44)
+#t = np.array(range(0,L))*T  # Time vector in ms
 
-# allocate sample arrays
-#   memoryview used to reduce heap allocation in while loop
-wav_samples = bytearray(1024)
-wav_samples_mv = memoryview(wav_samples)
-store_samples = bytearray(NUM_SAMPLE_BYTES_TO_WRITE)
-store_samples_mv = memoryview(store_samples)
+# frequency axis, window, band table and buffers, computed once for all frames
+plan = spectrum.get_plan(Fs, L, WINDOW, BINS, START_AT_HZ, NUMBER_OF_BINS)
+f = plan.f
+
+# the cached spectra depend on the file contents, L, window and hop, not on the bands
+cache = None
+if SPECTRUM_CACHE:
+    cache = spectrum_cache.SpectrumCache(SPECTRUM_CACHE, SPECTRUM_CACHE_BYTES)
+    digest = spectrum_cache.file_hash(wav_file)
 
 print('Starting')
-# continuously read audio samples from the WAV file
-# and write them to an I2S DAC
-
-while(True):
-    try:
-        num_read = wav.readinto(store_samples_mv)
-        # end of WAV file? Than break while.
-        if num_read == 0:
-            print('break')
-            break
-
-        # fft analysis
-        try:
-            real, imaginary = fft.fft(np.array(list(store_samples_mv)))
-            #real, imaginary = fft.fft(np.array(list(mic_samples_mv[:num_bytes_read_from_mic])))
-            print('fft finished')
-            real = real/L
-            imaginary = imaginary/L
-            P2 = vector.sqrt(real*real + imaginary*imaginary)
-            print('average power: ', P2[0])
-            P1 = P2[1:L//2+1]
-
-            P1[:(P1.size() - 1)] = 2*P1[:(P1.size() - 1)]
+# analyze the WAV file frame by frame, every frame reuses the same buffers
 
+total_time = 0
+num_frames = 0
+try:
+    start_time = utime.ticks_ms()
+    if ANALYSIS == 'welch' and cache:
+        averager = welch.Welch(plan)
+        for frame, P1 in spectrum_cache.spectra(wav, plan, HOP_LENGTH, cache, digest):
+            averager.add_magnitude(P1)
+        num_frames = averager.count
+        print("result (welch): \t", averager.bands())
+    elif ANALYSIS == 'welch':
+        # average the power of all frames, only one frame is held in memory
+        averager = welch.average(wav, plan, HOP_LENGTH)
+        num_frames = averager.count
+        print("result (welch): \t", averager.bands())
+    else:
+        if cache:
+            frames = spectrum_cache.band_frames(wav, plan, HOP_LENGTH, cache, digest)
+        else:
+            frames = stft.band_frames(wav, plan, HOP_LENGTH)
+        for frame, P1, result in frames:
             #print(P1)
             #print(P1.size())
-            #print(P1[P1.size() - 10:P1.size() - 1])
             #print(f.size())
-            result = []
-            #print('Bins: \t', bins)
-            for x in range(0,NUMBER_OF_BINS):
-                min = (start_at_hz + bins * x)
-                max = (start_at_hz + (bins*(x+1)) - 1)
-                #print(max)
-                if max < P1.size():
-                    rang = P1[min:max]
-                    #max = numerical.max(rang)
-                    max = sum(rang) / len(rang)
-                    result += [max]
-                elif min < P1.size():
-                    rang = P1[min:P1.size()-1]
-                    max = numerical.max(rang)
-                    #max = sum(rang) / len(rang)
-                    result += [max]
-                else:
-                    result += [0]
-            print("result: \t", result)
-        except ValueError:
-            print("Value Error! is NUM_SAMPLE_BYTES_TO_WRITE power of 2?")
-        break
-    except (KeyboardInterrupt, Exception) as e:
-        print('caught exception {} {}'.format(type(e).__name__, e))
-        break
+            print("result", frame, "(", frame * HOP_LENGTH * 1000 // Fs, "ms): \t", result)
+            num_frames += 1
+    total_time = utime.ticks_diff(utime.ticks_ms(), start_time)
+except ValueError:
+    print("Value Error! check FRAME_LENGTH and HOP_LENGTH")
+except (KeyboardInterrupt, Exception) as e:
+    print('caught exception {} {}'.format(type(e).__name__, e))
+
+print(num_frames, 'frames in', total_time, 'milliseconds')
+if cache:
+    print('spectra:', 'from the cache' if cache.hits else 'analyzed and cached')
+profiling.report()
 
 wav.close()
 os.umount("/sd")
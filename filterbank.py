@@ -0,0 +1,240 @@
+# Purpose:
+# - band layouts for acoustic monitoring besides the equal-width bands of
+#   spectrum.BandTable: octave, third-octave and mel bands up to Nyquist
+# - all bands are reduced from P1 with one linalg.dot
+#
+# A Filterbank holds a weight matrix of count rows over the FFT bins
+# [lo, hi) the bands cover. Every row sums to 1, so the dot product is the
+# weighted mean of P1 in each band, overlapping bands need no extra pass:
+# - OCTAVE, THIRD_OCTAVE: center frequencies 1000 * 2^(k/b) Hz (b = 1 or 3
+#   bands per octave), edges at center * 2^(+-1/(2b)). A bin counts with
+#   the part of its width inside the band, so bands narrower than a bin
+#   still get a value. All bands from start_at_hz (default 20 Hz) up to
+#   Nyquist are used.
+# - MEL: count triangles with edges equally spaced on the mel scale
+#   (2595 * log10(1 + f/700)) from start_at_hz to Nyquist, neighbours
+#   overlap by half.
+# ulab has no sparse matrices, so the matrix is dense over [lo, hi): count
+# * (hi - lo) floats, printed by bench_filterbank.py.
+#
+# Building the weights walks every bin of every band in Python, so
+# get() keeps the last CACHE_SIZE filterbanks in memory and, with
+# cache_dir, stores the matrix as raw float32 in a file next to a small
+# header. Later runs (and other scripts) read it back in one readinto().
+# For band power instead of mean amplitude reduce plan.magnitude(power=True).
+#
+# Usage:
+#   bank = filterbank.get(Fs, L, filterbank.THIRD_OCTAVE, cache_dir='/flash/filterbank')
+#   P1, result = plan.analyze()
+#   levels = bank.reduce(P1)           # bank.centers[x] is the center of band x
+
+import math
+import struct
+from array import array
+import ulab as np
+from ulab import linalg
+from ulab import numerical
+import spectrum
+
+OCTAVE = 'octave'
+THIRD_OCTAVE = 'third-octave'
+MEL = 'mel'
+
+CACHE_SIZE = 3
+MAGIC = b'FBNK'
+VERSION = 1
+HEADER_FORMAT = '<4sHHII'
+
+_frombuffer = getattr(np, 'frombuffer', None)
+
+
+def hz_to_mel(f):
+    return 2595 * math.log10(1 + f / 700)
+
+
+def mel_to_hz(m):
+    return 700 * (10 ** (m / 2595) - 1)
+
+
+def octave_bands(start_at_hz, nyquist, bands_per_octave):
+    # (low, center, high) in Hz of the bands between start_at_hz and nyquist
+    b = bands_per_octave
+    k = math.ceil(b * math.log(start_at_hz / 1000) / math.log(2) + 0.5)
+    bands = []
+    while True:
+        center = 1000 * 2 ** (k / b)
+        high = center * 2 ** (1 / (2 * b))
+        if high > nyquist:
+            return bands
+        bands.append((center * 2 ** (-1 / (2 * b)), center, high))
+        k += 1
+
+
+def mel_bands(start_at_hz, nyquist, count):
+    # (low, center, high) in Hz of count triangles
+    low = hz_to_mel(start_at_hz)
+    step = (hz_to_mel(nyquist) - low) / (count + 1)
+    edges = [mel_to_hz(low + step * x) for x in range(count + 2)]
+    return [(edges[x], edges[x + 1], edges[x + 2]) for x in range(count)]
+
+
+def _rectangle(low, high, df, n):
+    # (first bin, weights) of the bins overlapping [low, high]
+    first = max(int((low / df) + 0.5), 0)
+    last = min(int((high / df) + 0.5), n - 1)
+    weights = []
+    for k in range(first, last + 1):
+        overlap = min(high, (k + 0.5) * df) - max(low, (k - 0.5) * df)
+        weights.append(max(overlap, 0) / df)
+    return first, weights
+
+
+def _triangle(low, center, high, df, n):
+    # (first bin, weights) of the bin centers inside the triangle
+    first = max(int(math.ceil(low / df)), 0)
+    last = min(int(high / df), n - 1)
+    weights = []
+    for k in range(first, last + 1):
+        f = k * df
+        if f <= center:
+            weights.append((f - low) / (center - low))
+        else:
+            weights.append((high - f) / (high - center))
+    if not weights or max(weights) <= 0:
+        # narrower than a bin: the nearest one
+        return min(int(center / df + 0.5), n - 1), [1.0]
+    return first, weights
+
+
+class Filterbank:
+    def __init__(self, Fs, L, layout, start_at_hz=None, count=24, cache_dir=None):
+        self.Fs = Fs
+        self.L = L
+        self.layout = layout
+        self.df = Fs / L
+        self.n = L // 2 + 1
+        if start_at_hz is None:
+            start_at_hz = 0 if layout == MEL else 20
+        self.key = (Fs, L, layout, start_at_hz, count)
+        path = None
+        if cache_dir:
+            path = '%s/%s_%d_%d_%d_%d.fb' % (cache_dir, layout, Fs, L, int(start_at_hz), count)
+            if self._load(path):
+                return
+        if layout == OCTAVE:
+            bands = octave_bands(max(start_at_hz, 1e-3), Fs / 2, 1)
+        elif layout == THIRD_OCTAVE:
+            bands = octave_bands(max(start_at_hz, 1e-3), Fs / 2, 3)
+        elif layout == MEL:
+            bands = mel_bands(start_at_hz, Fs / 2, count)
+        else:
+            raise ValueError('unknown band layout')
+        if not bands:
+            raise ValueError('no band fits between start_at_hz and Nyquist')
+        self._build(bands)
+        if path:
+            self._save(path)
+
+    def _build(self, bands):
+        rows = []
+        for low, center, high in bands:
+            if self.layout == MEL:
+                rows.append(_triangle(low, center, high, self.df, self.n))
+            else:
+                rows.append(_rectangle(low, high, self.df, self.n))
+        self.count = len(bands)
+        self.centers = [center for low, center, high in bands]
+        self.lo = min(first for first, weights in rows)
+        self.hi = max(first + len(weights) for first, weights in rows)
+        span = self.hi - self.lo
+        # rows are filled one by one, the full matrix never exists as a list
+        flat = np.zeros(self.count * span)
+        self.starts = []
+        self.stops = []
+        for x in range(self.count):
+            first, weights = rows[x]
+            total = sum(weights)
+            start = x * span + first - self.lo
+            flat[start:start + len(weights)] = np.array([w / total for w in weights])
+            self.starts.append(first)
+            self.stops.append(first + len(weights))
+        self.weights = flat.reshape((self.count, span))
+        self.result = np.zeros(self.count)
+
+    def _save(self, path):
+        span = self.hi - self.lo
+        try:
+            with open(path, 'wb') as f:
+                f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, self.count, self.lo, span))
+                f.write(array('f', self.centers))
+                f.write(array('i', self.starts + self.stops))
+                for x in range(self.count):
+                    f.write(array('f', self.weights[x]))
+        except OSError:
+            # read-only or full, next time it is built again
+            pass
+
+    def _load(self, path):
+        # True if path holds this filterbank
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return False
+        with f:
+            header = f.read(struct.calcsize(HEADER_FORMAT))
+            if len(header) < struct.calcsize(HEADER_FORMAT):
+                return False
+            magic, version, count, lo, span = struct.unpack(HEADER_FORMAT, header)
+            if magic != MAGIC or version != VERSION:
+                return False
+            centers = array('f', bytearray(4 * count))
+            bounds = array('i', bytearray(8 * count))
+            data = bytearray(4 * count * span)
+            if f.readinto(centers) != 4 * count or f.readinto(bounds) != 8 * count or f.readinto(data) != len(data):
+                return False
+        self.count = count
+        self.lo = lo
+        self.hi = lo + span
+        self.centers = list(centers)
+        self.starts = list(bounds[:count])
+        self.stops = list(bounds[count:])
+        if _frombuffer is not None:
+            flat = _frombuffer(data, dtype=np.float)
+        else:
+            flat = np.array(array('f', data))
+        self.weights = flat.reshape((count, span))
+        self.result = np.zeros(count)
+        return True
+
+    def reduce(self, P1, mode=spectrum.MEAN, out=None, first_bin=0):
+        # Band values of P1 (P1[0] is FFT bin first_bin) in out, one entry
+        # per band. MEAN is the weighted mean (one dot product), MAX the
+        # largest bin of each band.
+        if out is None:
+            out = np.zeros(self.count)
+        if mode == spectrum.MAX:
+            for x in range(self.count):
+                out[x] = numerical.max(P1[self.starts[x] - first_bin:self.stops[x] - first_bin])
+            return out
+        out[:] = linalg.dot(self.weights, P1[self.lo - first_bin:self.hi - first_bin])
+        return out
+
+
+_banks = []
+
+
+def get(Fs, L, layout, start_at_hz=None, count=24, cache_dir=None):
+    # least recently used filterbanks are dropped first
+    if start_at_hz is None:
+        start_at_hz = 0 if layout == MEL else 20
+    key = (Fs, L, layout, start_at_hz, count)
+    for i in range(len(_banks)):
+        if _banks[i].key == key:
+            bank = _banks.pop(i)
+            _banks.append(bank)
+            return bank
+    bank = Filterbank(Fs, L, layout, start_at_hz, count, cache_dir)
+    _banks.append(bank)
+    if len(_banks) > CACHE_SIZE:
+        _banks.pop(0)
+    return bank
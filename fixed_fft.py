@@ -0,0 +1,247 @@
+# Purpose:
+# - band values of much longer frames on the same heap: the spectrum is
+#   computed inside the 16-bit PCM buffer itself, in block floating point
+# - working memory is the 2*L byte PCM buffer plus arrays of about sqrt(L)
+#   floats, instead of several L-sized float arrays on the float path
+#
+# The L real samples are read as L/2 complex values z[n] = x[2n] + j*x[2n+1]
+# (the interleaved int16 PCM buffer already has that layout) and transformed
+# in place with the four-step FFT, L/2 = N1 * N2:
+#   1. N2 column FFTs of length N1 (elements n2, n2 + N2, ...), multiplied by
+#      the twiddles exp(-2j*pi*n2*k1/(L/2))
+#   2. N1 row FFTs of length N2 (contiguous), bin k1 + N1*k2 ends up at
+#      position N2*k1 + k2
+# Each column and row is transformed in float and written back as int16
+# with its own power of 2 scale (block floating point), so the int16 values
+# always use the full range. Finally the L//2+1 real FFT bins are split from
+# the packed spectrum like in fft_real.py, only for the bins inside the
+# bands, and reduced with the band table. Hann and Hamming are applied to
+# every column on the fly, no window table is kept.
+#
+# The PCM buffer is overwritten, write it to the WAV file first. Needs a
+# ulab with frombuffer(). approximate=True replaces the sqrt of the
+# magnitude by max + min weights (alpha max plus beta min, <4% error).
+# bench_fixed_fft.py compares accuracy, time and memory with the float path.
+
+import math
+import ulab as np
+from ulab import vector
+from ulab import numerical
+import fft_any
+import i2s_decode
+import spectrum
+
+FULL_SCALE = 32000
+ALPHA = 0.96043387
+BETA = 0.39782473
+
+_frombuffer = getattr(np, 'frombuffer', None)
+
+
+def split(M):
+    # M = N1 * N2 with N1 <= N2, as close to sqrt(M) as possible
+    n1 = int(math.sqrt(M))
+    while M % n1:
+        n1 -= 1
+    return n1, M // n1
+
+
+def _peak(re, im):
+    return max(numerical.max(re), -numerical.min(re), numerical.max(im), -numerical.min(im))
+
+
+def _step(peak):
+    # power of 2 with peak / step <= FULL_SCALE
+    if peak <= 0:
+        return 1.0
+    return 2.0 ** math.ceil(math.log(peak / FULL_SCALE) / math.log(2))
+
+
+def _round(values):
+    # to the nearest integer, the int16 conversion would truncate
+    return vector.floor(values + 0.5)
+
+
+def _transform(re, im):
+    if len(re) == 1:
+        return re, im
+    return fft_any.fft(re, im)
+
+
+def read_pcm16(audio_in, pcm, num_samples, block_samples=256, words=None):
+    # Fill the pcm16_buffer() pcm with the upper 16 bits of num_samples I2S
+    # words, read in DMA blocks, so no L-sized 32-bit buffer is needed.
+    if words is None:
+        words = i2s_decode.int32_buffer(block_samples)
+    words_mv = memoryview(words)
+    pcm16 = _frombuffer(pcm, dtype=np.int16, count=num_samples)
+    position = 0
+    while position < num_samples:
+        want = min(block_samples, num_samples - position)
+        got = 0
+        while got < want:
+            num_bytes = audio_in.readinto(words_mv[got:want])
+            got += num_bytes // i2s_decode.SAMPLE_SIZE_IN_BYTES
+        upper = _frombuffer(words, dtype=np.int16, count=2 * want)
+        pcm16[position:position + want] = upper[1::2]
+        position += want
+    return pcm
+
+
+class FixedPlan:
+    def __init__(self, Fs, L, window=spectrum.RECT, bin_size_in_hz=100, start_at_hz=0, number_of_bins=10,
+                 approximate=False):
+        if L % 2:
+            raise ValueError('L must be even')
+        if _frombuffer is None:
+            raise ValueError('the fixed point path needs ulab frombuffer()')
+        # same layout as spectrum.Plan.key, e.g. for spectrum_log
+        self.key = (Fs, L, window, bin_size_in_hz, start_at_hz, number_of_bins)
+        self.Fs = Fs
+        self.L = L
+        self.M = L // 2
+        self.N1, self.N2 = split(self.M)
+        self.terms = spectrum.WINDOW_TERMS.get(window)
+        if window != spectrum.RECT and self.terms is None:
+            raise ValueError('unknown window')
+        # 2/sum(window) of the periodic window
+        self.scale = 2 / L if self.terms is None else 2 / (self.terms[0] * L)
+        self.approximate = approximate
+        self.bands = spectrum.BandTable(Fs, L, bin_size_in_hz, start_at_hz, number_of_bins)
+        self.lo = self.bands.edges[0]
+        self.hi = self.bands.edges[number_of_bins]
+        # only the bins of the bands are kept
+        self.P1 = np.zeros(max(self.hi - self.lo, 1))
+        self.result = np.zeros(number_of_bins)
+        self.col_step = np.zeros(self.N2)
+        self.row_step = [1.0] * self.N1
+        n = max(self.N1, self.N2)
+        self._re = np.zeros(n)
+        self._im = np.zeros(n)
+        self._pr = np.zeros(n)
+        self._pi = np.zeros(n)
+
+    def _columns(self, z):
+        N1 = self.N1
+        N2 = self.N2
+        L = self.L
+        re = self._re[:N1]
+        im = self._im[:N1]
+        for n2 in range(N2):
+            re[:] = z[2 * n2::2 * N2]
+            im[:] = z[2 * n2 + 1::2 * N2]
+            if self.terms:
+                a0, a1 = self.terms
+                # sample index of the real parts: 2 * (N2 * n1 + n2)
+                first = 2 * math.pi * 2 * n2 / L
+                last = 2 * math.pi * 2 * (N2 * (N1 - 1) + n2) / L
+                re[:] = re * (a0 - 2 * a1 * vector.cos(np.linspace(first, last, num=N1)))
+                im[:] = im * (a0 - 2 * a1 * vector.cos(np.linspace(first + 2 * math.pi / L, last + 2 * math.pi / L, num=N1)))
+            yr, yi = _transform(re, im)
+            if n2 and N1 > 1:
+                # times exp(-2j*pi*n2*k1/M)
+                theta = np.linspace(0, 2 * math.pi * n2 * (N1 - 1) / self.M, num=N1)
+                c = vector.cos(theta)
+                s = vector.sin(theta)
+                yr, yi = yr * c + yi * s, yi * c - yr * s
+            step = _step(_peak(yr, yi))
+            self.col_step[n2] = step
+            z[2 * n2::2 * N2] = _round(yr * (1 / step))
+            z[2 * n2 + 1::2 * N2] = _round(yi * (1 / step))
+
+    def _rows(self, z):
+        N2 = self.N2
+        re = self._re[:N2]
+        im = self._im[:N2]
+        for k1 in range(self.N1):
+            start = 2 * N2 * k1
+            stop = start + 2 * N2
+            re[:] = z[start:stop:2]
+            im[:] = z[start + 1:stop:2]
+            re[:] = re * self.col_step
+            im[:] = im * self.col_step
+            yr, yi = _transform(re, im)
+            step = _step(_peak(yr, yi))
+            self.row_step[k1] = step
+            z[start:stop:2] = _round(yr * (1 / step))
+            z[start + 1:stop:2] = _round(yi * (1 / step))
+
+    def _bins(self, z):
+        # split the real FFT bins of the bands off the packed spectrum
+        N1 = self.N1
+        N2 = self.N2
+        M = self.M
+        lo = self.lo
+        hi = min(self.hi, M)
+        for k1 in range(N1):
+            # k = k1 + N1*k2 inside [lo, hi)
+            first = max(0, -((k1 - lo) // N1))
+            stop = min(N2, -((k1 - hi) // N1))
+            if first >= stop:
+                continue
+            count = stop - first
+            step = self.row_step[k1]
+            zr = self._re[:count]
+            zi = self._im[:count]
+            zr[:] = z[2 * (N2 * k1 + first):2 * (N2 * k1 + stop):2]
+            zi[:] = z[2 * (N2 * k1 + first) + 1:2 * (N2 * k1 + stop):2]
+            zr[:] = zr * step
+            zi[:] = zi * step
+            # partner Z[M - k]: row (N1 - k1) % N1, position N2 - 1 - k2
+            # (N2 - k2 and 0 for k2 = 0 in row 0)
+            p = (N1 - k1) % N1
+            pr = self._pr[:count]
+            pi = self._pi[:count]
+            if k1:
+                lo_pos = N2 * p + N2 - stop
+                hi_pos = N2 * p + N2 - 1 - first
+                pr[:] = z[2 * lo_pos:2 * hi_pos + 1:2][::-1]
+                pi[:] = z[2 * lo_pos + 1:2 * hi_pos + 2:2][::-1]
+            else:
+                skip = 0
+                if first == 0:
+                    pr[0] = z[0]
+                    pi[0] = z[1]
+                    skip = 1
+                if count > skip:
+                    lo_pos = N2 - stop + 1
+                    hi_pos = N2 - first - skip
+                    pr[skip:] = z[2 * lo_pos:2 * hi_pos + 1:2][::-1]
+                    pi[skip:] = z[2 * lo_pos + 1:2 * hi_pos + 2:2][::-1]
+            pr[:] = pr * self.row_step[p]
+            pi[:] = pi * self.row_step[p]
+            # E = (Z + conj(P)) / 2, O = (Z - conj(P)) / 2j, X = E + exp(-2j*pi*k/L) * O
+            er = (zr + pr) * 0.5
+            ei = (zi - pi) * 0.5
+            orr = (zi + pi) * 0.5
+            oi = (pr - zr) * 0.5
+            k_first = k1 + N1 * first
+            theta = np.linspace(2 * math.pi * k_first / self.L, 2 * math.pi * (k_first + N1 * (count - 1)) / self.L, num=count)
+            c = vector.cos(theta)
+            s = vector.sin(theta)
+            xr = er + orr * c + oi * s
+            xi = ei + oi * c - orr * s
+            self.P1[k_first - lo:k_first + N1 * (count - 1) - lo + 1:N1] = self._magnitude(xr, xi)
+        if lo <= M < self.hi:
+            # Nyquist bin: X[M] = Re Z[0] - Im Z[0]
+            self.P1[M - lo] = abs(float(z[0]) - float(z[1])) * self.row_step[0] * self.scale / 2
+        if lo == 0:
+            self.P1[0] = self.P1[0] / 2
+
+    def _magnitude(self, re, im):
+        if not self.approximate:
+            return vector.sqrt(re * re + im * im) * self.scale
+        a = abs(re)
+        b = abs(im)
+        d = abs(a - b)
+        high = (a + b + d) * 0.5
+        return (high * ALPHA + (a + b - high) * BETA) * self.scale
+
+    def analyze(self, pcm, mode=spectrum.MEAN):
+        # pcm: pcm16_buffer(L) of 16-bit samples, overwritten.
+        # Returns (P1 of the band bins, band result); P1[0] is bin self.lo.
+        z = _frombuffer(pcm, dtype=np.int16, count=self.L)
+        self._columns(z)
+        self._rows(z)
+        self._bins(z)
+        return self.P1, self.bands.reduce(self.P1, mode, self.result, self.lo)
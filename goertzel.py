@@ -0,0 +1,172 @@
+# Purpose:
+# - band values for a few narrow bands without a full-length FFT
+# - only the DFT bins inside the configured bands are computed, block by
+#   block while the DMA buffers of NUM_SAMPLES_IN_DMA_BUFFER samples arrive
+#
+# This is a bank of Goertzel filters evaluated in vectorized form: for the
+# K bins k of the bands, every block of B samples starting at n0 adds
+#   X[k] += exp(-2j*pi*k*n0/L) * sum_n x[n0+n] * exp(-2j*pi*k*n/L)
+# The inner sum is one linalg.dot with a precomputed K x B cos/sin matrix,
+# the block start phase is advanced by a precomputed rotation per block.
+# After L samples the magnitudes are scaled like spectrum.single_sided()
+# and reduced with the band table of the plan, so the band values match the
+# FFT path. Costs 2*K*L multiply-adds and 2*K*B floats of tables, which
+# beats the FFT only for small K, see cheaper_than_fft(). fft_cost() takes
+# the plan fft_any uses for L into account, e.g. Bluestein with its padded
+# length for L = 6150.
+
+import math
+import utime
+import ulab as np
+from ulab import vector
+from ulab import linalg
+import fft_any
+import i2s_decode
+import profiling
+import spectrum
+
+# rough cost of the real FFT in multiply-adds per sample and log2(L)
+FFT_COST = 2.5
+
+
+def band_bins(plan):
+    # first and last + 1 FFT bin covered by the bands of plan
+    bands = plan.bands
+    return bands.edges[0], bands.edges[bands.count]
+
+
+def fft_cost(L):
+    # multiply-adds of the real FFT of L samples: FFT_COST * L * log2(L) for
+    # a power of 2, times what fft_any's plan for the complex transform of
+    # fft_real.rfft() (L/2 values, all L for an odd L) costs more
+    n = L // 2 if L % 2 == 0 else L
+    relative = fft_any.relative_cost(n) if n > 1 else 1.0
+    if L % 2:
+        # nothing to pack, twice the values
+        relative *= 2
+    return FFT_COST * L * math.log(L) / math.log(2) * relative
+
+
+def cheaper_than_fft(plan):
+    lo, hi = band_bins(plan)
+    K = hi - lo
+    if K <= 0:
+        return True
+    return 2 * K * plan.L < fft_cost(plan.L)
+
+
+class BandFilters:
+    def __init__(self, plan, block_samples=256):
+        self.plan = plan
+        self.L = plan.L
+        self.block_samples = block_samples
+        self.lo, self.hi = band_bins(plan)
+        K = self.hi - self.lo
+        self.K = K
+        L = self.L
+        B = block_samples
+        bins = range(self.lo, self.hi)
+        self.cos = np.array([[math.cos(2 * math.pi * k * n / L) for n in range(B)] for k in bins])
+        self.sin = np.array([[math.sin(2 * math.pi * k * n / L) for n in range(B)] for k in bins])
+        self.rot_c = np.array([math.cos(2 * math.pi * k * B / L) for k in bins])
+        self.rot_s = np.array([math.sin(2 * math.pi * k * B / L) for k in bins])
+        self.acc_re = np.zeros(K)
+        self.acc_im = np.zeros(K)
+        self.phase_c = np.ones(K)
+        self.phase_s = np.zeros(K)
+        self._block = np.zeros(B)
+        self._decoded = i2s_decode.float_buffer(B)
+        # full length spectrum, only [lo, hi) is ever filled
+        self.P1 = np.zeros(L // 2 + 1)
+        self.position = 0
+        self.busy_us = 0
+
+    def reset(self):
+        self.acc_re[:] = 0
+        self.acc_im[:] = 0
+        self.phase_c[:] = 1
+        self.phase_s[:] = 0
+        self.position = 0
+
+    def done(self):
+        return self.position >= self.L
+
+    def add_block(self, block, num_samples=None):
+        # block: float samples, num_samples <= block_samples of them are used
+        if num_samples is None:
+            num_samples = len(block)
+        num_samples = min(num_samples, self.L - self.position)
+        if num_samples <= 0 or not self.K:
+            self.position += max(num_samples, 0)
+            return
+        x = self._block
+        if num_samples < self.block_samples:
+            x[:] = 0
+        x[:num_samples] = block[:num_samples]
+        window = self.plan.window
+        if window is not None:
+            x[:num_samples] = x[:num_samples] * window[self.position:self.position + num_samples]
+        re = linalg.dot(self.cos, x)
+        im = linalg.dot(self.sin, x) * -1
+        pc = self.phase_c
+        ps = self.phase_s
+        # (re + j*im) * exp(-j*phase)
+        self.acc_re[:] = self.acc_re + re * pc + im * ps
+        self.acc_im[:] = self.acc_im + im * pc - re * ps
+        # phase of the next block start
+        rc = self.rot_c
+        rs = self.rot_s
+        c = pc * rc - ps * rs
+        ps[:] = pc * rs + ps * rc
+        pc[:] = c
+        self.position += num_samples
+
+    def magnitude(self):
+        # P1 with the band bins filled in, same scaling as spectrum.single_sided()
+        lo = self.lo
+        hi = self.hi
+        P1 = self.P1
+        if hi > lo:
+            P1[lo:hi] = vector.sqrt(self.acc_re * self.acc_re + self.acc_im * self.acc_im) * self.plan.scale
+            if lo == 0:
+                P1[0] = P1[0] / 2
+            n = self.L // 2 + 1
+            if hi == n and self.L % 2 == 0:
+                P1[n - 1] = P1[n - 1] / 2
+        return P1
+
+    def bands(self, mode=spectrum.MEAN):
+        return self.plan.bands.reduce(self.magnitude(), mode, self.plan.result)
+
+    def analyze(self, samples, mode=spectrum.MEAN):
+        # whole frame at once, mostly for comparing with plan.analyze()
+        self.reset()
+        B = self.block_samples
+        for start in range(0, self.L, B):
+            self.add_block(samples[start:start + B])
+        return self.bands(mode)
+
+    def capture(self, audio_in, words=None, mode=spectrum.MEAN):
+        # Read DMA blocks from I2S and filter each one as soon as it arrives.
+        # Returns the band result after L samples.
+        B = self.block_samples
+        if words is None:
+            words = i2s_decode.int32_buffer(B)
+        words_mv = memoryview(words)
+        block = self._decoded
+        self.reset()
+        while not self.done():
+            want = min(B, self.L - self.position)
+            got = 0
+            t = profiling.start()
+            while got < want:
+                num_bytes = audio_in.readinto(words_mv[got:want])
+                got += num_bytes // i2s_decode.SAMPLE_SIZE_IN_BYTES
+            profiling.lap('readinto', t)
+            start = utime.ticks_us()
+            i2s_decode.decode_32(words, block, want)
+            t = profiling.lap('decode', start)
+            self.add_block(block, want)
+            profiling.lap('filter', t)
+            self.busy_us += utime.ticks_diff(utime.ticks_us(), start)
+        return self.bands(mode)
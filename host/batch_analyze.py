@@ -0,0 +1,169 @@
+# Purpose:
+# - analyze many recorded WAV files (mic-recording_<i>.wav from
+#   fft_analyzer_write.py) on a Linux host in one run
+# - the sample rate is read from every WAV header, the files are spread over
+#   a process pool and all band results end up in one CSV or NPZ file
+#
+# Every file is analyzed like fft_with_wav_input.py does on the device:
+# 'stft' gives one row per frame, 'welch' one averaged row per file; of a
+# multi-channel file the first channel is analyzed (WavReader channel 0).
+# Files that cannot be analyzed (not a RIFF WAVE file, not 16, 24 or 32-bit
+# integer PCM, shorter than one frame) are reported on stderr and skipped.
+# One row of the output is
+#   file, sample_rate, frame, time_ms, <one column per band>
+# the NPZ output holds the same columns as arrays (file as path, bands as
+# one 2-d array).
+#
+# Usage:
+#   python host/batch_analyze.py /sd-dump/audio -o bands.csv
+#   python host/batch_analyze.py 'cards/*/audio/*.wav' -o bands.npz --analysis welch --window hann
+#   python host/batch_analyze.py recordings -o bands.csv --jobs 8 --length 4096 --hop 2048
+
+import argparse
+import csv
+import glob
+import multiprocessing
+import os
+import sys
+from functools import partial
+
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy
+import spectrum
+import stft
+import welch
+import wav_reader
+
+
+def find_wav_files(patterns):
+    # directories are searched recursively for *.wav, anything else is a glob
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, dirs, names in os.walk(pattern):
+                dirs.sort()
+                files.extend(os.path.join(root, name) for name in sorted(names) if name.lower().endswith('.wav'))
+        else:
+            files.extend(sorted(glob.glob(pattern, recursive=True)))
+    # keep the order, drop files named twice
+    seen = set()
+    return [f for f in files if not (f in seen or seen.add(f))]
+
+
+def band_labels(settings):
+    # nominal Hz range of every band, the same for every sample rate
+    bins, start_at_hz, number_of_bins = settings['bins'], settings['start_at_hz'], settings['number_of_bins']
+    return ['%g-%gHz' % (start_at_hz + bins * x, start_at_hz + bins * (x + 1)) for x in range(number_of_bins)]
+
+
+def analyze_file(path, settings):
+    # Returns (path, sample rate, [(frame, time_ms, [band values])], error).
+    # Runs in a worker process, so only plain Python values are returned.
+    try:
+        reader = wav_reader.WavReader(open(path, 'rb'))
+        try:
+            Fs = reader.sample_rate
+            plan = spectrum.get_plan(Fs, settings['length'], settings['window'], settings['bins'],
+                                     settings['start_at_hz'], settings['number_of_bins'])
+            hop = settings['hop']
+            rows = []
+            if settings['analysis'] == 'welch':
+                averager = welch.average(reader, plan, hop)
+                if averager.count:
+                    rows.append((-1, 0, [float(x) for x in averager.bands(settings['mode'])]))
+            else:
+                for frame, P1, result in stft.band_frames(reader, plan, hop, settings['mode']):
+                    rows.append((frame, frame * hop * 1000 // Fs, [float(x) for x in result]))
+        finally:
+            reader.close()
+        if not rows:
+            raise ValueError('shorter than one frame of %d samples' % settings['length'])
+        return path, Fs, rows, None
+    except (ValueError, OSError) as e:
+        return path, 0, [], '{} {}'.format(type(e).__name__, e)
+
+
+def _write_csv(output, header, results):
+    with open(output, 'w', newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(header)
+        for path, Fs, rows in results:
+            for frame, time_ms, bands in rows:
+                writer.writerow([path, Fs, frame, time_ms] + ['%.6g' % x for x in bands])
+
+
+def _write_npz(output, labels, results):
+    files, rates, frames, times, bands = [], [], [], [], []
+    for path, Fs, rows in results:
+        for frame, time_ms, values in rows:
+            files.append(path)
+            rates.append(Fs)
+            frames.append(frame)
+            times.append(time_ms)
+            bands.append(values)
+    numpy.savez_compressed(
+        output,
+        path=numpy.array(files, dtype=str),
+        sample_rate=numpy.array(rates, dtype=numpy.int32),
+        frame=numpy.array(frames, dtype=numpy.int32),
+        time_ms=numpy.array(times, dtype=numpy.int64),
+        bands=numpy.array(bands, dtype=numpy.float32).reshape((len(bands), len(labels))),
+        band_labels=numpy.array(labels, dtype=str))
+
+
+def run(files, output, settings, jobs):
+    labels = band_labels(settings)
+    failed = 0
+
+    def results(pool):
+        nonlocal failed
+        # imap keeps the file order, chunks keep the per-file overhead small
+        chunksize = max(1, min(32, len(files) // (4 * jobs)))
+        for path, Fs, rows, error in pool.imap(partial(analyze_file, settings=settings), files, chunksize):
+            if error:
+                failed += 1
+                print('skipped {}: {}'.format(path, error), file=sys.stderr)
+                continue
+            yield path, Fs, rows
+
+    with multiprocessing.Pool(jobs) as pool:
+        if output.endswith('.npz'):
+            _write_npz(output, labels, results(pool))
+        else:
+            # rows are streamed to the CSV file as the workers finish
+            _write_csv(output, ['file', 'sample_rate', 'frame', 'time_ms'] + labels, results(pool))
+    print('files: \t\t', len(files))
+    print('skipped: \t', failed)
+    print('written to: \t', output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Analyze directories or globs of WAV recordings in parallel.')
+    parser.add_argument('paths', nargs='+', help='directories (searched for *.wav) or glob patterns')
+    parser.add_argument('-o', '--output', default='bands.csv', help='.csv or .npz')
+    parser.add_argument('--analysis', choices=('stft', 'welch'), default='stft')
+    parser.add_argument('--length', type=int, default=4096, help='samples per fft (FRAME_LENGTH)')
+    parser.add_argument('--hop', type=int, default=None, help='samples between frames, default: length')
+    parser.add_argument('--bins', type=float, default=100, help='band width in Hz (BINS)')
+    parser.add_argument('--start', type=float, default=0, help='first band starts at (START_AT_HZ)')
+    parser.add_argument('--number', type=int, default=10, help='number of bands (NUMBER_OF_BINS)')
+    parser.add_argument('--window', default=spectrum.RECT, help='rect, hann or hamming')
+    parser.add_argument('--max', action='store_true', help='band maximum instead of the mean')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='worker processes')
+    args = parser.parse_args()
+
+    files = find_wav_files(args.paths)
+    if not files:
+        parser.error('no WAV files found')
+    settings = {
+        'analysis': args.analysis,
+        'length': args.length,
+        'hop': args.hop or args.length,
+        'bins': args.bins,
+        'start_at_hz': args.start,
+        'number_of_bins': args.number,
+        'window': args.window,
+        'mode': spectrum.MAX if args.max else spectrum.MEAN,
+    }
+    run(files, args.output, settings, max(1, args.jobs))
@@ -0,0 +1,101 @@
+# Purpose:
+# - reproducible benchmark of the analysis pipeline on a Linux host
+# - sweeps L, Fs, NUMBER_OF_BINS and window and reports frames/s and peak
+#   memory for every combination
+#
+# Every frame goes through the same steps as in fft_analyzer_with_mic.py:
+# L 32-bit words are read from a synthetic I2S microphone (machine stand-in,
+# fixed seed), decoded with i2s_decode.decode_32 and analyzed with the
+# cached spectrum.Plan. frames/s is the median of --repeat runs of --frames
+# frames; plan KiB is the memory allocated when the plan is built, peak KiB
+# the largest extra allocation while frames are analyzed (tracemalloc), which
+# includes FFT tables built on first use of a length.
+# The NumPy stand-in is much faster than ulab on the ESP32, so compare runs
+# with each other, not with the device.
+#
+# Usage:
+#   python host/bench_pipeline.py
+#   python host/bench_pipeline.py --length 2048,4096,4100 --rate 4096 --bins 10 --window rect,hann -o bench.csv
+
+import argparse
+import csv
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HOST)
+sys.path.insert(1, os.path.dirname(HOST))
+
+import i2s_decode
+import profiling
+import spectrum
+from machine import SyntheticI2S
+
+BIN_SIZE_IN_HZ = 100
+START_AT_HZ = 0
+
+
+def bench(Fs, L, number_of_bins, window, frames, repeat):
+    # (frames/s, plan KiB, peak KiB) of one configuration
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    # a new plan every time, the cache would hide the build cost
+    plan = spectrum.Plan(Fs, L, window, BIN_SIZE_IN_HZ, START_AT_HZ, number_of_bins)
+    words = i2s_decode.int32_buffer(L)
+    plan_bytes = tracemalloc.get_traced_memory()[0] - before
+    audio_in = SyntheticI2S(Fs)
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+
+    rates = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(frames):
+            audio_in.readinto(words)
+            i2s_decode.decode_32(words, plan.samples)
+            plan.analyze()
+        rates.append(frames / (time.perf_counter() - start))
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    rates.sort()
+    return rates[len(rates) // 2], plan_bytes / 1024, peak / 1024
+
+
+def _list(text, kind=int):
+    return [kind(x) for x in text.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the analysis pipeline over a settings sweep.')
+    parser.add_argument('--length', type=_list, default=[1024, 2050, 4096, 8192], help='L values')
+    parser.add_argument('--rate', type=_list, default=[2050, 4096], help='Fs values')
+    parser.add_argument('--bins', type=_list, default=[10, 40], help='NUMBER_OF_BINS values')
+    parser.add_argument('--window', type=lambda text: text.split(','), default=[spectrum.RECT, spectrum.HANN])
+    parser.add_argument('--frames', type=int, default=50, help='frames per run')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per setting, the median is reported')
+    parser.add_argument('--profile', action='store_true', help='also print per-stage percentiles')
+    parser.add_argument('-o', '--output', help='write the results to this CSV file')
+    args = parser.parse_args()
+
+    profiling.enable(args.profile)
+    header = ['L', 'Fs', 'bins', 'window', 'frames/s', 'plan KiB', 'peak KiB']
+    rows = []
+    print('%6s %6s %5s %8s %10s %9s %9s' % tuple(header))
+    for L in args.length:
+        for Fs in args.rate:
+            for number_of_bins in args.bins:
+                for window in args.window:
+                    rate, plan_kib, peak_kib = bench(Fs, L, number_of_bins, window, args.frames, args.repeat)
+                    rows.append([L, Fs, number_of_bins, window, '%.1f' % rate, '%.1f' % plan_kib, '%.1f' % peak_kib])
+                    print('%6d %6d %5d %8s %10.1f %9.1f %9.1f' % (L, Fs, number_of_bins, window, rate, plan_kib, peak_kib))
+    profiling.report()
+    if args.output:
+        with open(args.output, 'w', newline='') as out:
+            writer = csv.writer(out)
+            writer.writerow(header)
+            writer.writerows(rows)
+        print('written to: \t', args.output)
@@ -0,0 +1,138 @@
+# Host stand-in for the Pycom machine module (Pin, SD, I2S).
+#
+# Only what the fft_* scripts use is provided:
+# - Pin(name) just remembers the name
+# - SD() is a temporary directory on the host; run_script.py mounts it as
+#   /sd, so the scripts read and write their files there
+# - I2S(...) in MASTER_RX mode delivers samples like the microphone does:
+#   from the WAV file in I2S_WAV (replayed with ReplayI2S), otherwise a
+#   synthetic, reproducible test signal (SyntheticI2S). MASTER_TX accepts
+#   and drops everything written to it. channelformat=I2S.RIGHT_LEFT
+#   delivers two interleaved channels (a stereo WAV file, or I2S_TONES and
+#   I2S_TONES_2 for the synthetic signal).
+# Set I2S_WAV, I2S_SPEED or I2S_TONES before the script creates its I2S.
+
+import math
+import random
+import tempfile
+import time
+from array import array
+
+from replay_i2s import ReplayI2S
+
+I2S_WAV = None                 # WAV file replayed as microphone input
+I2S_SPEED = None               # None: as fast as read, else x real time
+I2S_TONES = ((440, 8000), (1000, 2000))  # (Hz, 16-bit amplitude) of the synthetic signal
+I2S_TONES_2 = ((660, 6000), (1500, 3000))  # second channel of a stereo synthetic signal
+I2S_NOISE = 100                # 16-bit amplitude of the added noise
+I2S_SEED = 1
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+
+    def __init__(self, name, mode=None, *args, **kwargs):
+        self.name = name
+        self.mode = mode
+
+    def __call__(self, value=None):
+        return 0
+
+
+class SD:
+    def __init__(self, *args, **kwargs):
+        self._dir = tempfile.TemporaryDirectory(prefix='sd-')
+        self.root = self._dir.name
+
+    def deinit(self):
+        pass
+
+
+class SyntheticI2S:
+    # A sum of I2S_TONES sine waves plus uniform noise as 32-bit I2S words
+    # (16-bit value in the upper half, like ReplayI2S). The same seed gives
+    # the same samples. With speed=None every read returns at once,
+    # otherwise samples arrive at speed times the sample rate. With
+    # channels=2 the words of I2S_TONES and I2S_TONES_2 are interleaved.
+    def __init__(self, samplerate, tones=None, noise=None, seed=None, speed=None, dmalen=256, channels=1):
+        self.samplerate = samplerate
+        self.tones = I2S_TONES if tones is None else tones
+        self.noise = I2S_NOISE if noise is None else noise
+        self.speed = speed
+        self.dmalen = dmalen
+        self.channels = channels
+        self.position = 0
+        self.overruns = 0
+        self._random = random.Random(I2S_SEED if seed is None else seed)
+        self._t0 = None
+        # one second of signal, repeated
+        tone_sets = [self.tones, I2S_TONES_2][:channels]
+        self.words = array('i', (self._sample(n, tone_sets[c]) << 16 for n in range(samplerate) for c in range(channels)))
+
+    def _sample(self, n, tones):
+        v = sum(a * math.sin(2 * math.pi * f * n / self.samplerate) for f, a in tones)
+        v += self._random.uniform(-self.noise, self.noise)
+        return max(-32768, min(32767, int(round(v))))
+
+    def readinto(self, buf, timeout=-1):
+        out = memoryview(buf).cast('B').cast('i')
+        n = len(out)
+        if self.speed is not None:
+            if self._t0 is None:
+                self._t0 = time.monotonic()
+            ready = (self.position + n) / (self.samplerate * self.channels * self.speed) + self._t0
+            wait = ready - time.monotonic()
+            if wait > 0:
+                if timeout == 0:
+                    return 0
+                time.sleep(wait)
+        done = 0
+        while done < n:
+            start = (self.position + done) % len(self.words)
+            k = min(n - done, len(self.words) - start)
+            out[done:done + k] = self.words[start:start + k]
+            done += k
+        self.position += n
+        return n * 4
+
+    def deinit(self):
+        pass
+
+
+class I2S:
+    NUM0 = 0
+    NUM1 = 1
+    PHILIPS = 0
+    LSB = 1
+    MSB = 2
+    MASTER_RX = 0
+    MASTER_TX = 1
+    B16 = 16
+    B24 = 24
+    B32 = 32
+    RIGHT_LEFT = 0
+    ALL_RIGHT = 1
+    ALL_LEFT = 2
+    ONLY_RIGHT = 3
+    ONLY_LEFT = 4
+
+    def __init__(self, id, mode=MASTER_RX, samplerate=8000, dmacount=16, dmalen=64, channelformat=ONLY_LEFT, **kwargs):
+        self.mode = mode
+        self.samplerate = samplerate
+        channels = 2 if channelformat == I2S.RIGHT_LEFT else 1
+        if mode != I2S.MASTER_RX:
+            self.source = None
+        elif I2S_WAV:
+            self.source = ReplayI2S(I2S_WAV, dmacount=dmacount, dmalen=dmalen, speed=I2S_SPEED or 1000.0, channels=channels)
+        else:
+            self.source = SyntheticI2S(samplerate, speed=I2S_SPEED, dmalen=dmalen, channels=channels)
+
+    def readinto(self, buf, timeout=-1):
+        return self.source.readinto(buf, timeout)
+
+    def write(self, buf, timeout=-1):
+        return len(buf)
+
+    def deinit(self):
+        pass
@@ -0,0 +1,144 @@
+# Purpose:
+# - read spectrum logs written by spectrum_log.Writer on a Linux host
+# - the log file is memory mapped and viewed as NumPy arrays, so opening a
+#   log of any length is instant and only the requested records are read
+#
+# Usage:
+#   python host/read_spectrum_log.py spectrum_1.log              # header and summary
+#   python host/read_spectrum_log.py spectrum_1.log -o bands.csv # all records as CSV
+#   python host/read_spectrum_log.py spectrum_1.log --at 60000   # record at 60 s
+#
+#   log = SpectrumLog('spectrum_1.log')
+#   time_ms, bands = log.records(0, len(log))
+
+import argparse
+import csv
+import mmap
+import os
+import sys
+
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy
+import spectrum_log
+
+
+class SpectrumLog:
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = spectrum_log.unpack_header(self._map[:spectrum_log.HEADER_SIZE])
+        self.header = header
+        self.count = header['count']
+        self.interval = header['index_interval']
+        value = '<f4' if header['value_type'] == spectrum_log.FLOAT32 else '<u2'
+        record = numpy.dtype([('time_ms', '<u4'), ('bands', value, (self.count,))])
+        block = numpy.dtype([('magic', 'S4'), ('first', '<u4'), ('time_ms', '<u4'),
+                             ('records', record, (self.interval,))])
+        # complete blocks are one array, the last block may be cut short
+        data = len(self._map) - header['header_size']
+        full = data // block.itemsize
+        self.blocks = numpy.ndarray(full, block, buffer=self._map, offset=header['header_size'])
+        rest = data - full * block.itemsize - spectrum_log.BLOCK_HEADER_SIZE
+        tail = max(0, rest // record.itemsize)
+        if tail:
+            self.tail = numpy.ndarray(tail, record, buffer=self._map,
+                                      offset=header['header_size'] + full * block.itemsize + spectrum_log.BLOCK_HEADER_SIZE)
+        else:
+            self.tail = numpy.zeros(0, record)
+        self.length = full * self.interval + tail
+
+    def __len__(self):
+        return self.length
+
+    def close(self):
+        del self.blocks, self.tail
+        self._map.close()
+        self._file.close()
+
+    def check(self):
+        # number of the first block without a sync marker, None if all are fine
+        bad = numpy.nonzero(self.blocks['magic'] != spectrum_log.BLOCK_MAGIC)[0]
+        return int(bad[0]) if len(bad) else None
+
+    def _scale(self, values):
+        if self.header['value_type'] == spectrum_log.UINT16:
+            return values * numpy.float32(self.header['scale'])
+        return values.astype(numpy.float32)
+
+    def records(self, start, stop):
+        # (time_ms, bands) of records start .. stop - 1, bands in band units
+        stop = min(stop, self.length)
+        full = len(self.blocks) * self.interval
+        parts = []
+        if start < full:
+            # only the blocks holding the records are copied into one array
+            first = start // self.interval
+            last = (min(stop, full) - 1) // self.interval + 1
+            flat = self.blocks['records'][first:last].reshape(-1)
+            offset = first * self.interval
+            parts.append(flat[start - offset:min(stop, full) - offset])
+        if stop > full:
+            parts.append(self.tail[max(start - full, 0):stop - full])
+        if not parts:
+            return numpy.zeros(0, numpy.uint32), numpy.zeros((0, self.count), numpy.float32)
+        rows = parts[0] if len(parts) == 1 else numpy.concatenate(parts)
+        return rows['time_ms'], self._scale(rows['bands'])
+
+    def find(self, time_ms, chunk=4096):
+        # index of the first record at or after time_ms, len(self) if there
+        # is none: binary search over the headers of the complete blocks,
+        # then forward from the start of that block through the cut short
+        # last block
+        block = int(numpy.searchsorted(self.blocks['time_ms'], time_ms, side='right')) - 1
+        start = max(block, 0) * self.interval
+        while start < self.length:
+            times = self.records(start, start + chunk)[0]
+            index = int(numpy.searchsorted(times, time_ms))
+            if index < len(times):
+                return start + index
+            start += len(times)
+        return self.length
+
+
+def _print_header(log):
+    h = log.header
+    print('Fs: \t\t', h['Fs'], 'Hz, L:', h['L'], ', window:', h['window'])
+    print('bands: \t\t', h['count'], 'x', h['bin_size_in_hz'], 'Hz from', h['start_at_hz'], 'Hz')
+    print('records: \t', len(log), '(%d bytes each)' % h['record_size'])
+    if len(log):
+        time_ms, bands = log.records(len(log) - 1, len(log))
+        print('duration: \t', int(time_ms[0]), 'ms')
+    bad = log.check()
+    if bad is not None:
+        print('broken block: \t', bad)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Read a binary spectrum log.')
+    parser.add_argument('log')
+    parser.add_argument('-o', '--output', help='write all records to this CSV file')
+    parser.add_argument('--at', type=int, help='print the record at this time in ms')
+    args = parser.parse_args()
+
+    log = SpectrumLog(args.log)
+    _print_header(log)
+    if args.at is not None:
+        index = log.find(args.at)
+        time_ms, bands = log.records(index, index + 1)
+        if len(time_ms):
+            print("result", index, "(", int(time_ms[0]), "ms): \t", bands[0])
+    if args.output:
+        h = log.header
+        labels = ['%g-%gHz' % (h['start_at_hz'] + h['bin_size_in_hz'] * x, h['start_at_hz'] + h['bin_size_in_hz'] * (x + 1))
+                  for x in range(h['count'])]
+        with open(args.output, 'w', newline='') as out:
+            writer = csv.writer(out)
+            writer.writerow(['time_ms'] + labels)
+            # in chunks, so the whole log is never copied at once
+            for start in range(0, len(log), 65536):
+                time_ms, bands = log.records(start, start + 65536)
+                for t, row in zip(time_ms, bands):
+                    writer.writerow([int(t)] + ['%.6g' % x for x in row])
+        print('written to: \t', args.output)
+    log.close()
@@ -0,0 +1,73 @@
+# Host stand-in for a machine.I2S microphone (MASTER_RX, B32, ONLY_LEFT, or
+# RIGHT_LEFT with a stereo file).
+#
+# Replays a 16-bit WAV file at real-time rate: samples become
+# "available" as wall clock time passes, exactly like the DMA ring of the
+# ESP32 driver fills. Every sample is delivered as a little endian 32-bit
+# word with the 16-bit value in the upper half, like the INMP441 data.
+# Samples older than dmacount * dmalen are overwritten (overruns counts
+# them), so a reader that does not keep up loses audio as on the device.
+# Positions and sizes count 32-bit words, channels words per frame.
+
+import time
+import wave
+from array import array
+
+
+class ReplayI2S:
+    def __init__(self, wav_path, loop=True, dmacount=50, dmalen=256, speed=1.0, channels=1):
+        with wave.open(wav_path, 'rb') as w:
+            if w.getsampwidth() != 2:
+                raise ValueError('only 16-bit WAV files can be replayed')
+            if w.getnchannels() != channels:
+                raise ValueError('the I2S expects %d channels, the WAV file has %d' % (channels, w.getnchannels()))
+            self.samplerate = w.getframerate()
+            pcm = array('h', w.readframes(w.getnframes()))
+        self.words = array('i', (s << 16 for s in pcm))
+        self.channels = channels
+        self.loop = loop
+        self.capacity = dmacount * dmalen * channels
+        self.dmalen = dmalen * channels
+        self.speed = speed
+        self.position = 0        # samples handed out or overwritten
+        self.overruns = 0        # samples overwritten before they were read
+        self._t0 = None
+
+    def _available(self):
+        if self._t0 is None:
+            self._t0 = time.monotonic()
+        produced = int((time.monotonic() - self._t0) * self.samplerate * self.channels * self.speed)
+        if not self.loop:
+            produced = min(produced, len(self.words))
+        lag = produced - self.position
+        if lag > self.capacity:
+            self.overruns += lag - self.capacity
+            self.position += lag - self.capacity
+            lag = self.capacity
+        return lag
+
+    def readinto(self, buf, timeout=-1):
+        out = memoryview(buf).cast('B').cast('i')
+        want = len(out)
+        while True:
+            available = self._available()
+            if not self.loop and self.position >= len(self.words):
+                return 0
+            if available >= want or (timeout == 0 and available >= self.dmalen):
+                break
+            if timeout == 0:
+                return 0
+            time.sleep((want - available) / (self.samplerate * self.channels * self.speed))
+        # like the driver, hand out whole DMA buffers only
+        n = min(want, available - available % self.dmalen) if available < want else want
+        start = self.position % len(self.words)
+        first = min(n, len(self.words) - start)
+        out[:first] = self.words[start:start + first]
+        if first < n:
+            # wrap around to the start of the recording
+            out[first:n] = self.words[:n - first]
+        self.position += n
+        return n * 4
+
+    def deinit(self):
+        pass
@@ -0,0 +1,79 @@
+# Purpose:
+# - run the ping-pong capture pipeline on a plain Linux host
+# - a WAV file is replayed at real-time rate through ReplayI2S and every
+#   capture is decoded and analyzed like in fft_analyzer_with_mic.py
+# - reports analyzed frames, dropped samples, gaps and analysis time, so
+#   gapless throughput can be checked without a device
+#
+# Usage:
+#   python host/replay_pipeline.py recording.wav --seconds 10 --length 4096
+#   python host/replay_pipeline.py recording.wav --speed 20   # stress test
+
+import argparse
+import os
+import sys
+
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utime
+import capture
+import profiling
+import i2s_decode
+import spectrum
+from replay_i2s import ReplayI2S
+
+
+def run(wav_path, seconds, length, speed, window, verbose, profile=False):
+    profiling.enable(profile)
+    audio_in = ReplayI2S(wav_path, speed=speed)
+    Fs = audio_in.samplerate
+    plan = spectrum.get_plan(Fs, length, window, 100, 0, 10)
+    pipe = capture.PingPong(audio_in, length)
+
+    gaps = 0
+    busy_ms = 0
+    expected = None
+    pipe.start()
+    start = utime.ticks_ms()
+    try:
+        while utime.ticks_diff(utime.ticks_ms(), start) < seconds * 1000:
+            index = pipe.get(timeout_ms=1000)
+            if index is None:
+                continue
+            t = utime.ticks_ms()
+            if expected is not None and pipe.positions[index] != expected:
+                gaps += 1
+            expected = pipe.positions[index] + length
+            t0 = profiling.start()
+            i2s_decode.decode_32(pipe.buffers[index], plan.samples)
+            profiling.lap('decode', t0)
+            P1, result = plan.analyze()
+            pipe.release(index)
+            busy_ms += utime.ticks_diff(utime.ticks_ms(), t)
+            if verbose:
+                print("result: \t", result)
+    finally:
+        pipe.stop()
+
+    elapsed = utime.ticks_diff(utime.ticks_ms(), start)
+    print('frames analyzed: \t', pipe.frames)
+    print('frames dropped: \t', pipe.frames_dropped(), '(%d samples)' % pipe.dropped)
+    print('gaps between frames: \t', gaps)
+    print('I2S overruns: \t\t', audio_in.overruns, 'samples')
+    if pipe.frames:
+        print('analysis per frame: \t', busy_ms / pipe.frames, 'milliseconds')
+    print('realtime capacity: \t', pipe.frames * length / Fs * 1000 / max(elapsed, 1) / speed)
+    profiling.report()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a WAV through the ping-pong capture pipeline.')
+    parser.add_argument('wav')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--length', type=int, default=4096, help='samples per capture (L)')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay faster than real time')
+    parser.add_argument('--window', default=spectrum.RECT)
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('--profile', action='store_true', help='print per-stage percentiles')
+    args = parser.parse_args()
+    run(args.wav, args.seconds, args.length, args.speed, args.window, args.verbose, args.profile)
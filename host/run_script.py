@@ -0,0 +1,89 @@
+# Purpose:
+# - run the unchanged fft_* device scripts on a Linux host
+# - ulab, utime and machine come from the stand-ins in host/, the SD card is
+#   a temporary directory: paths below /sd are redirected to it once the
+#   script calls os.mount(sd, '/sd')
+#
+# Usage:
+#   python host/run_script.py fft_analyzer_with_mic.py
+#   python host/run_script.py fft_analyzer_write.py --wav recording.wav --keep sd-copy
+#   python host/run_script.py fft_with_wav_input.py --put recording.wav:audio/mic-recording_5.wav
+
+import argparse
+import builtins
+import os
+import runpy
+import shutil
+import sys
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HOST)
+sys.path.insert(1, os.path.dirname(HOST))
+
+import machine
+
+_mounts = {}
+_open = builtins.open
+
+
+def host_path(path):
+    # the host path of a device path below a mounted SD card
+    if isinstance(path, str):
+        for point, root in _mounts.items():
+            if path == point or path.startswith(point + '/'):
+                return root + path[len(point):]
+    return path
+
+
+def _mount(sd, point):
+    if point in _mounts:
+        raise OSError('already mounted')
+    _mounts[point] = sd.root
+
+
+def _umount(point):
+    _mounts.pop(point, None)
+
+
+def install():
+    # redirect the os and open() calls the scripts make on /sd
+    os.mount = _mount
+    os.umount = _umount
+    for name in ('stat', 'mkdir', 'listdir', 'remove', 'rename', 'rmdir'):
+        function = getattr(os, name)
+        setattr(os, name, lambda *args, _f=function, **kwargs: _f(*[host_path(a) for a in args], **kwargs))
+    builtins.open = lambda path, *args, **kwargs: _open(host_path(path), *args, **kwargs)
+
+
+def run(script, sd=None):
+    # run script like main.py on the device, sd is the machine.SD() to use
+    # for files put on the card before the run
+    install()
+    if sd is not None:
+        machine.SD = lambda *args, **kwargs: sd
+    runpy.run_path(script, run_name='__main__')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run an fft_* device script on the host.')
+    parser.add_argument('script')
+    parser.add_argument('--wav', help='replay this WAV file as microphone input')
+    parser.add_argument('--speed', type=float, default=1.0, help='deliver audio at this multiple of real time')
+    parser.add_argument('--put', action='append', default=[], metavar='FILE:PATH',
+                        help='copy FILE to PATH on the SD card before the run')
+    parser.add_argument('--keep', help='copy the SD card contents to this directory after the run')
+    args = parser.parse_args()
+
+    machine.I2S_WAV = args.wav
+    machine.I2S_SPEED = args.speed
+    sd = machine.SD()
+    for put in args.put:
+        source, target = put.split(':', 1)
+        target = os.path.join(sd.root, target)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copy(source, target)
+    try:
+        run(args.script, sd)
+    finally:
+        if args.keep:
+            shutil.copytree(sd.root, args.keep, dirs_exist_ok=True)
@@ -0,0 +1,104 @@
+# Purpose:
+# - subscribe to a spectrum server (fft_analyzer_server.py, on the device or
+#   run on the host with run_script.py) and print or count its frames
+# - --delay reads slowly on purpose, to see the server drop old frames
+#   instead of stalling the capture
+#
+# Usage:
+#   python host/spectrum_client.py --host 192.168.4.1
+#   python host/spectrum_client.py --unix /tmp/spectrum.sock --frames 20
+#   python host/spectrum_client.py --delay 500 --quiet
+
+import argparse
+import json
+import os
+import socket
+import struct
+import sys
+import time
+
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import spectrum_log
+
+
+def read_exactly(stream, size):
+    data = stream.read(size)
+    if len(data) < size:
+        raise EOFError
+    return data
+
+
+def frames(stream):
+    # (header dict, then (time_ms, bands) per frame) from either format
+    first = stream.peek(4)[:4]
+    if first == spectrum_log.MAGIC:
+        header = spectrum_log.unpack_header(read_exactly(stream, spectrum_log.HEADER_SIZE))
+        yield header
+        record = '<I%df' % header['count']
+        size = struct.calcsize(record)
+        while True:
+            values = struct.unpack(record, read_exactly(stream, size))
+            yield values[0], list(values[1:])
+    else:
+        yield json.loads(stream.readline())
+        for line in stream:
+            frame = json.loads(line)
+            yield frame['t'], frame['bands']
+
+
+def run(host, port, unix, count, delay_ms, quiet, retry_s=10):
+    deadline = time.monotonic() + retry_s
+    while True:
+        try:
+            if unix:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(unix)
+            else:
+                sock = socket.create_connection((host, port))
+            break
+        except OSError:
+            # the server may still be starting
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+    received = 0
+    gaps = 0
+    step = None
+    last = None
+    with sock, sock.makefile('rb') as stream:
+        source = frames(stream)
+        header = next(source)
+        print('header: \t', {k: header[k] for k in ('Fs', 'L', 'window', 'bin_size_in_hz', 'start_at_hz', 'count')})
+        try:
+            for time_ms, bands in source:
+                if last is not None:
+                    if step is None:
+                        step = time_ms - last
+                    elif time_ms - last > step * 3 // 2:
+                        # frames dropped by the server or the capture
+                        gaps += 1
+                last = time_ms
+                received += 1
+                if not quiet:
+                    print(time_ms, '\t', ' '.join('%.6g' % v for v in bands))
+                if count and received >= count:
+                    break
+                if delay_ms:
+                    time.sleep(delay_ms / 1000)
+        except EOFError:
+            pass
+    print('frames received: \t', received)
+    print('gaps: \t\t\t', gaps)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print the frames of a spectrum server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='connect to this Unix socket instead')
+    parser.add_argument('--frames', type=int, default=0, help='stop after this many frames, 0: until the server stops')
+    parser.add_argument('--delay', type=float, default=0, help='milliseconds to wait after every frame')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print the summary')
+    args = parser.parse_args()
+    run(args.host, args.port, args.unix, args.frames, args.delay, args.quiet)
@@ -0,0 +1,54 @@
+# Host stand-in for the ulab firmware module, backed by NumPy.
+#
+# Only the part of the ulab API used by this repository is provided, with the
+# ulab spelling: arrays have size() as a method, float is single precision,
+# and the functions live in the fft, vector, numerical and linalg submodules.
+
+import numpy as _np
+
+float = _np.float32
+int8 = _np.int8
+uint8 = _np.uint8
+int16 = _np.int16
+uint16 = _np.uint16
+
+
+class ndarray(_np.ndarray):
+    def size(self):
+        return int(_np.prod(_np.ndarray.__getattribute__(self, 'shape')))
+
+    def __repr__(self):
+        return 'array(' + repr(_np.asarray(self).tolist()) + ')'
+
+    __str__ = __repr__
+
+
+def _wrap(a):
+    return _np.asarray(a).view(ndarray)
+
+
+def array(iterable, dtype=float):
+    try:
+        a = _np.array(iterable, dtype=dtype)
+    except TypeError:
+        a = _np.array(list(iterable), dtype=dtype)
+    return _wrap(a)
+
+
+def zeros(shape, dtype=float):
+    return _wrap(_np.zeros(shape, dtype=dtype))
+
+
+def ones(shape, dtype=float):
+    return _wrap(_np.ones(shape, dtype=dtype))
+
+
+def linspace(start, stop, num=50, endpoint=True, dtype=float):
+    return _wrap(_np.linspace(start, stop, num=num, endpoint=endpoint).astype(dtype))
+
+
+def frombuffer(buffer, dtype=float, count=-1, offset=0):
+    return _wrap(_np.frombuffer(buffer, dtype=dtype, count=count, offset=offset))
+
+
+from . import fft, vector, numerical, linalg
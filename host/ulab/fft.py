@@ -0,0 +1,21 @@
+import numpy as _np
+from . import _wrap
+
+
+def _transform(fn, re, im):
+    n = len(re)
+    if n == 0 or n & (n - 1):
+        raise ValueError('input array size must be power of 2')
+    x = _np.asarray(re, dtype=_np.float64)
+    if im is not None:
+        x = x + 1j * _np.asarray(im, dtype=_np.float64)
+    y = fn(x)
+    return _wrap(y.real.astype(_np.float32)), _wrap(y.imag.astype(_np.float32))
+
+
+def fft(re, im=None):
+    return _transform(_np.fft.fft, re, im)
+
+
+def ifft(re, im=None):
+    return _transform(_np.fft.ifft, re, im)
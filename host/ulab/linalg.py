@@ -0,0 +1,6 @@
+import numpy as _np
+from . import _wrap
+
+
+def dot(a, b):
+    return _wrap(_np.dot(_np.asarray(a), _np.asarray(b)))
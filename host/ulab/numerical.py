@@ -0,0 +1,20 @@
+import numpy as _np
+from . import _wrap
+
+
+def _reduction(fn):
+    def apply(a, axis=None):
+        r = fn(_np.asarray(a), axis=axis)
+        if isinstance(r, _np.ndarray):
+            return _wrap(r)
+        return r.item()
+    return apply
+
+
+sum = _reduction(_np.sum)
+mean = _reduction(_np.mean)
+std = _reduction(_np.std)
+max = _reduction(_np.max)
+min = _reduction(_np.min)
+argmax = _reduction(_np.argmax)
+argmin = _reduction(_np.argmin)
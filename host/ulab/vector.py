@@ -0,0 +1,23 @@
+import numpy as _np
+from . import _wrap
+
+
+def _elementwise(fn):
+    def apply(a):
+        return _wrap(fn(_np.asarray(a, dtype=_np.float32)))
+    return apply
+
+
+acos = _elementwise(_np.arccos)
+asin = _elementwise(_np.arcsin)
+atan = _elementwise(_np.arctan)
+ceil = _elementwise(_np.ceil)
+cos = _elementwise(_np.cos)
+exp = _elementwise(_np.exp)
+floor = _elementwise(_np.floor)
+log = _elementwise(_np.log)
+log10 = _elementwise(_np.log10)
+log2 = _elementwise(_np.log2)
+sin = _elementwise(_np.sin)
+sqrt = _elementwise(_np.sqrt)
+tan = _elementwise(_np.tan)
@@ -0,0 +1,161 @@
+# Purpose:
+# - decode raw I2S microphone frames into a float sample array for the FFT
+# - snip the upper 16 bits of every frame for WAV files in the same pass
+#
+# With dataformat=I2S.B32 the ESP32 I2S driver stores every left channel
+# sample of an INMP441/MSM261S4030H0 as one little endian, two's complement
+# 32-bit word (24 data bits, MSB aligned). The capture buffer is allocated as
+# array('i') so the same memory can be read by the driver and reinterpreted
+# as signed 32-bit frames without building an intermediate Python list.
+#
+# Stereo (channelformat=I2S.RIGHT_LEFT) and multi-channel WAV data is
+# interleaved frame by frame. The decode functions take channel and
+# channels and pick every channels-th sample starting at channel, with
+# frombuffer() as a strided view, so the channels are split without
+# copying the capture buffer first.
+
+from array import array
+import ulab as np
+from ulab import vector
+
+SAMPLE_SIZE_IN_BYTES = 4
+
+# ulab builds with frombuffer() can look at the capture buffer without a copy
+_frombuffer = getattr(np, 'frombuffer', None)
+
+
+def int32_buffer(num_samples):
+    # zero filled, readinto() compatible buffer of num_samples 32-bit words
+    return array('i', bytearray(num_samples * SAMPLE_SIZE_IN_BYTES))
+
+
+def int16_buffer(num_samples):
+    # readinto() compatible buffer for 16-bit PCM, e.g. read from a WAV file
+    return array('h', bytearray(num_samples * 2))
+
+
+def float_buffer(num_samples):
+    return np.zeros(num_samples)
+
+
+def pcm16_buffer(num_samples):
+    return bytearray(num_samples * 2)
+
+
+def decode_32(words, out, num_samples=None, offset=0, channel=0, channels=1):
+    # Convert the first num_samples words of an int32_buffer() into the
+    # preallocated float array out[offset:offset + num_samples] and return out.
+    # With channels > 1 num_samples counts the samples of channel only.
+    if num_samples is None:
+        num_samples = len(out) - offset
+    stop = offset + num_samples
+    if _frombuffer is not None:
+        # upper (signed) and lower (unsigned) 16-bit halves of every word
+        count = 2 * num_samples * channels
+        upper = _frombuffer(words, dtype=np.int16, count=count)
+        lower = _frombuffer(words, dtype=np.uint16, count=count)
+        out[offset:stop] = upper[2 * channel + 1::2 * channels]
+        out[offset:stop] = out[offset:stop] * 65536 + lower[2 * channel::2 * channels]
+    else:
+        # array('i') already holds signed 32-bit values, ulab converts them in C
+        if num_samples * channels < len(words):
+            words = words[:num_samples * channels]
+        if channels == 1:
+            out[offset:stop] = np.array(words, dtype=np.float)
+        else:
+            out[offset:stop] = np.array(words, dtype=np.float)[channel::channels]
+    return out
+
+
+def decode_16(words, pcm, out, num_samples=None):
+    # Snip the upper 16 bits of the first num_samples words of an
+    # int32_buffer(). The 16-bit samples are stored as little endian PCM in
+    # the pcm16_buffer() pcm and as floats in out, so the FFT sees exactly
+    # what goes into the WAV file. Returns the PCM buffer to write.
+    if num_samples is None:
+        num_samples = len(out)
+    if _frombuffer is not None:
+        upper = _frombuffer(words, dtype=np.int16, count=2 * num_samples)
+        pcm16 = _frombuffer(pcm, dtype=np.int16, count=num_samples)
+        pcm16[:] = upper[1::2]
+        out[:num_samples] = pcm16
+        return memoryview(pcm)[:2 * num_samples]
+    if num_samples < len(words):
+        words = words[:num_samples]
+    out[:num_samples] = np.array(words, dtype=np.float)
+    # arithmetic shift right by 16, exact for the 24-bit microphone data
+    out[:num_samples] = vector.floor(out[:num_samples] / 65536)
+    # without frombuffer() the PCM bytes come from an int16 ndarray instead
+    return np.array(out[:num_samples], dtype=np.int16)
+
+
+def decode_16_channels(words, pcm, outs, num_samples=None):
+    # decode_16() for len(outs) interleaved channels: num_samples frames of
+    # an int32_buffer(num_samples * channels) become interleaved 16-bit PCM
+    # in pcm (the layout of a multi-channel WAV file) and the float samples
+    # of channel c in outs[c]. Returns the PCM buffer to write.
+    channels = len(outs)
+    if channels == 1:
+        return decode_16(words, pcm, outs[0], num_samples)
+    if num_samples is None:
+        num_samples = len(outs[0])
+    count = num_samples * channels
+    if _frombuffer is not None:
+        upper = _frombuffer(words, dtype=np.int16, count=2 * count)
+        pcm16 = _frombuffer(pcm, dtype=np.int16, count=count)
+        pcm16[:] = upper[1::2]
+        for c in range(channels):
+            outs[c][:num_samples] = pcm16[c::channels]
+        return memoryview(pcm)[:2 * count]
+    if count < len(words):
+        words = words[:count]
+    interleaved = vector.floor(np.array(words, dtype=np.float) / 65536)
+    for c in range(channels):
+        outs[c][:num_samples] = interleaved[c::channels]
+    return np.array(interleaved, dtype=np.int16)
+
+
+def decode_pcm16(pcm, out, num_samples, offset=0, channel=0, channels=1):
+    # Convert num_samples little endian 16-bit samples from the int16_buffer()
+    # pcm into out[offset:offset + num_samples].
+    count = num_samples * channels
+    if _frombuffer is not None:
+        out[offset:offset + num_samples] = _frombuffer(pcm, dtype=np.int16, count=count)[channel::channels]
+    else:
+        if count < len(pcm):
+            pcm = pcm[:count]
+        if channels == 1:
+            out[offset:offset + num_samples] = np.array(pcm, dtype=np.float)
+        else:
+            out[offset:offset + num_samples] = np.array(pcm, dtype=np.float)[channel::channels]
+    return out
+
+
+def decode_pcm24(raw, out, num_samples, offset=0, channel=0, channels=1):
+    # Convert num_samples little endian 24-bit samples (3 bytes each) from
+    # the bytes-like raw into out[offset:offset + num_samples], scaled by
+    # 1/256 to the range of 16-bit samples.
+    stop = offset + num_samples
+    count = 3 * num_samples * channels
+    first = 3 * channel
+    step = 3 * channels
+    if _frombuffer is not None:
+        low = _frombuffer(raw, dtype=np.uint8, count=count)
+        high = _frombuffer(raw, dtype=np.int8, count=count)
+        out[offset:stop] = high[first + 2::step]
+    else:
+        low = np.array(raw[:count], dtype=np.uint8)
+        # two's complement of the most significant byte
+        out[offset:stop] = low[first + 2::step]
+        out[offset:stop] = out[offset:stop] - vector.floor(out[offset:stop] / 128) * 256
+    out[offset:stop] = out[offset:stop] * 256 + low[first + 1::step]
+    out[offset:stop] = out[offset:stop] + low[first::step] * (1 / 256)
+    return out
+
+
+def decode_pcm32(words, out, num_samples, offset=0, channel=0, channels=1):
+    # 32-bit PCM from a WAV file, scaled by 1/65536 to the range of 16-bit
+    # samples (decode_32() keeps the full range of the I2S words).
+    decode_32(words, out, num_samples, offset, channel, channels)
+    out[offset:offset + num_samples] = out[offset:offset + num_samples] * (1 / 65536)
+    return out
@@ -0,0 +1,126 @@
+# Purpose:
+# - analyze several microphones on one I2S bus (stereo, RIGHT_LEFT) with one
+#   shared plan: same window, band table and frequency axis for all channels
+# - two channels cost one complex FFT instead of two real ones
+#
+# ulab has no batched or 2-D FFT, so the batch is made of pairs: channels
+# x and y of the same length L go into one complex FFT as z = x + j*y, and
+# because both are real their spectra are split off again with
+#   X[k] = (Z[k] + conj(Z[L-k])) / 2
+#   Y[k] = (Z[k] - conj(Z[L-k])) / 2j       k = 0 .. L//2
+# One fft.fft call and a handful of vector operations then serve two
+# channels, where separate plans need two FFTs with their own split and
+# magnitude each. With an odd number of channels the last one goes through
+# the shared spectrum.Plan and uses its buffers. Lengths that need
+# Bluestein's algorithm (see fft_any) are not paired: the complex FFT of
+# length L then needs a chirp FFT twice as long as the real FFT of L/2 does,
+# which costs more than the second transform saves.
+#
+# Usage:
+#   multi = multichannel.MultiPlan(Fs, L, 2, spectrum.HANN, ...)
+#   i2s_decode.decode_16_channels(words, pcm, multi.samples)
+#   P1s, results = multi.analyze()     # one entry per channel
+
+import ulab as np
+import fft_any
+import fft_real
+import profiling
+import spectrum
+
+
+class MultiPlan:
+    # The sample buffers samples[c] can be filled in place, P1s[c] and
+    # results[c] are reused for every frame like in spectrum.Plan.
+    def __init__(self, Fs, L, channels, window=spectrum.RECT, bin_size_in_hz=100, start_at_hz=0, number_of_bins=10):
+        if channels < 1:
+            raise ValueError('channels must be at least 1')
+        self.plan = spectrum.get_plan(Fs, L, window, bin_size_in_hz, start_at_hz, number_of_bins)
+        self.channels = channels
+        self.L = L
+        self.f = self.plan.f
+        self.bands = self.plan.bands
+        n = L // 2 + 1
+        pairs = channels // 2 if fft_any.radices(L) is not None else 0
+        self.pairs = pairs
+        # every channel but the last one has its own buffers, the last one
+        # works in the buffers of the shared plan
+        self.samples = [np.zeros(L) for c in range(channels - 1)] + [self.plan.samples]
+        self.P1s = [np.zeros(n) for c in range(channels - 1)] + [self.plan.P1]
+        self.results = [np.zeros(number_of_bins) for c in range(channels - 1)] + [self.plan.result]
+        if pairs:
+            self._x = np.zeros(L)
+            self._y = np.zeros(L)
+            # Z[L-k] read backwards, then the split spectra of x and y
+            self._xr = np.zeros(n)
+            self._xi = np.zeros(n)
+            self._yr = np.zeros(n)
+            self._yi = np.zeros(n)
+
+    def _windowed(self, samples, out):
+        window = self.plan.window
+        if window is None:
+            return samples
+        out[:] = samples
+        if fft_real.INPLACE:
+            out *= window
+        else:
+            out[:] = out * window
+        return out
+
+    def _pair(self, c):
+        # P1s[c] and P1s[c + 1] from one complex FFT
+        L = self.L
+        n = L // 2 + 1
+        x = self._windowed(self.samples[c], self._x)
+        y = self._windowed(self.samples[c + 1], self._y)
+        t = profiling.start()
+        Zr, Zi = fft_any.fft(x, y)
+        t = profiling.lap('fft', t)
+        a = Zr[:n]
+        b = Zi[:n]
+        xr = self._xr
+        xi = self._xi
+        yr = self._yr
+        yi = self._yi
+        # xr, xi = Z[L-k] with Z[L] = Z[0]
+        xr[0] = Zr[0]
+        xi[0] = Zi[0]
+        if n > 1:
+            xr[1:] = Zr[L - n + 1:][::-1]
+            xi[1:] = Zi[L - n + 1:][::-1]
+        # 2*Y = (b + Im Z[L-k]) + j*(Re Z[L-k] - a), 2*X = (a + Re Z[L-k]) + j*(b - Im Z[L-k])
+        if fft_real.INPLACE:
+            yr[:] = b
+            yr += xi
+            yi[:] = xr
+            yi -= a
+            xr += a
+            xi *= -1
+            xi += b
+        else:
+            yr[:] = b + xi
+            yi[:] = xr - a
+            xr[:] = xr + a
+            xi[:] = b - xi
+        # the factor 1/2 goes into the scale
+        scale = self.plan.scale / 2
+        spectrum.single_sided(xr, xi, L, scale, self.P1s[c])
+        spectrum.single_sided(yr, yi, L, scale, self.P1s[c + 1])
+        profiling.lap('magnitude', t)
+
+    def analyze(self, mode=spectrum.MEAN):
+        # (P1s, results) of the frame in samples, one entry per channel
+        bands = self.bands
+        last = self.channels - 1
+        for c in range(self.channels):
+            if c < 2 * self.pairs:
+                if c % 2 == 0:
+                    self._pair(c)
+            elif c < last:
+                self.P1s[c][:] = self.plan.magnitude(self.samples[c])
+            else:
+                self.plan.magnitude()
+            t = profiling.start()
+            bands.reduce(self.P1s[c], mode, self.results[c])
+            profiling.lap('bands', t)
+        return self.P1s, self.results
@@ -0,0 +1,113 @@
+# Purpose:
+# - the strongest spectral peaks of P1 with sub-bin frequency and amplitude
+# - finer frequencies than Fs/L without a longer capture, next to the bands
+#
+# The peaks are picked with numerical.argmax on a copy of P1: after every
+# pick the main lobe around it (1 bin for RECT, 2 for HANN and HAMMING) is
+# cleared, so the next argmax finds the next peak. Only bins that are a
+# local maximum of P1 count. The true frequency (k + d) * Fs / L, |d| <= 0.5,
+# is estimated from the bin k and its neighbours:
+# - RATIO: from a = P1[k+1] / P1[k] (or P1[k-1]), d = a / (1 + a) for RECT
+#   and d = (2a - 1) / (a + 1) for HANN. Exact for a single tone, only
+#   these two windows.
+# - PARABOLIC: vertex of the parabola through the log magnitudes of k - 1,
+#   k, k + 1. Any window, bias of a few percent of a bin.
+# The amplitude is P1[k] divided by the window's gain at offset d, so a
+# tone between two bins is not reported too small.
+
+import math
+import ulab as np
+from ulab import numerical
+import spectrum
+
+RATIO = 'ratio'
+PARABOLIC = 'parabolic'
+
+
+def gain(d, terms=None):
+    # magnitude at offset d (in bins) from a tone relative to the peak, for
+    # the window a0 - 2*a1*cos (spectrum.WINDOW_TERMS, None for RECT)
+    if abs(d) < 1e-6:
+        return 1.0
+    a0, a1 = terms if terms else (1.0, 0.0)
+    if abs(abs(d) - 1) < 1e-6:
+        # limit of the a1 term, the a0 term is sin(pi) = 0
+        return a1 / (2 * a0)
+    value = math.sin(math.pi * d) / math.pi * (a0 / d - 2 * a1 * d / (d * d - 1))
+    return abs(value) / a0
+
+
+class PeakFinder:
+    # Peaks of the P1 of one plan. frequencies and amplitudes are reused
+    # arrays of count entries, strongest first, 0 where fewer peaks exist.
+    def __init__(self, plan, count=3, method=None, threshold=0.0):
+        window = plan.key[2]
+        self.terms = spectrum.WINDOW_TERMS.get(window)
+        if method is None:
+            method = RATIO if window in (spectrum.RECT, spectrum.HANN) else PARABOLIC
+        if method == RATIO and window not in (spectrum.RECT, spectrum.HANN):
+            raise ValueError('ratio interpolation needs a RECT or HANN window')
+        self.method = method
+        self.hann = window == spectrum.HANN
+        self.df = plan.Fs / plan.L
+        self.n = plan.L // 2 + 1
+        self.guard = 2 if self.terms else 1
+        self.count = count
+        self.threshold = threshold
+        self.frequencies = np.zeros(count)
+        self.amplitudes = np.zeros(count)
+        self._scratch = np.zeros(self.n)
+
+    def offset(self, P1, k):
+        # sub-bin offset d of the peak at bin k
+        if k == 0 or k >= self.n - 1:
+            return 0.0
+        left = P1[k - 1]
+        center = P1[k]
+        right = P1[k + 1]
+        if self.method == PARABOLIC:
+            if left <= 0 or center <= 0 or right <= 0:
+                return 0.0
+            a = math.log(left)
+            b = math.log(center)
+            c = math.log(right)
+            denominator = a - 2 * b + c
+            if denominator >= 0:
+                return 0.0
+            return 0.5 * (a - c) / denominator
+        if center <= 0:
+            return 0.0
+        # towards the larger neighbour
+        sign = 1 if right >= left else -1
+        ratio = max(right, left) / center
+        if self.hann:
+            d = (2 * ratio - 1) / (ratio + 1)
+        else:
+            d = ratio / (1 + ratio)
+        return sign * min(max(d, 0.0), 0.5)
+
+    def find(self, P1):
+        # (frequencies, amplitudes) of the strongest peaks of P1
+        scratch = self._scratch
+        scratch[:] = P1
+        self.frequencies[:] = 0
+        self.amplitudes[:] = 0
+        n = self.n
+        guard = self.guard
+        found = 0
+        for _ in range(n):
+            if found == self.count:
+                break
+            k = int(numerical.argmax(scratch))
+            value = scratch[k]
+            if value <= self.threshold:
+                break
+            scratch[max(k - guard, 0):k + guard + 1] = 0
+            if (k and P1[k - 1] > value) or (k < n - 1 and P1[k + 1] > value):
+                # on the slope of a stronger peak
+                continue
+            d = self.offset(P1, k)
+            self.frequencies[found] = (k + d) * self.df
+            self.amplitudes[found] = value / gain(d, self.terms)
+            found += 1
+        return self.frequencies, self.amplitudes
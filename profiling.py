@@ -0,0 +1,89 @@
+# Purpose:
+# - per-stage timing of the analyzer loops (I2S wait, decode, window, fft,
+#   magnitude, bands, SD writes) to see which stage limits the frame rate
+# - the last RING_SIZE durations of every stage are kept in a fixed ring of
+#   microsecond counters, report() prints percentiles at the end of a run
+#
+# Disabled by default; then start() and lap() return right away without
+# reading the clock or touching the rings, so the hooks can stay in the hot
+# path. Stages are timed back to back with lap(), which returns the time the
+# next stage starts:
+#   profiling.enable()
+#   t = profiling.start()
+#   ... decode ...
+#   t = profiling.lap('decode', t)
+#   ... fft ...
+#   profiling.lap('fft', t)
+#   profiling.report()
+# Only call the hooks from one thread.
+
+from array import array
+import utime
+
+RING_SIZE = 256
+
+enabled = False
+_names = []
+_rings = {}
+_counts = {}
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+def reset():
+    for name in _names:
+        _counts[name] = 0
+
+
+def start():
+    if not enabled:
+        return 0
+    return utime.ticks_us()
+
+
+def lap(name, start_us):
+    # record the time since start_us for stage name, return the current time
+    if not enabled:
+        return 0
+    now = utime.ticks_us()
+    record(name, utime.ticks_diff(now, start_us))
+    return now
+
+
+def record(name, duration_us):
+    ring = _rings.get(name)
+    if ring is None:
+        ring = array('I', bytearray(4 * RING_SIZE))
+        _rings[name] = ring
+        _counts[name] = 0
+        _names.append(name)
+    n = _counts[name]
+    ring[n % RING_SIZE] = duration_us
+    _counts[name] = n + 1
+
+
+def stats(name):
+    # (count, mean, p50, p90, p99, max) in microseconds over the kept
+    # durations of stage name, count is the number of all recorded ones
+    count = _counts.get(name, 0)
+    kept = min(count, RING_SIZE)
+    if not kept:
+        return count, 0, 0, 0, 0, 0
+    values = sorted(_rings[name][:kept])
+    return (count, sum(values) // kept, values[kept * 50 // 100], values[kept * 90 // 100],
+            values[kept * 99 // 100], values[-1])
+
+
+def report():
+    if not _names:
+        return
+    print('stage            count    mean     p50     p90     p99     max  (us)')
+    total = 0
+    for name in _names:
+        count, mean, p50, p90, p99, high = stats(name)
+        total += mean
+        print('%-14s %7d %7d %7d %7d %7d %7d' % (name, count, mean, p50, p90, p99, high))
+    print('%-14s %7s %7d' % ('sum of means', '', total))
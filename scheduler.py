@@ -0,0 +1,312 @@
+# Purpose:
+# - pick frame length L, hop and method of the continuous monitor while it
+#   runs, so the bands are updated within a latency budget and the analysis
+#   takes at most a given share of the CPU
+# - back off to a cheaper configuration as soon as decoding, the analysis
+#   or whatever the caller does with the results (print, SD writes) slows
+#   down, go back up when there is room again
+#
+# The cost of every stage is measured online and kept as a moving average
+# (ALPHA) of microseconds per unit of work:
+# - input:    read + decode + shift of one DMA block, per block
+# - fft:      spectrum.Plan.analyze() of the last L samples, per
+#             goertzel.fft_cost(L), so other lengths follow fft_any's plan
+# - sliding:  sliding.SlidingDFT.add_block(), per band bin and sample
+# - consumer: the time between yielding a result and being asked for the
+#   next one, per update; this is where printing and logging show up
+# calibrate() times every stage once on zeros, so the first choice is
+# already based on this device.
+#
+# For every length (longest first, finer bins) and method the largest hop
+# (a multiple of block_samples, at most L) is taken that keeps
+#   hop / Fs + processing of one update <= latency_ms
+# and the configuration is usable if the predicted work per hop is at most
+# cpu_share of the hop's duration. The longest usable L wins, between the
+# methods the cheaper one. A new configuration other than the current one
+# must fit into HEADROOM of the share, so small changes in the measurements
+# do not flip between two of them. Without any usable one the length, method
+# and hop with the least work per second are taken, a long hop when the
+# printing or logging per update dominates. The current configuration is
+# kept while its own hop still fits the budget and the share, unless a
+# configuration of the same or a longer L fits into HEADROOM of the share.
+# An update counts as a miss when it exceeded the latency budget or the CPU
+# share; a miss re-plans at once, otherwise every REPLAN_EVERY updates.
+#
+# Usage:
+#   schedule = scheduler.Scheduler(Fs, (WINDOW, BINS, START_AT_HZ, NUMBER_OF_BINS),
+#                                  (4096, 2048, 1024), latency_ms=500, cpu_share=0.5)
+#   for result in schedule.monitor(audio_in):
+#       ...
+#   schedule.report()
+
+import utime
+import ulab as np
+import goertzel
+import i2s_decode
+import profiling
+import sliding
+import spectrum
+
+FFT = 'fft'
+SLIDING = 'sliding'
+
+ALPHA = 0.25
+HEADROOM = 0.8
+REPLAN_EVERY = 8
+# the sliding DFT keeps 2 * bins * block_samples floats of tables
+SLIDING_MAX_BINS = 64
+
+
+class Scheduler:
+    def __init__(self, Fs, layout, lengths, latency_ms, cpu_share=0.5, block_samples=256, methods=(FFT, SLIDING)):
+        # layout: (window, bin size in Hz, start at Hz, number of bins)
+        B = block_samples
+        self.Fs = Fs
+        self.layout = layout
+        self.block_samples = B
+        self.lengths = sorted([L for L in lengths if L % B == 0], reverse=True)
+        if not self.lengths:
+            raise ValueError('no frame length is a multiple of block_samples')
+        self.latency_ms = latency_ms
+        self.cpu_share = cpu_share
+        self.methods = [m for m in methods if m in (FFT, SLIDING)]
+        if not self.methods:
+            raise ValueError('unknown methods')
+        self.costs = {}
+        self.config = None
+        self.updates = 0
+        self.misses = 0
+        self.switches = 0
+        self.used = {}
+        # every length gets its own plan and band bin count, built once;
+        # spectrum.get_plan() keeps fewer plans than there may be lengths
+        self._plans = {}
+        self._band_bins = {}
+        self._sdfts = {}
+        self._history = np.zeros(self.lengths[0])
+        self._block = i2s_decode.float_buffer(B)
+        self.calibrate()
+        self.replan()
+
+    def plan(self, L):
+        plan = self._plans.get(L)
+        if plan is None:
+            plan = spectrum.Plan(self.Fs, L, *self.layout)
+            self._plans[L] = plan
+        return plan
+
+    def _bins(self, L):
+        # band bins the sliding DFT keeps for frame length L
+        bins = self._band_bins.get(L)
+        if bins is None:
+            # from the band table alone, the plan is only built when L is used
+            bands = spectrum.BandTable(self.Fs, L, *self.layout[1:])
+            bins = bands.edges[bands.count] - bands.edges[0]
+            bins += 2 if self.layout[0] in spectrum.WINDOW_TERMS else 0
+            self._band_bins[L] = bins
+        return bins
+
+    def _sdft(self, L):
+        sdft = self._sdfts.get(L)
+        if sdft is None:
+            sdft = sliding.SlidingDFT(self.plan(L), self.block_samples)
+            self._sdfts[L] = sdft
+        return sdft
+
+    def measure(self, stage, us, units=1):
+        # moving average of the microseconds per unit of stage
+        value = us / max(units, 1)
+        old = self.costs.get(stage)
+        self.costs[stage] = value if old is None else old + ALPHA * (value - old)
+
+    def calibrate(self):
+        # one run of every stage on zeros
+        B = self.block_samples
+        L = self.lengths[-1]
+        words = i2s_decode.int32_buffer(B)
+        start = utime.ticks_us()
+        i2s_decode.decode_32(words, self._block, B)
+        self.measure('input', utime.ticks_diff(utime.ticks_us(), start))
+        plan = self.plan(L)
+        start = utime.ticks_us()
+        plan.analyze(np.zeros(L))
+        self.measure(FFT, utime.ticks_diff(utime.ticks_us(), start), goertzel.fft_cost(L))
+        if SLIDING in self.methods and self._bins(L) <= SLIDING_MAX_BINS:
+            sdft = self._sdft(L)
+            start = utime.ticks_us()
+            sdft.add_block(self._block)
+            self.measure(SLIDING, utime.ticks_diff(utime.ticks_us(), start), self._bins(L) * B)
+            sdft.reset()
+        self.costs['consumer'] = 0
+
+    def predict(self, L, method, hop):
+        # (microseconds of work per hop, microseconds after the last block
+        # until the result is handed out) of a configuration
+        B = self.block_samples
+        costs = self.costs
+        blocks = hop // B
+        if method == FFT:
+            update = costs[FFT] * goertzel.fft_cost(L)
+            work = blocks * costs['input'] + update
+        else:
+            per_block = costs[SLIDING] * self._bins(L) * B
+            update = per_block
+            work = blocks * (costs['input'] + per_block)
+        update += costs['consumer']
+        return work + costs['consumer'], update
+
+    def _usable(self, L, method, share):
+        # the configuration (L, method, hop) with the largest usable hop and
+        # its CPU share, or None
+        B = self.block_samples
+        if method == SLIDING and (SLIDING not in self.costs or self._bins(L) > SLIDING_MAX_BINS):
+            return None
+        work, update = self.predict(L, method, B)
+        hop = int((self.latency_ms * 1000 - update) * self.Fs / 1000000) // B * B
+        hop = min(hop, L)
+        if hop < B:
+            return None
+        work, update = self.predict(L, method, hop)
+        used = work * self.Fs / (hop * 1000000)
+        if used > share:
+            return None
+        return (L, method, hop), used
+
+    def _fits(self, config, share):
+        # True if config, with its own hop, keeps the latency budget and share
+        L, method, hop = config
+        if method == SLIDING and (SLIDING not in self.costs or self._bins(L) > SLIDING_MAX_BINS):
+            return False
+        work, update = self.predict(L, method, hop)
+        latency_ms = hop * 1000 / self.Fs + update / 1000
+        return latency_ms <= self.latency_ms and work * self.Fs / (hop * 1000000) <= share
+
+    def choose(self, share):
+        # longest L with a usable configuration, the cheaper method
+        for L in self.lengths:
+            best = None
+            for method in self.methods:
+                usable = self._usable(L, method, share)
+                if usable and (best is None or usable[1] < best[1]):
+                    best = usable
+            if best:
+                return best[0]
+        return None
+
+    def cheapest(self):
+        # the configuration with the least work per second, when none fits;
+        # when the work per update dominates that is a long hop
+        B = self.block_samples
+        best = None
+        for L in self.lengths:
+            for method in self.methods:
+                if method == SLIDING and (SLIDING not in self.costs or self._bins(L) > SLIDING_MAX_BINS):
+                    continue
+                for hop in range(B, L + 1, B):
+                    work, update = self.predict(L, method, hop)
+                    per_sample = work / hop
+                    if best is None or per_sample < best[1]:
+                        best = ((L, method, hop), per_sample)
+        return best[0]
+
+    def replan(self):
+        # True if the configuration changed
+        current = self.config
+        if current is not None and self._fits(current, self.cpu_share):
+            best = self.choose(self.cpu_share * HEADROOM)
+            if best is None or best[0] < current[0]:
+                return False
+        else:
+            best = self.choose(self.cpu_share * HEADROOM) or self.choose(self.cpu_share) or self.cheapest()
+        if best == current:
+            return False
+        if current is not None:
+            self.switches += 1
+        self.config = best
+        return True
+
+    def _start(self, filled):
+        # prepare the method of the new configuration from the kept samples
+        L, method, hop = self.config
+        if method == SLIDING:
+            sdft = self._sdft(L)
+            sdft.reset()
+            B = self.block_samples
+            history = self._history
+            size = len(history)
+            for start in range(size - min(filled, L) // B * B, size, B):
+                sdft.add_block(history[start:start + B])
+
+    def monitor(self, audio_in, mode=spectrum.MEAN, words=None):
+        # Yield the band result of the last L samples every hop samples,
+        # forever. L, hop and method follow self.config.
+        B = self.block_samples
+        if words is None:
+            words = i2s_decode.int32_buffer(B)
+        words_mv = memoryview(words)
+        history = self._history
+        size = len(history)
+        block = self._block
+        filled = 0
+        since = 0
+        busy = 0
+        self._start(filled)
+        while True:
+            got = 0
+            t = profiling.start()
+            while got < B:
+                num_bytes = audio_in.readinto(words_mv[got:B])
+                got += num_bytes // i2s_decode.SAMPLE_SIZE_IN_BYTES
+            profiling.lap('readinto', t)
+            L, method, hop = self.config
+            start = utime.ticks_us()
+            i2s_decode.decode_32(words, block, B)
+            # the last samples of the longest frame, newest at the end
+            history[:size - B] = history[B:]
+            history[size - B:] = block
+            filled += B
+            now = utime.ticks_us()
+            self.measure('input', utime.ticks_diff(now, start))
+            busy += utime.ticks_diff(now, start)
+            if method == SLIDING:
+                self._sdft(L).add_block(block)
+                done = utime.ticks_us()
+                self.measure(SLIDING, utime.ticks_diff(done, now), self._bins(L) * B)
+                busy += utime.ticks_diff(done, now)
+            since += B
+            if filled < L or since < hop:
+                continue
+            # an update
+            now = utime.ticks_us()
+            if method == SLIDING:
+                result = self._sdft(L).bands(mode)
+            else:
+                result = self.plan(L).analyze(history[size - L:], mode)[1]
+                self.measure(FFT, utime.ticks_diff(utime.ticks_us(), now), goertzel.fft_cost(L))
+            done = utime.ticks_us()
+            busy += utime.ticks_diff(done, now)
+            self.updates += 1
+            self.used[self.config] = self.used.get(self.config, 0) + 1
+            # from the last block read until the result, plus the hop it waited for
+            latency_ms = utime.ticks_diff(done, start) / 1000 + hop * 1000 / self.Fs
+            missed = latency_ms > self.latency_ms or busy > self.cpu_share * hop * 1000000 / self.Fs
+            if missed:
+                self.misses += 1
+            yield result
+            # time the caller spent with the result
+            resumed = utime.ticks_us()
+            self.measure('consumer', utime.ticks_diff(resumed, done))
+            since = 0
+            busy = utime.ticks_diff(resumed, done)
+            if missed or self.updates % REPLAN_EVERY == 0:
+                if self.replan():
+                    self._start(filled)
+
+    def report(self):
+        L, method, hop = self.config
+        print('configuration: \t L', L, '\t hop', hop, '\t', method, '\t (%.3g Hz bins, update every %d ms)'
+              % (self.Fs / L, hop * 1000 // self.Fs))
+        print('updates: \t', self.updates, '\t misses:', self.misses, '\t switches:', self.switches)
+        for config in self.used:
+            print('  L %5d  hop %5d  %-8s %d updates' % (config[0], config[2], config[1], self.used[config]))
+        print('stage costs: \t', ', '.join('%s %.3g us' % (name, self.costs[name]) for name in self.costs))
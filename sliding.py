@@ -0,0 +1,180 @@
+# Purpose:
+# - continuous monitoring: new band values every hop samples (a few DMA
+#   blocks, ~100 ms) instead of once per L sample capture
+# - the bands always describe the last L samples, like a full frame would
+#
+# Two ways to get there, monitor() picks the cheaper one:
+# - SlidingDFT: only the DFT bins of the bands are kept up to date. Every
+#   DMA block of B samples adds its block DFT (one linalg.dot with K x B
+#   cos/sin tables, as in goertzel.py) and removes the contribution of the
+#   block that just left the frame. The contributions of the L/B blocks in
+#   the frame are stored, so nothing drifts: the running sum is rebuilt
+#   from them once per L samples. Hann and Hamming are applied in the
+#   frequency domain from the neighbouring bins, so the window moves with
+#   the frame. Costs 2*K*B multiply-adds per block, needs L % B == 0.
+# - otherwise a hop sized STFT over the I2S stream (stft.frames): the last
+#   L samples are kept and a full FFT runs every hop samples.
+
+import math
+import ulab as np
+from ulab import vector
+from ulab import linalg
+import goertzel
+import i2s_decode
+import spectrum
+import stft
+
+
+def use_sliding(plan, hop, block_samples=256):
+    # True if SlidingDFT works for plan and costs less than an FFT per hop
+    if plan.L % block_samples or hop % block_samples:
+        return False
+    lo, hi = goertzel.band_bins(plan)
+    K = hi - lo + (2 if plan.key[2] in spectrum.WINDOW_TERMS else 0)
+    sliding = 2 * K * hop
+    fft = goertzel.fft_cost(plan.L)
+    return sliding < fft
+
+
+class SlidingDFT:
+    def __init__(self, plan, block_samples=256):
+        L = plan.L
+        B = block_samples
+        if L % B:
+            raise ValueError('L must be a multiple of block_samples')
+        self.plan = plan
+        self.L = L
+        self.block_samples = B
+        self.lo, self.hi = goertzel.band_bins(plan)
+        self.terms = spectrum.WINDOW_TERMS.get(plan.key[2])
+        if plan.key[2] != spectrum.RECT and self.terms is None:
+            raise ValueError('unknown window')
+        # with a window the neighbours lo - 1 and hi are needed as well
+        first = self.lo - 1 if self.terms else self.lo
+        last = self.hi + 1 if self.terms else self.hi
+        bins = range(first, last)
+        K = last - first
+        self.K = K
+        self.slots = L // B
+        self.cos = np.array([[math.cos(2 * math.pi * k * n / L) for n in range(B)] for k in bins])
+        self.sin = np.array([[math.sin(2 * math.pi * k * n / L) for n in range(B)] for k in bins])
+        # exp(-2j*pi*k*start/L) for the start of every block slot of the frame
+        self.slot_c = [np.array([math.cos(2 * math.pi * k * j * B / L) for k in bins]) for j in range(self.slots)]
+        self.slot_s = [np.array([math.sin(2 * math.pi * k * j * B / L) for k in bins]) for j in range(self.slots)]
+        self.store_re = [np.zeros(K) for j in range(self.slots)]
+        self.store_im = [np.zeros(K) for j in range(self.slots)]
+        self.acc_re = np.zeros(K)
+        self.acc_im = np.zeros(K)
+        self._block = np.zeros(B)
+        self._decoded = i2s_decode.float_buffer(B)
+        self.P1 = np.zeros(L // 2 + 1)
+        self.slot = 0
+        self.position = 0
+
+    def reset(self):
+        for j in range(self.slots):
+            self.store_re[j][:] = 0
+            self.store_im[j][:] = 0
+        self.acc_re[:] = 0
+        self.acc_im[:] = 0
+        self.slot = 0
+        self.position = 0
+
+    def ready(self):
+        # the first L samples have arrived
+        return self.position >= self.L
+
+    def add_block(self, block):
+        # block: block_samples float samples, replaces the oldest block
+        re = linalg.dot(self.cos, block)
+        im = linalg.dot(self.sin, block) * -1
+        j = self.slot
+        c = self.slot_c[j]
+        s = self.slot_s[j]
+        new_re = re * c + im * s
+        new_im = im * c - re * s
+        self.acc_re[:] = self.acc_re + (new_re - self.store_re[j])
+        self.acc_im[:] = self.acc_im + (new_im - self.store_im[j])
+        self.store_re[j][:] = new_re
+        self.store_im[j][:] = new_im
+        self.slot = (j + 1) % self.slots
+        self.position += self.block_samples
+        if not self.slot:
+            # rebuild the running sum from the stored blocks, rounding
+            # errors of the additions do not pile up
+            self.acc_re[:] = 0
+            self.acc_im[:] = 0
+            for j in range(self.slots):
+                self.acc_re[:] = self.acc_re + self.store_re[j]
+                self.acc_im[:] = self.acc_im + self.store_im[j]
+
+    def magnitude(self):
+        # P1 of the last L samples with the band bins filled in
+        re = self.acc_re
+        im = self.acc_im
+        if self.terms:
+            a0, a1 = self.terms
+            # frame starts at the slot that is overwritten next
+            phi = 2 * math.pi * self.slot * self.block_samples / self.L
+            c = math.cos(phi)
+            s = math.sin(phi)
+            # a0*A[k] - a1*(exp(-j*phi)*A[k-1] + exp(j*phi)*A[k+1])
+            lower_re = re[:-2]
+            lower_im = im[:-2]
+            upper_re = re[2:]
+            upper_im = im[2:]
+            re, im = (re[1:-1] * a0 - (lower_re * c + lower_im * s + upper_re * c - upper_im * s) * a1,
+                      im[1:-1] * a0 - (lower_im * c - lower_re * s + upper_im * c + upper_re * s) * a1)
+        lo = self.lo
+        hi = self.hi
+        P1 = self.P1
+        if hi > lo:
+            P1[lo:hi] = vector.sqrt(re * re + im * im) * self.plan.scale
+            if lo == 0:
+                P1[0] = P1[0] / 2
+            n = self.L // 2 + 1
+            if hi == n and self.L % 2 == 0:
+                P1[n - 1] = P1[n - 1] / 2
+        return P1
+
+    def bands(self, mode=spectrum.MEAN):
+        return self.plan.bands.reduce(self.magnitude(), mode, self.plan.result)
+
+    def blocks(self, audio_in, words=None):
+        # Read DMA blocks from I2S forever and add each one, yields after
+        # every block. words: an int32_buffer(block_samples) to read into.
+        B = self.block_samples
+        if words is None:
+            words = i2s_decode.int32_buffer(B)
+        words_mv = memoryview(words)
+        while True:
+            got = 0
+            while got < B:
+                num_bytes = audio_in.readinto(words_mv[got:B])
+                got += num_bytes // i2s_decode.SAMPLE_SIZE_IN_BYTES
+            i2s_decode.decode_32(words, self._block)
+            self.add_block(self._block)
+            yield
+
+
+def monitor(audio_in, plan, hop, mode=spectrum.MEAN, block_samples=256, sliding=None):
+    # Yield the band result of the last plan.L samples every hop samples,
+    # starting when the first L samples are in. sliding=None picks the
+    # cheaper method, True/False forces SlidingDFT or the STFT.
+    if sliding is None:
+        sliding = use_sliding(plan, hop, block_samples)
+    if not sliding:
+        for samples in stft.frames(audio_in, plan.L, hop, plan.samples, sample_bytes=i2s_decode.SAMPLE_SIZE_IN_BYTES):
+            yield plan.analyze(samples, mode)[1]
+        return
+    if hop % block_samples:
+        raise ValueError('hop must be a multiple of block_samples')
+    sdft = SlidingDFT(plan, block_samples)
+    blocks_per_hop = hop // block_samples
+    count = 0
+    for _ in sdft.blocks(audio_in):
+        if not sdft.ready():
+            continue
+        if count % blocks_per_hop == 0:
+            yield sdft.bands(mode)
+        count += 1
@@ -0,0 +1,225 @@
+# Purpose:
+# - shared spectrum engine for the fft_* scripts
+# - turn one frame of samples into the single-sided amplitude spectrum P1
+# - collapse P1 into NUMBER_OF_BINS equal-width bands in one vectorized pass
+#
+# P1 has L//2+1 entries, P1[0] is DC and P1[k] belongs to the frequency k*Fs/L.
+# Band x covers the FFT bins [edges[x], edges[x+1]), so no bin is dropped
+# between two neighbouring bands.
+#
+# A Plan bundles everything that only depends on the configuration
+# (L, Fs, window, band layout): frequency axis, window coefficients, band
+# table, FFT tables and sample/result buffers. get_plan() keeps the last
+# PLAN_CACHE_SIZE plans, so switching between a couple of configurations
+# does not rebuild them.
+#
+# Plan.analyze() runs in the plan's own buffers: window, real FFT split,
+# squares, scale and sqrt are in-place operations on preallocated arrays
+# (fft_real.INPLACE), so a frame leaves no L-sized garbage behind except
+# what the FFT itself allocates: the two arrays fft.fft returns for a power
+# of 2 L/2, and for other lengths whatever the fft_any plan cannot keep
+# (see README). bench_alloc.py checks that.
+
+import math
+import ulab as np
+from ulab import vector
+from ulab import numerical
+import fft_real
+import profiling
+
+# band reduction modes
+MEAN = 0
+MAX = 1
+
+# windows
+RECT = 'rect'
+HANN = 'hann'
+HAMMING = 'hamming'
+# w[m] = a0 - 2*a1*cos(2*pi*m/L), so in the frequency domain
+# X_w[k] = a0*X[k] - a1*(X[k-1] + X[k+1])
+WINDOW_TERMS = {HANN: (0.5, 0.25), HAMMING: (0.54, 0.23)}
+
+PLAN_CACHE_SIZE = 3
+
+
+def frequency_axis(Fs, L):
+    # same values as Fs*np.array(range(0,(L//2)+1))/L, without the Python list;
+    # for an odd L the last bin is below Fs/2
+    return np.linspace(0, (L // 2) * Fs / L, num=L // 2 + 1)
+
+
+class BandTable:
+    # Precomputed band edge indices for NUMBER_OF_BINS bands of bin_size_in_hz
+    # starting at start_at_hz. Only depends on (Fs, L, layout), so build it
+    # once and reuse it for every frame.
+    def __init__(self, Fs, L, bin_size_in_hz, start_at_hz, number_of_bins):
+        df = Fs / L
+        n = L // 2 + 1
+        width = int(bin_size_in_hz / df)
+        if width < 1:
+            width = 1
+        start = int(start_at_hz / df)
+
+        self.n = n
+        self.width = width
+        self.start = start
+        self.count = number_of_bins
+        self.edges = [min(start + width * x, n) for x in range(number_of_bins + 1)]
+
+        # bands lying completely inside P1 are reduced together as one matrix
+        if start < n:
+            self.full = min(number_of_bins, (n - start) // width)
+        else:
+            self.full = 0
+        # at most one band is cut off by the Nyquist bin
+        self.partial = self.full < number_of_bins and self.edges[self.full] < n
+
+    def reduce(self, P1, mode=MEAN, out=None, first_bin=0):
+        # P1[0] is FFT bin first_bin, e.g. when only the band bins are kept
+        if out is None:
+            out = np.zeros(self.count)
+        else:
+            out[:] = 0
+        full = self.full
+        if full:
+            start = self.start - first_bin
+            stop = start + self.width * full
+            block = P1[start:stop].reshape((full, self.width))
+            if mode == MAX:
+                out[:full] = numerical.max(block, axis=1)
+            else:
+                out[:full] = numerical.mean(block, axis=1)
+        if self.partial:
+            rang = P1[self.edges[full] - first_bin:self.n - first_bin]
+            if mode == MAX:
+                out[full] = numerical.max(rang)
+            else:
+                out[full] = numerical.mean(rang)
+        return out
+
+
+def window_coefficients(window, L):
+    # periodic window of length L, None for RECT
+    if window == RECT or window is None:
+        return None
+    if window not in WINDOW_TERMS:
+        raise ValueError('unknown window')
+    a0, a1 = WINDOW_TERMS[window]
+    phase = np.linspace(0, 2 * math.pi * (L - 1) / L, num=L)
+    return a0 - 2 * a1 * vector.cos(phase)
+
+
+def single_sided(real, imaginary, L, scale=None, out=None, power=False):
+    # only the non-redundant half of the spectrum is squared and rooted;
+    # scale defaults to 2/L, windowed frames pass 2/sum(window).
+    # out: array of L//2+1 floats the result is written to in place, real
+    # and imaginary are overwritten then. power=True leaves out the sqrt
+    # and returns P1^2.
+    n = L // 2 + 1
+    if len(real) > n:
+        real = real[:n]
+        imaginary = imaginary[:n]
+    if scale is None:
+        scale = 2 / L
+    if out is None or not fft_real.INPLACE:
+        P1 = real * real + imaginary * imaginary
+        P1 = P1 * (scale * scale) if power else vector.sqrt(P1) * scale
+        if out is not None:
+            out[:] = P1
+            P1 = out
+    else:
+        real *= real
+        imaginary *= imaginary
+        real += imaginary
+        real *= scale * scale
+        if not power:
+            real **= 0.5
+        out[:] = real
+        P1 = out
+    edge = 4 if power else 2
+    P1[0] = P1[0] / edge
+    # only an even L has a Nyquist bin without a mirrored twin
+    if L % 2 == 0:
+        P1[n - 1] = P1[n - 1] / edge
+    return P1
+
+
+def magnitude(samples, L):
+    # real input, so only the L//2+1 non-redundant bins are transformed;
+    # L can be any length (see fft_any)
+    real, imaginary = fft_real.rfft(samples)
+    return single_sided(real, imaginary, L)
+
+
+def analyze(samples, L, bands, mode=MEAN):
+    P1 = magnitude(samples, L)
+    return P1, bands.reduce(P1, mode)
+
+
+class Plan:
+    # Everything needed to analyze frames of one configuration. The sample
+    # buffer samples can be filled in place (e.g. by i2s_decode) and is the
+    # default input of analyze(). The returned P1 and band result are reused
+    # arrays as well, copy them if they have to outlive the next frame.
+    def __init__(self, Fs, L, window=RECT, bin_size_in_hz=100, start_at_hz=0, number_of_bins=10):
+        self.key = (Fs, L, window, bin_size_in_hz, start_at_hz, number_of_bins)
+        self.Fs = Fs
+        self.L = L
+        self.f = frequency_axis(Fs, L)
+        self.window = window_coefficients(window, L)
+        if self.window is None:
+            self.scale = 2 / L
+            self._windowed = None
+        else:
+            self.scale = 2 / numerical.sum(self.window)
+            self._windowed = np.zeros(L)
+        self.bands = BandTable(Fs, L, bin_size_in_hz, start_at_hz, number_of_bins)
+        self.twiddle = fft_real.twiddle(L, True)
+        self.samples = np.zeros(L)
+        self.P1 = np.zeros(L // 2 + 1)
+        self.result = np.zeros(number_of_bins)
+
+    def magnitude(self, samples=None, power=False):
+        # P1 of samples (plan.samples if None) in self.P1, P1^2 with power
+        if samples is None:
+            samples = self.samples
+        t = profiling.start()
+        if self.window is not None:
+            windowed = self._windowed
+            windowed[:] = samples
+            if fft_real.INPLACE:
+                windowed *= self.window
+            else:
+                windowed[:] = windowed * self.window
+            samples = windowed
+            t = profiling.lap('window', t)
+        real, imaginary = fft_real.rfft(samples, self.twiddle)
+        t = profiling.lap('fft', t)
+        P1 = single_sided(real, imaginary, self.L, self.scale, self.P1, power)
+        profiling.lap('magnitude', t)
+        return P1
+
+    def analyze(self, samples=None, mode=MEAN):
+        P1 = self.magnitude(samples)
+        t = profiling.start()
+        result = self.bands.reduce(P1, mode, self.result)
+        profiling.lap('bands', t)
+        return P1, result
+
+
+_plans = []
+
+
+def get_plan(Fs, L, window=RECT, bin_size_in_hz=100, start_at_hz=0, number_of_bins=10):
+    # least recently used plans are dropped first
+    key = (Fs, L, window, bin_size_in_hz, start_at_hz, number_of_bins)
+    for i in range(len(_plans)):
+        if _plans[i].key == key:
+            plan = _plans.pop(i)
+            _plans.append(plan)
+            return plan
+    plan = Plan(Fs, L, window, bin_size_in_hz, start_at_hz, number_of_bins)
+    _plans.append(plan)
+    if len(_plans) > PLAN_CACHE_SIZE:
+        _plans.pop(0)
+    return plan
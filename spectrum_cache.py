@@ -0,0 +1,230 @@
+# Purpose:
+# - keep the P1 of every frame of an analyzed recording on the SD card, so
+#   a second run with other band settings (BINS, START_AT_HZ,
+#   NUMBER_OF_BINS) only reads the spectra back and reduces them again
+# - no WAV decode, window or FFT on a cache hit
+#
+# Entries are content addressed: the name holds the SHA-256 of the WAV file
+# (the first 16 hex digits), L, window, hop and channel, everything P1
+# depends on, while the band layout is not part of it. A renamed or copied
+# recording hits the same entry, a changed one never hits a stale one.
+# Entry file (little endian): header HEADER_FORMAT (magic, version,
+# channel, Fs, L, hop), then L//2+1 float32 values per frame, so frame i is
+# at a fixed offset and the number of frames follows from the file size.
+# Entries are written to a .tmp file and renamed when all frames are in,
+# an interrupted run leaves no half entry behind.
+#
+# The index file lists the entries, least recently used first. A hit
+# moves its entry to the end; after a new entry the oldest ones are
+# deleted until all entries together fit into max_bytes (the newest one is
+# always kept). File times are not used, the RTC may not be set.
+#
+# Usage:
+#   cache = spectrum_cache.SpectrumCache('/sd/cache')
+#   digest = spectrum_cache.file_hash(wav_file)
+#   for frame, P1, result in spectrum_cache.band_frames(wav, plan, HOP_LENGTH, cache, digest):
+#       ...
+
+import os
+import struct
+from array import array
+import ulab as np
+import spectrum
+import stft
+
+try:
+    import uhashlib as hashlib
+except ImportError:
+    import hashlib
+
+try:
+    import ubinascii as binascii
+except ImportError:
+    import binascii
+
+MAGIC = b'P1CH'
+VERSION = 1
+HEADER_FORMAT = '<4sHHIII'
+INDEX = 'index.txt'
+MAX_BYTES = 16 * 1024 * 1024
+
+_frombuffer = getattr(np, 'frombuffer', None)
+
+
+def file_hash(path, chunk_size=4096):
+    # SHA-256 of the file as hex string
+    h = hashlib.sha256()
+    chunk = bytearray(chunk_size)
+    mv = memoryview(chunk)
+    with open(path, 'rb') as f:
+        while True:
+            n = f.readinto(chunk)
+            if not n:
+                break
+            h.update(mv[:n])
+    return binascii.hexlify(h.digest()).decode()
+
+
+def _size(path):
+    try:
+        return os.stat(path)[6]
+    except OSError:
+        return 0
+
+
+class Reader:
+    # the frames of one entry, opened by SpectrumCache.open()
+    def __init__(self, f, n, frames):
+        self._f = f
+        self.n = n
+        self.frames = frames
+        self._buffer = bytearray(4 * n)
+
+    def spectra(self, P1):
+        # Yield (frame index, P1) for every frame, P1 is filled in place
+        buffer = self._buffer
+        for index in range(self.frames):
+            if self._f.readinto(buffer) != len(buffer):
+                return
+            if _frombuffer is not None:
+                P1[:] = _frombuffer(buffer, dtype=np.float)
+            else:
+                P1[:] = np.array(array('f', buffer))
+            yield index, P1
+
+    def close(self):
+        self._f.close()
+
+
+class Writer:
+    # a new entry, created by SpectrumCache.create()
+    def __init__(self, cache, name, header):
+        self.cache = cache
+        self.name = name
+        self._tmp = cache.path(name) + '.tmp'
+        self._f = open(self._tmp, 'wb')
+        self._f.write(header)
+
+    def add(self, P1):
+        self._f.write(array('f', P1))
+
+    def close(self, complete=True):
+        # complete: keep the entry, otherwise throw it away
+        self._f.close()
+        if not complete:
+            os.remove(self._tmp)
+            return
+        path = self.cache.path(self.name)
+        if _size(path):
+            os.remove(path)
+        os.rename(self._tmp, path)
+        self.cache.added(self.name)
+
+
+class SpectrumCache:
+    def __init__(self, cache_dir, max_bytes=MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        try:
+            os.stat(cache_dir)
+        except OSError:
+            os.mkdir(cache_dir)
+        self.hits = 0
+        self.misses = 0
+        self._entries = []
+        try:
+            with open(self.path(INDEX)) as f:
+                for line in f:
+                    name = line.strip()
+                    # entries deleted by hand are forgotten
+                    if name and name not in self._entries and _size(self.path(name)):
+                        self._entries.append(name)
+        except OSError:
+            pass
+
+    def path(self, name):
+        return self.cache_dir + '/' + name
+
+    def _write_index(self):
+        with open(self.path(INDEX), 'w') as f:
+            for name in self._entries:
+                f.write(name + '\n')
+
+    def key(self, digest, plan, hop, channel=0):
+        # entry name of the spectra of the file with this hash
+        return '%s_%d_%s_%d_%d.p1' % (digest[:16], plan.L, plan.key[2], hop, channel)
+
+    def header(self, plan, hop, channel=0):
+        return struct.pack(HEADER_FORMAT, MAGIC, VERSION, channel, int(plan.Fs), plan.L, hop)
+
+    def open(self, name, plan, hop, channel=0):
+        # Reader of the entry name, None if it is missing or does not match
+        path = self.path(name)
+        size = _size(path)
+        header = self.header(plan, hop, channel)
+        n = plan.L // 2 + 1
+        if name not in self._entries or size < len(header) or (size - len(header)) % (4 * n):
+            self.misses += 1
+            return None
+        f = open(path, 'rb')
+        if f.read(len(header)) != header:
+            f.close()
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.remove(name)
+        self._entries.append(name)
+        self._write_index()
+        return Reader(f, n, (size - len(header)) // (4 * n))
+
+    def create(self, name, plan, hop, channel=0):
+        return Writer(self, name, self.header(plan, hop, channel))
+
+    def added(self, name):
+        # name was written: newest entry, drop the oldest ones over max_bytes
+        if name in self._entries:
+            self._entries.remove(name)
+        self._entries.append(name)
+        total = 0
+        for entry in self._entries:
+            total += _size(self.path(entry))
+        while total > self.max_bytes and len(self._entries) > 1:
+            oldest = self._entries.pop(0)
+            total -= _size(self.path(oldest))
+            try:
+                os.remove(self.path(oldest))
+            except OSError:
+                pass
+        self._write_index()
+
+
+def spectra(wav, plan, hop, cache, digest):
+    # Yield (frame index, P1) for every frame of the wav_reader.WavReader wav,
+    # read from the cache or analyzed and stored. P1 is plan.P1.
+    name = cache.key(digest, plan, hop, wav.channel)
+    reader = cache.open(name, plan, hop, wav.channel)
+    if reader is not None:
+        try:
+            yield from reader.spectra(plan.P1)
+        finally:
+            reader.close()
+        return
+    writer = cache.create(name, plan, hop, wav.channel)
+    complete = False
+    try:
+        index = 0
+        for samples in stft.frames(wav, plan.L, hop, plan.samples):
+            P1 = plan.magnitude(samples)
+            writer.add(P1)
+            yield index, P1
+            index += 1
+        complete = True
+    finally:
+        # stopped early: the entry would lack frames
+        writer.close(complete)
+
+
+def band_frames(wav, plan, hop, cache, digest, mode=spectrum.MEAN):
+    # like stft.band_frames(), with the spectra from the cache when possible
+    for index, P1 in spectra(wav, plan, hop, cache, digest):
+        yield index, P1, plan.bands.reduce(P1, mode, plan.result)
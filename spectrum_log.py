@@ -0,0 +1,216 @@
+# Purpose:
+# - log band results to the SD card as compact binary records instead of
+#   printing them or writing text
+# - a few bytes per frame, written in whole SD blocks
+#
+# File layout (all little endian):
+#   header, HEADER_SIZE bytes: magic, version, Fs, L, start time, band layout
+#     (bin size, start Hz, count, first FFT bin and bins per band), value type,
+#     band mode, uint16 scale, index interval and window name
+#   blocks of index_interval records, each starting with a block header
+#     b'SBLK', number of its first record, time_ms of its first record
+#   record: time_ms (uint32, ms since the start time) and one value per band,
+#     float32 or uint16 (value = raw * scale, clipped to 0..65535)
+# Blocks and records have a fixed size, so record n is found without reading
+# the file, and the block headers are a periodic index for seeking by time.
+# The sync marker also shows where a log was cut off by a power loss.
+#
+# Writes go through a buffer of buffer_size bytes (one 512 byte SD sector by
+# default) and only full buffers are written, so the card sees block sized
+# writes. flush() writes the rest, close() flushes and closes the stream.
+# host/read_spectrum_log.py maps a log into NumPy arrays.
+#
+# open_log() appends to an existing log of the same plan and settings: no
+# second header, the record numbers and block layout go on where the file
+# ends, and time_ms goes on from the start time of the header (never below
+# the last record, the RTC may be unset). A log of another plan, or one cut
+# off inside a record, is renamed to <name>.<n>.log and a new one started.
+#
+# Usage:
+#   log = spectrum_log.open_log('/sd/audio/spectrum.log', plan)
+#   log.add(result)
+#   log.close()
+
+import os
+import struct
+import utime
+import spectrum
+
+MAGIC = b'SPLG'
+VERSION = 1
+HEADER_SIZE = 64
+HEADER_FORMAT = '<4sHHIIIffHIIBBfI8s'
+BLOCK_MAGIC = b'SBLK'
+BLOCK_FORMAT = '<4sII'
+BLOCK_HEADER_SIZE = 12
+
+FLOAT32 = 0
+UINT16 = 1
+
+
+def record_size(count, value_type):
+    return 4 + count * (4 if value_type == FLOAT32 else 2)
+
+
+def pack_header(plan, value_type=FLOAT32, mode=spectrum.MEAN, scale=1.0, index_interval=64, start_time=0):
+    bin_size_in_hz, start_at_hz, count = plan.key[3:6]
+    window = plan.key[2].encode()
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, HEADER_SIZE, int(plan.Fs), plan.L, start_time,
+                         bin_size_in_hz, start_at_hz, count, plan.bands.start, plan.bands.width,
+                         value_type, mode, scale, index_interval, window)
+    return header + bytes(HEADER_SIZE - len(header))
+
+
+def unpack_header(data):
+    # header fields as a dict, ValueError if data is not a spectrum log
+    fields = struct.unpack(HEADER_FORMAT, bytes(data[:struct.calcsize(HEADER_FORMAT)]))
+    if fields[0] != MAGIC:
+        raise ValueError('not a spectrum log')
+    if fields[1] != VERSION:
+        raise ValueError('unsupported spectrum log version %d' % fields[1])
+    names = ('magic', 'version', 'header_size', 'Fs', 'L', 'start_time', 'bin_size_in_hz', 'start_at_hz',
+             'count', 'band_start', 'band_width', 'value_type', 'mode', 'scale', 'index_interval', 'window')
+    header = dict(zip(names, fields))
+    header['window'] = header['window'].rstrip(b'\0').decode()
+    header['record_size'] = record_size(header['count'], header['value_type'])
+    header['block_size'] = BLOCK_HEADER_SIZE + header['index_interval'] * header['record_size']
+    return header
+
+
+class Writer:
+    # resume: (records, time_ms) of an existing log stream is appended to,
+    # no header is written then
+    def __init__(self, stream, plan, value_type=FLOAT32, mode=spectrum.MEAN, scale=1.0, index_interval=64,
+                 buffer_size=512, start_time=None, resume=None):
+        self.stream = stream
+        self.count = plan.key[5]
+        self.value_type = value_type
+        self.scale = scale
+        self.index_interval = index_interval
+        self.records = 0
+        self.time_ms = 0
+        self._ticks = None
+        if value_type == FLOAT32:
+            self._format = '<I%df' % self.count
+        else:
+            self._format = '<I%dH' % self.count
+            self._values = [0] * self.count
+        self._record = bytearray(record_size(self.count, value_type))
+        self._block = bytearray(BLOCK_HEADER_SIZE)
+        self._buffer = bytearray(buffer_size)
+        self._buffer_mv = memoryview(self._buffer)
+        self._fill = 0
+        if resume is not None:
+            self.records, self.time_ms = resume
+            return
+        if start_time is None:
+            start_time = utime.time()
+        self._put(pack_header(plan, value_type, mode, scale, index_interval, start_time))
+
+    def _put(self, data):
+        # copy data into the write buffer, write every full buffer
+        mv = memoryview(data)
+        size = len(self._buffer)
+        n = len(mv)
+        pos = 0
+        while pos < n:
+            k = min(n - pos, size - self._fill)
+            self._buffer_mv[self._fill:self._fill + k] = mv[pos:pos + k]
+            self._fill += k
+            pos += k
+            if self._fill == size:
+                self.stream.write(self._buffer)
+                self._fill = 0
+
+    def add(self, result, time_ms=None):
+        # Append one band result. time_ms defaults to the milliseconds since
+        # the first add(), accumulated so the ticks_ms() wrap does not matter.
+        if time_ms is None:
+            now = utime.ticks_ms()
+            if self._ticks is not None:
+                self.time_ms += utime.ticks_diff(now, self._ticks)
+            self._ticks = now
+            time_ms = self.time_ms
+        if self.records % self.index_interval == 0:
+            struct.pack_into(BLOCK_FORMAT, self._block, 0, BLOCK_MAGIC, self.records, time_ms)
+            self._put(self._block)
+        if self.value_type == FLOAT32:
+            struct.pack_into(self._format, self._record, 0, time_ms, *result)
+        else:
+            values = self._values
+            inverse = 1 / self.scale
+            for x in range(self.count):
+                v = int(result[x] * inverse + 0.5)
+                values[x] = 0 if v < 0 else (65535 if v > 65535 else v)
+            struct.pack_into(self._format, self._record, 0, time_ms, *values)
+        self._put(self._record)
+        self.records += 1
+
+    def flush(self):
+        # write the partly filled buffer, following writes are no longer
+        # aligned to buffer_size
+        if self._fill:
+            self.stream.write(self._buffer_mv[:self._fill])
+            self._fill = 0
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+        self.stream.close()
+
+
+def _resume(path, plan, value_type, mode, scale, index_interval):
+    # (records, time_ms of the next record) to append to the log at path,
+    # None if there is none or it is not the same plan and settings
+    try:
+        size = os.stat(path)[6]
+    except OSError:
+        return None
+    if size < HEADER_SIZE:
+        return None
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+        try:
+            fields = unpack_header(header)
+        except ValueError:
+            return None
+        if header != pack_header(plan, value_type, mode, scale, index_interval, fields['start_time']):
+            return None
+        record = fields['record_size']
+        block = fields['block_size']
+        data = size - HEADER_SIZE
+        full = data // block
+        rest = data - full * block
+        if rest and (rest < BLOCK_HEADER_SIZE or (rest - BLOCK_HEADER_SIZE) % record):
+            # cut off inside a block header or a record
+            return None
+        records = full * index_interval + (rest - BLOCK_HEADER_SIZE) // record if rest else full * index_interval
+        last = 0
+        if records:
+            # the last record ends the file, or sits before an empty block
+            f.seek(size - record - (BLOCK_HEADER_SIZE if rest == BLOCK_HEADER_SIZE else 0))
+            last = struct.unpack('<I', f.read(4))[0] + 1
+    since_start = (utime.time() - fields['start_time']) * 1000
+    return records, max(last, since_start)
+
+
+def open_log(path, plan, value_type=FLOAT32, mode=spectrum.MEAN, scale=1.0, index_interval=64, buffer_size=512):
+    # Writer appending to the log at path, see the top of this file
+    resume = _resume(path, plan, value_type, mode, scale, index_interval)
+    if resume is None:
+        try:
+            if os.stat(path)[6]:
+                # keep the old log under the first free name
+                n = 1
+                while True:
+                    old = path[:-4] + '.%d.log' % n if path.endswith('.log') else path + '.%d' % n
+                    try:
+                        os.stat(old)
+                    except OSError:
+                        break
+                    n += 1
+                os.rename(path, old)
+        except OSError:
+            pass
+        return Writer(open(path, 'wb'), plan, value_type, mode, scale, index_interval, buffer_size)
+    return Writer(open(path, 'ab'), plan, value_type, mode, scale, index_interval, buffer_size, resume=resume)
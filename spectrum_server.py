@@ -0,0 +1,155 @@
+# Purpose:
+# - service mode: publish every band result to any number of local
+#   subscribers over TCP (and, on a Linux host, a Unix socket) instead of
+#   only printing it
+# - the capture loop never waits for a client: every client has a bounded
+#   queue, when it is full the oldest frame is dropped
+#
+# Formats, chosen per server:
+# - BINARY: the 64 byte spectrum_log header once, then one spectrum_log
+#   record per frame (uint32 time_ms, one float32 per band), the same bytes
+#   a FLOAT32 log holds between its block headers
+# - JSON: a first line with the header fields, then one line per frame
+#   {"t": time_ms, "bands": [...]}
+# time_ms is the position of the frame in the audio stream when the caller
+# passes it (see fft_analyzer_server.py), so dropped frames show as gaps.
+#
+# publish() packs a frame once and appends it to every queue, it never
+# blocks. One task per client writes its queue to the socket and waits in
+# drain() while the client is slow, meanwhile newer frames push the oldest
+# ones out. Runs on uasyncio on the device and on asyncio on a host. The
+# drain() of uasyncio returns when everything is sent; asyncio only waits
+# above the high-water mark of the transport (64 KiB by default), so it is
+# set to about one frame and a slow client fills its queue, not the buffer.
+#
+# Usage:
+#   server = spectrum_server.Server(plan)
+#   await server.start(port=8765)
+#   ... server.publish(result, time_ms) every frame, await asyncio.sleep(0) ...
+#   server.close()
+# host/spectrum_client.py subscribes and prints the frames.
+
+import struct
+import utime
+import spectrum_log
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+BINARY = 'binary'
+JSON = 'json'
+
+PORT = 8765
+QUEUE_SIZE = 4
+
+
+class Client:
+    def __init__(self, writer):
+        self.writer = writer
+        self.frames = []
+        self.dropped = 0
+        self.ready = asyncio.Event()
+
+
+class Server:
+    def __init__(self, plan, format=BINARY, queue_size=QUEUE_SIZE):
+        if format not in (BINARY, JSON):
+            raise ValueError('unknown format')
+        self.format = format
+        self.queue_size = queue_size
+        self.count = plan.key[5]
+        self.clients = []
+        self.frames = 0          # frames published
+        self.dropped = 0         # frames dropped from full queues, all clients
+        self._servers = []
+        self._running = True
+        self.time_ms = 0
+        self._ticks = None
+        if format == BINARY:
+            self._header = spectrum_log.pack_header(plan)
+            self._format = '<I%df' % self.count
+            self.frame_size = struct.calcsize(self._format)
+        else:
+            Fs, L, window, bin_size_in_hz, start_at_hz, count = plan.key
+            header = {'Fs': Fs, 'L': L, 'window': window, 'bin_size_in_hz': bin_size_in_hz,
+                      'start_at_hz': start_at_hz, 'count': count}
+            self._header = (json.dumps(header) + '\n').encode()
+            # about the length of one line
+            self.frame_size = 32 + 16 * count
+
+    async def start(self, port=PORT, host='0.0.0.0', path=None):
+        # listen on host:port, and on the Unix socket path if given (host only)
+        if port is not None:
+            self._servers.append(await asyncio.start_server(self._serve, host, port))
+        if path:
+            self._servers.append(await asyncio.start_unix_server(self._serve, path))
+
+    def publish(self, result, time_ms=None):
+        # Queue result for every client. time_ms defaults to the
+        # milliseconds since the first publish(), like spectrum_log.Writer.
+        if time_ms is None:
+            now = utime.ticks_ms()
+            if self._ticks is not None:
+                self.time_ms += utime.ticks_diff(now, self._ticks)
+            self._ticks = now
+            time_ms = self.time_ms
+        self.frames += 1
+        if not self.clients:
+            return
+        if self.format == BINARY:
+            data = struct.pack(self._format, time_ms, *result)
+        else:
+            data = (json.dumps({'t': time_ms, 'bands': [float(v) for v in result]}) + '\n').encode()
+        for client in self.clients:
+            if len(client.frames) >= self.queue_size:
+                client.frames.pop(0)
+                client.dropped += 1
+                self.dropped += 1
+            client.frames.append(data)
+            client.ready.set()
+
+    async def _serve(self, reader, writer):
+        client = Client(writer)
+        self.clients.append(client)
+        transport = getattr(writer, 'transport', None)
+        if transport is not None:
+            transport.set_write_buffer_limits(high=self.frame_size)
+        try:
+            writer.write(self._header)
+            await writer.drain()
+            while True:
+                await client.ready.wait()
+                client.ready.clear()
+                # everything queued so far in one drain
+                while client.frames:
+                    writer.write(client.frames.pop(0))
+                await writer.drain()
+                if not self._running:
+                    break
+        except OSError:
+            # the client went away
+            pass
+        finally:
+            if client in self.clients:
+                self.clients.remove(client)
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    def close(self):
+        # stop listening, disconnect all clients after their queued frames
+        self._running = False
+        for server in self._servers:
+            server.close()
+        self._servers = []
+        for client in self.clients:
+            client.ready.set()
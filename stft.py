@@ -0,0 +1,98 @@
+# Purpose:
+# - short-time Fourier transform over a whole 16-bit mono PCM stream
+#   (a WAV file) or 32-bit I2S stream (audio_in.readinto)
+# - walk the stream frame by frame with a configurable frame length and hop
+#
+# Only one frame of samples is ever held in memory: the first frame_len
+# samples are read once, afterwards every step keeps the last
+# frame_len - hop samples and reads hop new ones into the same buffers.
+# So the memory use does not depend on the length of the recording.
+# An incomplete frame at the end of the stream is dropped.
+# stream can also be a wav_reader.WavReader, which knows its own sample
+# format and data size and hands out the frames itself. Interleaved
+# multi-channel streams are read whole, only channel is decoded.
+
+import i2s_decode
+import spectrum
+import profiling
+
+
+def _read_samples(stream, pcm_mv, num_samples, sample_bytes, step=1):
+    # Fill pcm_mv[:num_samples * step] (a memoryview of an array('h') or
+    # array('i'), so indices are samples while readinto() counts bytes, or of
+    # a bytearray for 24-bit samples with step 3). File readinto() may return
+    # less than requested; 0 bytes means EOF.
+    got = 0
+    while got < num_samples:
+        n = stream.readinto(pcm_mv[got * step:num_samples * step])
+        if not n:
+            break
+        got += n // sample_bytes
+    return got
+
+
+def frames(stream, frame_len, hop, samples=None, max_bytes=None, sample_bytes=2, decode=None, channel=0, channels=1):
+    # Yield the float array samples (length frame_len, reused for every
+    # frame) once per frame. max_bytes limits how much of the stream is
+    # read, e.g. the size of the WAV data chunk. sample_bytes is 2 for
+    # 16-bit PCM, 3 for 24-bit PCM and 4 for 32-bit I2S words; decode
+    # replaces the default i2s_decode function for that size.
+    # channel of channels interleaved ones is analyzed.
+    if hasattr(stream, 'frames'):
+        yield from stream.frames(frame_len, hop, samples)
+        return
+    if hop < 1 or hop > frame_len:
+        raise ValueError('hop must be between 1 and frame_len')
+    if samples is None:
+        samples = i2s_decode.float_buffer(frame_len)
+    keep = frame_len - hop
+    step = 1
+    if sample_bytes == 4:
+        pcm = i2s_decode.int32_buffer(frame_len * channels)
+        default = i2s_decode.decode_32
+    elif sample_bytes == 3:
+        pcm = bytearray(3 * frame_len * channels)
+        default = i2s_decode.decode_pcm24
+        step = 3
+    else:
+        pcm = i2s_decode.int16_buffer(frame_len * channels)
+        default = i2s_decode.decode_pcm16
+    if decode is None:
+        decode = default
+    pcm_mv = memoryview(pcm)
+
+    # remaining counts frames of all channels
+    remaining = None if max_bytes is None else max_bytes // (sample_bytes * channels)
+    want = frame_len
+    offset = 0
+    while True:
+        if remaining is not None and remaining < want:
+            return
+        t = profiling.start()
+        if _read_samples(stream, pcm_mv, want * channels, sample_bytes, step) < want * channels:
+            return
+        if remaining is not None:
+            remaining -= want
+        t = profiling.lap('read', t)
+        if channels == 1:
+            decode(pcm, samples, want, offset)
+        else:
+            decode(pcm, samples, want, offset, channel, channels)
+        profiling.lap('decode', t)
+        yield samples
+        if keep:
+            # overlap: slide the last frame_len - hop samples to the front
+            samples[:keep] = samples[hop:]
+        want = hop
+        offset = keep
+
+
+def band_frames(stream, plan, hop, mode=spectrum.MEAN, max_bytes=None):
+    # Yield (frame index, P1, band result) for every frame of the stream,
+    # analyzed with the spectrum.Plan plan (frame length plan.L). The frames
+    # are read straight into plan.samples.
+    index = 0
+    for samples in frames(stream, plan.L, hop, plan.samples, max_bytes):
+        P1, result = plan.analyze(samples, mode)
+        yield index, P1, result
+        index += 1
@@ -0,0 +1,159 @@
+# Purpose:
+# - open WAV recordings without assuming the canonical 44 byte header
+# - sample rate, sample size and data size come from the file itself
+#
+# The RIFF chunks are walked one by one: "fmt " gives the format, "data" the
+# position and size of the samples, anything else (LIST, fact, cue, ...) is
+# skipped. 16, 24 and 32-bit integer PCM are supported (format 1 or
+# WAVE_FORMAT_EXTENSIBLE with a PCM sub format), every size is decoded to
+# the range of 16-bit samples so the band values do not depend on it.
+#
+# Multi-channel files are interleaved; channel picks the one that is
+# decoded (0 is the first, the left one of a stereo file).
+#
+# Where the mmap module exists (Linux host) the data chunk is mapped and
+# every frame is decoded straight from the mapped file: opening is instant
+# and only the float frame lives on the heap. Without mmap (MicroPython)
+# frames are read from the file with stft.frames().
+#
+# Usage:
+#   reader = wav_reader.WavReader(open('/sd/audio/mic-recording_5.wav', 'rb'))
+#   plan = spectrum.get_plan(reader.sample_rate, L, ...)
+#   for frame, P1, result in stft.band_frames(reader, plan, HOP_LENGTH):
+#       ...
+#   reader.close()
+
+import i2s_decode
+import stft
+
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def _u16(b, offset):
+    return b[offset] | b[offset + 1] << 8
+
+
+def _u32(b, offset):
+    return b[offset] | b[offset + 1] << 8 | b[offset + 2] << 16 | b[offset + 3] << 24
+
+
+class WavReader:
+    def __init__(self, stream, use_mmap=True, channel=0):
+        self.stream = stream
+        self.channel = channel
+        self.sample_rate = 0
+        self.channels = 0
+        self.bits = 0
+        self.sample_bytes = 0
+        self.data_offset = 0
+        self.data_size = 0
+        self._map = None
+        self._data = None
+        self._parse()
+        # samples per channel
+        self.num_samples = self.data_size // (self.sample_bytes * self.channels)
+        self.duration_ms = self.num_samples * 1000 // self.sample_rate
+        if use_mmap and mmap is not None:
+            try:
+                self._map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+            except (AttributeError, OSError, ValueError):
+                self._map = None
+            if self._map is not None:
+                self._data = memoryview(self._map)[self.data_offset:self.data_offset + self.data_size]
+        self.rewind()
+
+    def _parse(self):
+        stream = self.stream
+        header = stream.read(12)
+        if len(header) < 12 or header[0:4] != b'RIFF' or header[8:12] != b'WAVE':
+            raise ValueError('not a RIFF WAVE file')
+        position = 12
+        fmt = None
+        while True:
+            chunk = stream.read(8)
+            if len(chunk) < 8:
+                raise ValueError('no data chunk')
+            chunk_id = bytes(chunk[0:4])
+            size = _u32(chunk, 4)
+            position += 8
+            if chunk_id == b'fmt ':
+                fmt = stream.read(size)
+                if len(fmt) < 16:
+                    raise ValueError('fmt chunk too short')
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError('data chunk before fmt chunk')
+                self.data_offset = position
+                self.data_size = size
+                break
+            # chunks are padded to an even size, skip everything else
+            position += size + (size & 1)
+            stream.seek(position)
+
+        tag = _u16(fmt, 0)
+        if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+            # the sub format GUID starts with the format tag
+            tag = _u16(fmt, 24)
+        if tag != WAVE_FORMAT_PCM:
+            raise ValueError('only integer PCM is supported, format %d' % tag)
+        self.channels = _u16(fmt, 2)
+        self.sample_rate = _u32(fmt, 4)
+        self.bits = _u16(fmt, 14)
+        self.sample_bytes = _u16(fmt, 12) // max(self.channels, 1)
+        if not 0 <= self.channel < self.channels:
+            raise ValueError('no channel %d in a %d channel WAV file' % (self.channel, self.channels))
+        if self.sample_bytes not in (2, 3, 4) or not self.sample_rate:
+            raise ValueError('unsupported WAV format: %d bits' % self.bits)
+        # a truncated recording has less data than the header says
+        end = stream.seek(0, 2)
+        if end is not None and self.data_offset + self.data_size > end:
+            self.data_size = end - self.data_offset
+        self.data_size -= self.data_size % (self.sample_bytes * self.channels)
+
+    def rewind(self):
+        # file position back to the first sample
+        self.stream.seek(self.data_offset)
+
+    def close(self):
+        if self._map is not None:
+            self._data.release()
+            self._data = None
+            self._map.close()
+            self._map = None
+        self.stream.close()
+
+    def decode(self, out, start, num_samples, offset=0):
+        # Decode num_samples samples of self.channel from sample index start
+        # into out[offset:offset + num_samples]. Only with mmap.
+        sb = self.sample_bytes
+        channels = self.channels
+        raw = self._data[start * sb * channels:(start + num_samples) * sb * channels]
+        if sb == 2:
+            return i2s_decode.decode_pcm16(raw.cast('h'), out, num_samples, offset, self.channel, channels)
+        if sb == 3:
+            return i2s_decode.decode_pcm24(raw, out, num_samples, offset, self.channel, channels)
+        return i2s_decode.decode_pcm32(raw.cast('i'), out, num_samples, offset, self.channel, channels)
+
+    def frames(self, frame_len, hop, samples=None):
+        # Yield the float array samples once per frame, like stft.frames()
+        if self._data is None:
+            self.rewind()
+            decode = i2s_decode.decode_pcm32 if self.sample_bytes == 4 else None
+            yield from stft.frames(self.stream, frame_len, hop, samples, self.data_size, self.sample_bytes, decode,
+                                   self.channel, self.channels)
+            return
+        if hop < 1 or hop > frame_len:
+            raise ValueError('hop must be between 1 and frame_len')
+        if samples is None:
+            samples = i2s_decode.float_buffer(frame_len)
+        for start in range(0, self.num_samples - frame_len + 1, hop):
+            # every frame is decoded from the mapped file, nothing is copied
+            # into an intermediate PCM buffer
+            self.decode(samples, start, frame_len)
+            yield samples
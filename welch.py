@@ -0,0 +1,63 @@
+# Purpose:
+# - Welch averaged periodogram for long captures and WAV recordings
+# - split the audio into overlapping windowed segments of one small FFT size
+#   and average their power spectra incrementally
+#
+# Only the running sum of the power spectra (L//2+1 floats) and the current
+# segment are kept, so minutes of audio need no more memory than one
+# segment. amplitude() returns the RMS amplitude sqrt(mean(P1^2)), which has
+# the same scale as a single P1 and can be reduced to bands with the plan's
+# band table. Use a plan with spectrum.HANN and 50% overlap (hop = L // 2)
+# for the classic Welch estimate.
+
+import ulab as np
+from ulab import vector
+import fft_real
+import spectrum
+import stft
+
+
+class Welch:
+    def __init__(self, plan):
+        self.plan = plan
+        self.power = np.zeros(plan.L // 2 + 1)
+        self.count = 0
+
+    def reset(self):
+        self.power[:] = 0
+        self.count = 0
+
+    def add(self, samples=None):
+        # accumulate one segment, plan.samples if samples is None
+        P1_squared = self.plan.magnitude(samples, power=True)
+        if fft_real.INPLACE:
+            self.power += P1_squared
+        else:
+            self.power[:] = self.power + P1_squared
+        self.count += 1
+
+    def add_magnitude(self, P1):
+        # accumulate a segment analyzed before, e.g. from spectrum_cache
+        if fft_real.INPLACE:
+            self.power += P1 * P1
+        else:
+            self.power[:] = self.power + P1 * P1
+        self.count += 1
+
+    def amplitude(self):
+        if not self.count:
+            return np.zeros(len(self.power))
+        return vector.sqrt(self.power / self.count)
+
+    def bands(self, mode=spectrum.MEAN):
+        return self.plan.bands.reduce(self.amplitude(), mode, self.plan.result)
+
+
+def average(stream, plan, hop, max_bytes=None, sample_bytes=2, welch=None):
+    # Feed every segment of stream (see stft.frames) into a Welch averager
+    # and return it; pass welch to continue a running average.
+    if welch is None:
+        welch = Welch(plan)
+    for samples in stft.frames(stream, plan.L, hop, plan.samples, max_bytes, sample_bytes):
+        welch.add(samples)
+    return welch
@@ -0,0 +1,234 @@
+# Purpose:
+# - zoom FFT: when the bands only cover a narrow slice of 0..Fs/2, mix that
+#   slice down to 0 Hz, low-pass filter and decimate by D while the DMA
+#   blocks arrive, and transform L/D complex samples instead of L real ones
+# - same bin spacing Fs/L inside the bands, the sample memory shrinks from L
+#   floats to 2*L/D
+#
+# Every block of B samples is multiplied by exp(-2j*pi*fc*n/Fs). fc, the
+# center of the bands, is rounded to a multiple of Fs/B, so the oscillator
+# starts every block at phase 0 and one cos/sin table of B values does.
+# The low-pass is a Hamming windowed sinc of TAPS_PER_PHASE * D taps with
+# its cutoff at the new Nyquist Fs/(2D). Only every D-th output is
+# computed, polyphase style: the kept history and the block are read as
+# rows of D samples, and each group of D taps is one linalg.dot over those
+# rows, so a block costs 2 * TAPS_PER_PHASE dot products whatever D is.
+# After L samples the L/D outputs are windowed and transformed with one
+# complex fft; bin k is the frequency fc + k*Fs/L. The magnitudes are
+# scaled like spectrum.single_sided() and reduced with the band table of
+# the plan, so the band values match the full FFT.
+#
+# factor() picks the largest D that divides L and B and keeps the bands
+# inside the pass band (output rate >= 1.5 times their width), and keeps
+# the mirror images of DC and Nyquist out of it; it returns 1 when no zoom
+# is possible. The first outputs after reset() depend on the zeros in the
+# filter history, capture() first reads preroll samples to fill it.
+
+import math
+import utime
+import ulab as np
+from ulab import vector
+from ulab import linalg
+from ulab import numerical
+import fft_any
+import goertzel
+import i2s_decode
+import profiling
+import spectrum
+
+TAPS_PER_PHASE = 16
+# output rate over the width of the bands
+MARGIN = 1.5
+# where the stop band of the low-pass starts, times the output rate
+STOP = 0.6
+
+
+def _center(plan, block_samples):
+    # center of the bands, rounded to a multiple of Fs / block_samples
+    lo, hi = goertzel.band_bins(plan)
+    step = plan.Fs / block_samples
+    return round((lo + hi - 1) * plan.Fs / plan.L / 2 / step) * step
+
+
+def factor(plan, block_samples=256):
+    # decimation factor D for plan, 1 if zooming is not possible
+    L = plan.L
+    Fs = plan.Fs
+    lo, hi = goertzel.band_bins(plan)
+    if hi <= lo or L % block_samples:
+        return 1
+    fc = _center(plan, block_samples)
+    df = Fs / L
+    # the bands as seen from fc, one bin of room on both sides
+    reach = max(fc - (lo - 1) * df, hi * df - fc)
+    best = 1
+    for D in range(2, block_samples + 1):
+        if L % D or block_samples % D:
+            continue
+        rate = Fs / D
+        if 2 * reach * MARGIN > rate:
+            continue
+        if min(fc, Fs / 2 - fc) < STOP * rate:
+            continue
+        best = D
+    return best
+
+
+def lowpass(D, taps_per_phase=TAPS_PER_PHASE):
+    # windowed sinc with cutoff at 1/(2D) of the sample rate, DC gain 1
+    N = taps_per_phase * D
+    h = []
+    for i in range(N):
+        x = i - (N - 1) / 2
+        sinc = 1.0 if x == 0 else math.sin(math.pi * x / D) / (math.pi * x / D)
+        h.append(sinc * (0.54 - 0.46 * math.cos(2 * math.pi * i / (N - 1))))
+    total = sum(h)
+    return [v / total for v in h]
+
+
+class Zoom:
+    def __init__(self, plan, block_samples=256, D=None):
+        if D is None:
+            D = factor(plan, block_samples)
+        if D < 2:
+            raise ValueError('the bands of this plan cannot be zoomed')
+        L = plan.L
+        B = block_samples
+        if L % B or B % D or L % D:
+            raise ValueError('L and block_samples must be multiples of D, L of block_samples')
+        self.plan = plan
+        self.L = L
+        self.D = D
+        self.block_samples = B
+        self.M = L // D
+        self.fc = _center(plan, B)
+        self.df = plan.Fs / L
+        # P1[0] is the FFT bin first_bin of the full length transform
+        self.first_bin = int(round(self.fc / self.df)) - self.M // 2
+        T = TAPS_PER_PHASE
+        self.T = T
+        h = lowpass(D, T)
+        # rows of the history and block read as (rows, D): output m is
+        # sum over t of row[m - t] . g[t] with g[t][q] = h[t*D + D - 1 - q]
+        self.groups = [np.array([h[t * D + D - 1 - q] for q in range(D)]) for t in range(T)]
+        self.history = (T - 1) * D
+        self.cos = np.array([math.cos(2 * math.pi * self.fc * n / plan.Fs) for n in range(B)])
+        self.sin = np.array([-math.sin(2 * math.pi * self.fc * n / plan.Fs) for n in range(B)])
+        self._re = np.zeros(self.history + B)
+        self._im = np.zeros(self.history + B)
+        self.out_re = np.zeros(self.M)
+        self.out_im = np.zeros(self.M)
+        window = spectrum.window_coefficients(plan.key[2], self.M)
+        self.window = window
+        if window is None:
+            self.scale = 2 / self.M
+        else:
+            self.scale = 2 / numerical.sum(window)
+        self.P1 = np.zeros(self.M)
+        self._decoded = i2s_decode.float_buffer(B)
+        # whole blocks until the filter history holds real samples
+        self.preroll = -(-self.history // B) * B
+        self.busy_us = 0
+        self.reset()
+
+    def reset(self):
+        self._re[:] = 0
+        self._im[:] = 0
+        self.count = 0
+        self.warm = 0
+
+    def done(self):
+        return self.count >= self.M
+
+    def add_block(self, block):
+        # block: block_samples float samples, the next ones of the stream
+        B = self.block_samples
+        H = self.history
+        re = self._re
+        im = self._im
+        # keep the last H samples of the previous blocks in front
+        if H:
+            re[:H] = re[B:]
+            im[:H] = im[B:]
+        re[H:] = block * self.cos
+        im[H:] = block * self.sin
+        if self.warm < self.preroll:
+            self.warm += B
+            return
+        rows = B // self.D
+        start = self.count
+        if start + rows > self.M:
+            # the previous frame was not picked up, start a new one
+            start = 0
+        out_re = self.out_re[start:start + rows]
+        out_im = self.out_im[start:start + rows]
+        out_re[:] = 0
+        out_im[:] = 0
+        D = self.D
+        T = self.T
+        for t in range(T):
+            a = (T - 1 - t) * D
+            b = a + B
+            g = self.groups[t]
+            out_re[:] = out_re + linalg.dot(re[a:b].reshape((rows, D)), g)
+            out_im[:] = out_im + linalg.dot(im[a:b].reshape((rows, D)), g)
+        self.count = start + rows
+
+    def magnitude(self):
+        # P1[i] belongs to the FFT bin first_bin + i of the full transform
+        re = self.out_re
+        im = self.out_im
+        if self.window is not None:
+            re = re * self.window
+            im = im * self.window
+        t = profiling.start()
+        Zr, Zi = fft_any.fft(re, im)
+        t = profiling.lap('fft', t)
+        M = self.M
+        half = M // 2
+        magnitude = vector.sqrt(Zr * Zr + Zi * Zi) * self.scale
+        # negative frequencies first
+        self.P1[:half] = magnitude[M - half:]
+        self.P1[half:] = magnitude[:M - half]
+        profiling.lap('magnitude', t)
+        return self.P1
+
+    def bands(self, mode=spectrum.MEAN):
+        self.count = 0
+        return self.plan.bands.reduce(self.magnitude(), mode, self.plan.result, self.first_bin)
+
+    def analyze(self, samples, mode=spectrum.MEAN):
+        # preroll + L samples at once, mostly for comparing with plan.analyze()
+        self.reset()
+        B = self.block_samples
+        for start in range(0, len(samples) - B + 1, B):
+            self.add_block(samples[start:start + B])
+        return self.bands(mode)
+
+    def capture(self, audio_in, words=None, mode=spectrum.MEAN):
+        # Read DMA blocks from I2S and decimate each one as soon as it
+        # arrives. Returns the band result of the next L samples; the
+        # filter history carries over to the next capture.
+        B = self.block_samples
+        if words is None:
+            words = i2s_decode.int32_buffer(B)
+        words_mv = memoryview(words)
+        block = self._decoded
+        self.count = 0
+        while not self.done():
+            got = 0
+            t = profiling.start()
+            while got < B:
+                num_bytes = audio_in.readinto(words_mv[got:B])
+                got += num_bytes // i2s_decode.SAMPLE_SIZE_IN_BYTES
+            profiling.lap('readinto', t)
+            start = utime.ticks_us()
+            i2s_decode.decode_32(words, block, B)
+            t = profiling.lap('decode', start)
+            self.add_block(block)
+            profiling.lap('decimate', t)
+            self.busy_us += utime.ticks_diff(utime.ticks_us(), start)
+        start = utime.ticks_us()
+        result = self.bands(mode)
+        self.busy_us += utime.ticks_diff(utime.ticks_us(), start)
+        return result